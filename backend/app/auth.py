@@ -19,9 +19,10 @@ from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 
 # --- IMPORTACIONES LOCALES ---
-from .database import get_db
+from .database import get_db, get_async_db, SesionAsync
 from .models import Cliente
 from . import schemas
+from .logic.sesiones import sesiones, TIMEOUT_INACTIVIDAD
 
 # --- CONFIGURACIÓN ---
 # Prioridad: Variable de entorno > Valor por defecto seguro
@@ -112,75 +113,99 @@ def authenticate_user(db: Session, username: str, password: str):
 # 4. DEPENDENCIAS DE ACCESO (PORTERO)
 # ==========================================
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
-    """Protege rutas requiriendo un token válido y comprobando la exclusividad de sesión."""
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales no válidas o token expirado",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    session_invalidated_exception = HTTPException(
+
+def session_invalidated_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="SESSION_INVALIDATED",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        cif_usuario: str = payload.get("sub")
-        token_sid: str = payload.get("sid")
-        
-        if cif_usuario is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
+def leer_token(token: str):
+    """Decodifica el JWT y devuelve (cif, sid). Lanza JWTError si no es válido."""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get("sub"), payload.get("sid")
+
+def validar_sesion(db: Session, cif_usuario: str, token_sid: str) -> Cliente:
+    """
+    Validación completa contra la BBDD (sin caché). Función síncrona: los endpoints async
+    la ejecutan con SesionAsync.run_sync (asyncpg o threadpool), nunca en el event loop.
+    """
     user = db.query(Cliente).filter(Cliente.cif == cif_usuario).first()
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
     
     # CONTROL DE CONCURRENCIA (Iron Fortress)
     # Comparamos el SID del token con el guardado en la base de datos.
     if not token_sid or token_sid != user.session_id:
-        raise session_invalidated_exception
+        raise session_invalidated_exception()
     
     # SLIDING WINDOW TIMEOUT (30 Minutos de Inactividad)
-    # Comprobamos si la última actividad fue hace más de 30 minutos
-    from datetime import datetime, timezone, timedelta
-    if user.ultima_actividad:
-        ahora = datetime.now(timezone.utc)
-        ultima_act = user.ultima_actividad
-        if ultima_act.tzinfo is None:
-            ultima_act = ultima_act.replace(tzinfo=timezone.utc)
-        
-        if (ahora - ultima_act) > timedelta(minutes=30):
-            # Sesión expirada por inactividad
-            user.session_id = None
-            db.commit()
-            raise session_invalidated_exception
+    # Comprobamos si la última actividad (BBDD o pendiente de volcar) fue hace más de 30 minutos
+    ultima_act = sesiones.ultima_actividad(user.cliente_id, user.ultima_actividad)
+    if ultima_act and (datetime.now(timezone.utc) - ultima_act) > TIMEOUT_INACTIVIDAD:
+        # Sesión expirada por inactividad
+        user.session_id = None
+        db.commit()
+        sesiones.descartar_actividad(user.cliente_id)
+        raise session_invalidated_exception()
+    return user
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
+                           db: Session = Depends(get_db),
+                           db_async: SesionAsync = Depends(get_async_db)):
+    """Protege rutas requiriendo un token válido y comprobando la exclusividad de sesión."""
+    try:
+        cif_usuario, token_sid = leer_token(token)
+        if cif_usuario is None:
+            raise credentials_exception()
+    except JWTError:
+        raise credentials_exception()
+
+    # CACHÉ DE VALIDACIÓN: (cif, sid) comprobado hace menos de AUTH_CACHE_TTL_S segundos
+    # -> no hace falta volver a la BBDD (login/logout/cambios del cliente la invalidan)
+    user = sesiones.obtener(db, cif_usuario, token_sid) if token_sid else None
+    if user is not None:
+        sesiones.marcar_actividad(user.cliente_id)
+        return user
+
+    # Sin caché: la consulta sale del event loop (asyncpg o threadpool)
+    user = await db_async.run_sync(validar_sesion, cif_usuario, token_sid)
 
     # MONITOR DE ACTIVIDAD (Iron Fortress)
-    # Actualizamos la huella digital del usuario en cada interacción (renovando el timeout)
-    from sqlalchemy.sql import func
-    user.ultima_actividad = func.now()
-    db.commit()
-        
-    return user
+    # Anotamos la huella digital en memoria (renovando el timeout); el volcador la escribe
+    # en BBDD por lotes cada AUTH_ACTIVIDAD_VOLCADO_S segundos
+    sesiones.marcar_actividad(user.cliente_id)
+    sesiones.guardar(cif_usuario, token_sid, user)
+
+    # Con SIRA_DB_ASYNC el cliente viene de la AsyncSession: se entrega unido a la Session
+    # de la petición, que es la que usan los routers (p. ej. logout)
+    return user if user in db else sesiones.adjuntar(db, user)
 
-async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_optional), db: Session = Depends(get_db)):
+def buscar_cliente(db: Session, cif_usuario: str) -> Optional[Cliente]:
+    return db.query(Cliente).filter(Cliente.cif == cif_usuario).first()
+
+async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_optional),
+                                    db: Session = Depends(get_db),
+                                    db_async: SesionAsync = Depends(get_async_db)):
     """Permite el paso aunque no haya token, pero identifica al usuario si existe."""
     if not token:
         return None
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        cif_usuario: str = payload.get("sub")
+        cif_usuario, _ = leer_token(token)
         if cif_usuario is None:
             return None
     except JWTError:
         return None
 
-    return db.query(Cliente).filter(Cliente.cif == cif_usuario).first()
+    user = await db_async.run_sync(buscar_cliente, cif_usuario)
+    return user if user is None or user in db else sesiones.adjuntar(db, user)
 
 
 # ==========================================
@@ -31,7 +31,12 @@ from .crud_dispositivos import (
 )
 
 from .crud_operaciones import (
-    create_medicion, get_mediciones,
+    create_medicion, create_mediciones_lote, get_mediciones,
     create_accion,
     create_recomendacion
 )
+
+from .crud_jornadas import (
+    get_jornada_cliente, get_jornada_invernadero, get_resumen_jornadas_cliente,
+    guardar_jornada_cliente, guardar_jornada_invernadero, resetear_jornadas_cliente
+)
@@ -0,0 +1,23 @@
+"""
+Filtros de los buscadores de texto (clientes, cultivos, localidades).
+
+Generan exactamente las expresiones indexadas en database/40-indices-busqueda.sql, para que
+PostgreSQL resuelva el ILIKE '%texto%' con los índices GIN de trigramas:
+  - sira_unaccent(columna) ILIKE sira_unaccent('%texto%')  -> "contiene, sin tildes"
+  - CAST(columna AS TEXT) ILIKE '%texto%'                    -> códigos (CIF, CP)
+"""
+from sqlalchemy import Text, cast, func
+
+
+def contiene(columna, q: str):
+    """Columna de texto que contiene 'q' sin distinguir tildes ni mayúsculas."""
+    return func.sira_unaccent(columna).ilike(func.sira_unaccent(f"%{q}%"))
+
+
+def contiene_codigo(columna, q: str):
+    """Columna de código (CHAR) que contiene 'q' sin distinguir mayúsculas."""
+    return cast(columna, Text).ilike(f"%{q}%")
+
+
+def orden_sin_tildes(columna):
+    return func.sira_unaccent(columna, type_=Text)
@@ -11,14 +11,22 @@ Asegura que todas las contraseñas se guarden con hashing profesional.
 
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, String
+from sqlalchemy import or_
 from typing import Optional
 
 # Importaciones locales
 from .. import models, schemas, auth
+from .busqueda import contiene, contiene_codigo
+from .paginacion import codificar_cursor, cursor_no_valido, decodificar_cursor, paginar
+from ..logic.sesiones import sesiones
+from ..logic.versiones import versiones
+from ..logic.cache_jerarquia import cache_jerarquia
 
 # --- 1. LEER (SELECT) ---
 
+# Orden de los tramos del listado paginado (ver get_clientes)
+TRAMOS_CLIENTES = ("en_linea", "resto")
+
 def get_cliente(db: Session, cliente_id: int):
     """Busca un cliente por su ID interno."""
     return db.query(models.Cliente).filter(models.Cliente.cliente_id == cliente_id).first()
@@ -27,48 +35,73 @@ def get_cliente_by_cif(db: Session, cif: str):
     """Busca un cliente por su CIF único."""
     return db.query(models.Cliente).filter(models.Cliente.cif == cif).first()
 
-def get_clientes(db: Session, skip: int = 0, limit: int = 100, q: str = None):
+def get_clientes(db: Session, skip: int = 0, limit: int = 100, q: str = None, cursor: Optional[str] = None):
     """
     Listado de clientes con búsqueda por texto y triple criterio de ordenamiento:
     1. Usuarios En Línea (actividad < 5 min)
     2. Jerarquía de Rol (Root > Admin > Cliente)
     3. ID de registro
+    Paginado por cursor (crud/paginacion.py): devuelve (clientes, siguiente_cursor).
+    'En línea' depende de la hora de la consulta y no se puede indexar: el listado se sirve en dos
+    tramos (en línea y resto) y cada uno se recorre por el índice (rango_prioridad, cliente_id).
+    El cursor recuerda el tramo y fija el umbral de 'en línea' de la primera página para que el
+    orden no cambie entre páginas.
     """
-    from sqlalchemy import case, and_
+    from sqlalchemy import and_
     from datetime import datetime, timedelta
     
     query = db.query(models.Cliente)
     
     if q:
-        search = f"%{q}%"
+        # Cada rama del OR tiene su índice de trigramas (40-indices-busqueda.sql)
         query = query.filter(
             or_(
-                func.unaccent(models.Cliente.nombre_empresa.cast(String)).ilike(func.unaccent(search)),
-                func.unaccent(models.Cliente.persona_contacto.cast(String)).ilike(func.unaccent(search)),
-                func.unaccent(models.Cliente.email_admin.cast(String)).ilike(func.unaccent(search)),
-                models.Cliente.cif.ilike(search)
+                contiene(models.Cliente.nombre_empresa, q),
+                contiene(models.Cliente.persona_contacto, q),
+                contiene(models.Cliente.email_admin, q),
+                contiene_codigo(models.Cliente.cif, q)
             )
         )
     
-    # 1. Definimos estado Online: Tiene un session_id Y ha estado activo en el periodo de vida del token (30 mins)
-    umbral_online = datetime.now() - timedelta(minutes=30)
-    is_online = case(
-        (and_(models.Cliente.session_id.isnot(None), models.Cliente.ultima_actividad > umbral_online), 1), 
-        else_=0
-    )
-    
-    # 2. Definimos jerarquía de roles
-    rango_prioridad = case(
-        (models.Cliente.rol == "root", 0),
-        (models.Cliente.rol == "admin", 1),
-        else_=2
-    )
+    datos_cursor = decodificar_cursor(cursor) if cursor else {}
+    tramo = datos_cursor.get("tramo", TRAMOS_CLIENTES[0])
+    if tramo not in TRAMOS_CLIENTES:
+        raise cursor_no_valido()
 
-    return query.order_by(
-        is_online.desc(), 
-        rango_prioridad.asc(), 
-        models.Cliente.cliente_id.asc()
-    ).offset(skip).limit(limit).all()
+    # 1. Definimos estado Online: Tiene un session_id Y ha estado activo en el periodo de vida del token (30 mins)
+    umbral_online = datos_cursor.get("umbral") or datetime.now() - timedelta(minutes=30)
+    if not isinstance(umbral_online, datetime):
+        raise cursor_no_valido()
+    filtros = {
+        "en_linea": and_(models.Cliente.session_id.isnot(None), models.Cliente.ultima_actividad > umbral_online),
+        # Complemento exacto del anterior (los NULL incluidos)
+        "resto": or_(models.Cliente.session_id.is_(None), models.Cliente.ultima_actividad.is_(None),
+                     models.Cliente.ultima_actividad <= umbral_online),
+    }
+
+    # 2. Jerarquía de roles (columna generada) e ID: mismo sentido -> comparación de filas indexada
+    claves = [(models.Cliente.rango_prioridad, True), (models.Cliente.cliente_id, True)]
+    valores = datos_cursor.get("k") or None # [] = principio del tramo
+    saltar = {"en_linea": skip, "resto": 0}
+    if skip and not cursor:
+        # OFFSET heredado: lo que no se consuma en el tramo 'en línea' se salta en el resto
+        saltar["resto"] = max(0, skip - query.filter(filtros["en_linea"]).count())
+
+    clientes = []
+    for nombre in TRAMOS_CLIENTES[TRAMOS_CLIENTES.index(tramo):]:
+        hueco = limit - len(clientes)
+        if hueco <= 0:
+            # Página completa justo al acabar 'en línea': el cursor abre el resto si queda algo
+            if db.query(query.filter(filtros[nombre]).exists()).scalar():
+                return clientes, codificar_cursor([], umbral=umbral_online, tramo=nombre)
+            break
+        pagina, siguiente = paginar(query.filter(filtros[nombre]), claves, hueco, valores,
+                                    saltar=0 if cursor else saltar[nombre], umbral=umbral_online, tramo=nombre)
+        clientes.extend(pagina)
+        if siguiente:
+            return clientes, siguiente
+        valores = None
+    return clientes, None
 
 
 # --- 2. ESCRIBIR (INSERT) ---
@@ -154,6 +187,9 @@ def update_cliente(db: Session, cliente_id: int, cliente_update: schemas.Cliente
 
     db.commit()
     db.refresh(db_cliente)
+    sesiones.invalidar() # Puede haber cambiado el CIF: se descartan todas las validaciones cacheadas
+    versiones.cambio_cliente(cliente_id)
+    cache_jerarquia.invalidar(cliente_id) # nombre_empresa va en la cabecera del árbol
     return db_cliente
 
 
@@ -166,6 +202,7 @@ def set_cliente_status(db: Session, cliente_id: int, activa: bool):
         db_cliente.activa = activa
         db.commit()
         db.refresh(db_cliente)
+        sesiones.invalidar(db_cliente.cif)
         return db_cliente
     return None
 
@@ -175,5 +212,8 @@ def delete_cliente(db: Session, cliente_id: int):
     if db_cliente:
         db.delete(db_cliente)
         db.commit()
+        sesiones.invalidar(db_cliente.cif)
+        sesiones.descartar_actividad(cliente_id)
+        cache_jerarquia.invalidar(cliente_id)
         return True
     return False
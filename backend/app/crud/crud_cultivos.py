@@ -7,9 +7,13 @@ Gestionar el catálogo botánico y sus parámetros técnicos asociados.
 Centraliza la lógica de joins para obtener datos técnicos (T/H) de forma atómica.
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, String
+from sqlalchemy import or_
 from typing import Optional, List
 from .. import models, schemas
+from .busqueda import contiene
+from .paginacion import decodificar_cursor, paginar
+from ..logic.versiones import versiones
+from ..logic.cache_jerarquia import cache_jerarquia
 
 def get_cultivo(db: Session, cultivo_id: int):
     """Busca un cultivo por su ID."""
@@ -29,9 +33,11 @@ def get_cultivo_completo(db: Session, cultivo_id: int):
     ).outerjoin(models.Cliente, models.Cultivo.cliente_id == models.Cliente.cliente_id
     ).filter(models.Cultivo.cultivo_id == cultivo_id).first()
 
-def get_cultivos(db: Session, skip: int = 0, limit: int = 200, ver_inactivos: bool = False, q: str = None):
+def get_cultivos(db: Session, skip: int = 0, limit: int = 200, ver_inactivos: bool = False, q: str = None,
+                 cursor: Optional[str] = None):
     """
     Listado maestro de cultivos con Join a clientes y soporte de búsqueda.
+    Paginado por cursor sobre 'nombre_cultivo' (único): devuelve ([(cultivo, nombre_cliente)], siguiente_cursor).
     """
     query = db.query(
         models.Cultivo,
@@ -42,12 +48,10 @@ def get_cultivos(db: Session, skip: int = 0, limit: int = 200, ver_inactivos: bo
         query = query.filter(models.Cultivo.activa == True)
     
     if q:
-        search = f"%{q}%"
-        query = query.filter(
-            func.unaccent(models.Cultivo.nombre_cultivo.cast(String)).ilike(func.unaccent(search))
-        )
+        query = query.filter(contiene(models.Cultivo.nombre_cultivo, q)) # Índice de trigramas (40-indices-busqueda.sql)
         
-    return query.order_by(models.Cultivo.nombre_cultivo).offset(skip).limit(limit).all()
+    valores = decodificar_cursor(cursor)["k"] if cursor else None
+    return paginar(query, [(models.Cultivo.nombre_cultivo, True)], limit, valores, saltar=skip)
 
 def create_cultivo(db: Session, cultivo: schemas.CultivoCreate, cliente_id: Optional[int] = None):
     """
@@ -86,6 +90,7 @@ def update_cultivo(db: Session, cultivo_id: int, cultivo_update: schemas.Cultivo
     if not db_cultivo:
         return None
     
+    renombrado = db_cultivo.nombre_cultivo != cultivo_update.nombre_cultivo
     db_cultivo.nombre_cultivo = cultivo_update.nombre_cultivo
     
     if cultivo_update.parametros:
@@ -111,8 +116,17 @@ def update_cultivo(db: Session, cultivo_id: int, cultivo_update: schemas.Cultivo
 
     db.commit()
     db.refresh(db_cultivo)
+    versiones.cambio_global() # Nombre y parámetros óptimos salen en el estado y la jerarquía de sus naves
+    if renombrado:
+        cache_jerarquia.invalidar(*clientes_con_cultivo(db, cultivo_id))
     return db_cultivo
 
+def clientes_con_cultivo(db: Session, cultivo_id: int) -> List[int]:
+    """Clientes con alguna nave plantada con este cultivo (su jerarquía muestra el nombre)."""
+    return [cliente_id for (cliente_id,) in db.query(models.Parcela.cliente_id)
+            .join(models.Invernadero, models.Invernadero.parcela_id == models.Parcela.parcela_id)
+            .filter(models.Invernadero.cultivo_id == cultivo_id).distinct()]
+
 def set_cultivo_status(db: Session, cultivo_id: int, activa: bool):
     """Cambia el estado de activación (visibilidad) de un cultivo."""
     db_cultivo = db.query(models.Cultivo).filter(models.Cultivo.cultivo_id == cultivo_id).first()
@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from ..logic.catalogo_tipos import catalogo
+from ..logic.versiones import versiones
 
 # --- TIPOS DE SENSOR ---
 def get_tipos_sensor(db: Session, skip: int = 0, limit: int = 100):
@@ -10,6 +12,7 @@ def create_tipo_sensor(db: Session, tipo: schemas.TipoSensorCreate):
     db.add(db_tipo)
     db.commit()
     db.refresh(db_tipo)
+    catalogo.invalidar()
     return db_tipo
 
 # --- SENSORES ---
@@ -21,6 +24,7 @@ def create_sensor(db: Session, sensor: schemas.SensorCreate):
     db.add(db_sensor)
     db.commit()
     db.refresh(db_sensor)
+    versiones.cambio_invernadero(db_sensor.invernadero_id)
     return db_sensor
 
 # --- TIPOS DE ACTUADOR ---
@@ -32,6 +36,7 @@ def create_tipo_actuador(db: Session, tipo: schemas.TipoActuadorCreate):
     db.add(db_tipo)
     db.commit()
     db.refresh(db_tipo)
+    catalogo.invalidar()
     return db_tipo
 
 # --- ACTUADORES ---
@@ -43,4 +48,5 @@ def create_actuador(db: Session, actuador: schemas.ActuadorCreate):
     db.add(db_actuador)
     db.commit()
     db.refresh(db_actuador)
+    versiones.cambio_invernadero(db_actuador.invernadero_id)
     return db_actuador
\ No newline at end of file
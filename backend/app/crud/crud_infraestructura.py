@@ -1,24 +1,39 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, String
+from sqlalchemy import and_, or_
 from typing import Optional, List
 from .. import models, schemas
+from .busqueda import contiene, contiene_codigo, orden_sin_tildes
+from .paginacion import decodificar_cursor, paginar
+from ..logic.versiones import versiones
+from ..logic.cache_jerarquia import cache_jerarquia
+
+def cambio_jerarquia(*cliente_ids):
+    """Write-through: nueva versión (ETag) y fuera de la caché el árbol de estos clientes."""
+    versiones.cambio_cliente(*cliente_ids)
+    cache_jerarquia.invalidar(*cliente_ids)
 
 # --- LOCALIDADES ---
 def get_localidad(db: Session, codigo_postal: str):
     return db.query(models.Localidad).filter(models.Localidad.codigo_postal == codigo_postal).first()
 
-def get_localidades(db: Session, skip: int = 0, limit: int = 1000, q: Optional[str] = None):
+def get_localidades(db: Session, skip: int = 0, limit: int = 1000, q: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    Localidades ordenadas por municipio (sin tildes) y CP. Paginado por cursor: devuelve (localidades, siguiente_cursor).
+    El orden lo sirve el índice idx_localidad_orden (40-indices-busqueda.sql).
+    """
     query = db.query(models.Localidad)
     if q:
-        search_filter = f"%{q}%"
+        # Cada rama del OR tiene su índice de trigramas (40-indices-busqueda.sql)
         query = query.filter(
             or_(
-                func.unaccent(models.Localidad.municipio.cast(String)).ilike(func.unaccent(search_filter)),
-                func.unaccent(models.Localidad.provincia.cast(String)).ilike(func.unaccent(search_filter)),
-                models.Localidad.codigo_postal.ilike(search_filter)
+                contiene(models.Localidad.municipio, q),
+                contiene(models.Localidad.provincia, q),
+                contiene_codigo(models.Localidad.codigo_postal, q)
             )
         )
-    return query.order_by(func.unaccent(models.Localidad.municipio.cast(String))).offset(skip).limit(limit).all()
+    claves = [(orden_sin_tildes(models.Localidad.municipio), True), (models.Localidad.codigo_postal, True)]
+    valores = decodificar_cursor(cursor)["k"] if cursor else None
+    return paginar(query, claves, limit, valores, saltar=skip)
 
 def create_localidad(db: Session, localidad: schemas.LocalidadCreate):
     db_localidad = models.Localidad(**localidad.model_dump())
@@ -39,8 +54,14 @@ def update_localidad(db: Session, codigo_postal: str, localidad_update: schemas.
         
     db.commit()
     db.refresh(db_localidad)
+    # Municipio/provincia aparecen en la jerarquía de los clientes con parcelas en este CP
+    cambio_jerarquia(*clientes_de_localidad(db, codigo_postal))
     return db_localidad
 
+def clientes_de_localidad(db: Session, codigo_postal: str) -> List[int]:
+    return [cliente_id for (cliente_id,) in db.query(models.Parcela.cliente_id)
+            .filter(models.Parcela.codigo_postal == codigo_postal).distinct()]
+
 
 # --- CULTIVOS (Legacy fallback) ---
 def get_cultivo(db: Session, cultivo_id: int):
@@ -68,6 +89,7 @@ def create_parcela(db: Session, parcela: schemas.ParcelaCreate):
     db.add(db_parcela)
     db.commit()
     db.refresh(db_parcela)
+    cambio_jerarquia(db_parcela.cliente_id)
     return db_parcela
 
 def get_parcelas_por_cliente(db: Session, cliente_id: int):
@@ -83,6 +105,7 @@ def update_parcela(db: Session, parcela_id: int, parcela_update: schemas.Parcela
 
     # [V11.1] Manejo robusto de actualización
     update_data = parcela_update.model_dump(exclude_unset=True)
+    cliente_anterior = db_parcela.cliente_id
 
     for key, value in update_data.items():
         if key != "confirmar_cambio_ref":
@@ -90,6 +113,7 @@ def update_parcela(db: Session, parcela_id: int, parcela_update: schemas.Parcela
             
     db.commit()
     db.refresh(db_parcela)
+    cambio_jerarquia(cliente_anterior, db_parcela.cliente_id)
     return db_parcela
 
 def delete_parcela(db: Session, parcela_id: int):
@@ -100,10 +124,14 @@ def delete_parcela(db: Session, parcela_id: int):
         db.query(models.Invernadero).filter(models.Invernadero.parcela_id == parcela_id).update({"activa": False})
         
         db.commit()
+        cambio_jerarquia(db_parcela.cliente_id)
         return True
     return False
 
 # --- INVERNADEROS ---
+def cliente_de_parcela(db: Session, parcela_id: int) -> Optional[int]:
+    return db.query(models.Parcela.cliente_id).filter(models.Parcela.parcela_id == parcela_id).scalar()
+
 def get_invernadero(db: Session, invernadero_id: int):
     return db.query(models.Invernadero).filter(models.Invernadero.invernadero_id == invernadero_id).first()
 
@@ -115,6 +143,7 @@ def create_invernadero(db: Session, invernadero: schemas.InvernaderoCreate):
     db.add(db_invernadero)
     db.commit()
     db.refresh(db_invernadero)
+    cambio_jerarquia(cliente_de_parcela(db, db_invernadero.parcela_id))
     return db_invernadero
 
 def get_invernaderos_por_cliente(db: Session, cliente_id: int):
@@ -127,11 +156,14 @@ def update_invernadero(db: Session, invernadero_id: int, invernadero_update: sch
 
     # [V11.1] Permitir nulos explícitos (ej: cultivo_id = null)
     update_data = invernadero_update.model_dump(exclude_unset=True)
+    parcela_anterior = db_invernadero.parcela_id
     for key, value in update_data.items():
         setattr(db_invernadero, key, value)
             
     db.commit()
     db.refresh(db_invernadero)
+    versiones.cambio_invernadero(invernadero_id)
+    cambio_jerarquia(*{cliente_de_parcela(db, p) for p in (parcela_anterior, db_invernadero.parcela_id)})
     return db_invernadero
 
 def delete_invernadero(db: Session, invernadero_id: int):
@@ -139,58 +171,75 @@ def delete_invernadero(db: Session, invernadero_id: int):
     if db_invernadero:
         db_invernadero.activa = False
         db.commit()
+        versiones.cambio_invernadero(invernadero_id)
+        cambio_jerarquia(cliente_de_parcela(db, db_invernadero.parcela_id))
         return True
     return False
 
 # --- JERARQUÍA DEL DASHBOARD ---
 def get_jerarquia_datos(db: Session, target_cliente_id: int, activa_only: bool = True):
-    query = db.query(models.Parcela).filter(models.Parcela.cliente_id == target_cliente_id)
+    """
+    Árbol localidad -> parcela -> invernadero de un cliente con UNA sola consulta.
+    Parcela JOIN localidad LEFT JOIN invernadero (+ cultivo), ordenado por parcela e invernadero,
+    se recorre una vez montando la estructura anidada (sin lazy loads ni ordenación en Python).
+    Las localidades aparecen en el orden de su primera parcela.
+    """
+    P, L, I, C = models.Parcela, models.Localidad, models.Invernadero, models.Cultivo
+
+    union_invernadero = I.parcela_id == P.parcela_id
     if activa_only:
-        query = query.filter(models.Parcela.activa == True)
-    
-    parcelas_db = query.order_by(models.Parcela.parcela_id).all()
+        # El filtro va en el ON: una parcela sin naves activas sigue saliendo (vacía)
+        union_invernadero = and_(union_invernadero, I.activa == True)
+
+    query = db.query(
+        L.codigo_postal, L.municipio, L.provincia,
+        P.parcela_id, P.nombre.label("parcela_nombre"), P.direccion, P.ref_catastral, P.activa.label("parcela_activa"),
+        I.invernadero_id, I.nombre.label("invernadero_nombre"), I.largo_m, I.ancho_m, I.activa.label("invernadero_activa"),
+        C.nombre_cultivo
+    ).join(L, L.codigo_postal == P.codigo_postal)\
+     .outerjoin(I, union_invernadero)\
+     .outerjoin(C, C.cultivo_id == I.cultivo_id)\
+     .filter(P.cliente_id == target_cliente_id)
+    if activa_only:
+        query = query.filter(P.activa == True)
+
     estruct_localidades = {}
-    
-    for parcela in parcelas_db:
-        cp = parcela.localidad.codigo_postal
-        if cp not in estruct_localidades:
-            estruct_localidades[cp] = {
-                "codigo_postal": str(cp),
-                "municipio": parcela.localidad.municipio,
-                "provincia": parcela.localidad.provincia,
-                "num_parcelas": 0,
-                "num_invernaderos_total": 0,
-                "parcelas": []
+    parcela_data = None
+    for fila in query.order_by(P.parcela_id, I.invernadero_id).yield_per(500):
+        if parcela_data is None or parcela_data["parcela_id"] != fila.parcela_id:
+            localidad = estruct_localidades.get(fila.codigo_postal)
+            if localidad is None:
+                localidad = estruct_localidades[fila.codigo_postal] = {
+                    "codigo_postal": str(fila.codigo_postal),
+                    "municipio": fila.municipio,
+                    "provincia": fila.provincia,
+                    "num_parcelas": 0,
+                    "num_invernaderos_total": 0,
+                    "parcelas": []
+                }
+            parcela_data = {
+                "parcela_id": fila.parcela_id,
+                "nombre": fila.parcela_nombre,
+                "direccion": fila.direccion,
+                "ref_catastral": fila.ref_catastral,
+                "activa": fila.parcela_activa,
+                "num_invernaderos": 0,
+                "invernaderos": []
             }
-            
-        invernaderos_lista = []
-        # [ORDEN ESTABLE]
-        invernaderos_objs = sorted(parcela.invernaderos, key=lambda x: x.invernadero_id)
-        for inv in invernaderos_objs:
-            if activa_only and not inv.activa:
-                continue
-                
-            invernaderos_lista.append({
-                "invernadero_id": inv.invernadero_id,
-                "nombre": inv.nombre,
-                "largo_m": inv.largo_m,
-                "ancho_m": inv.ancho_m,
-                "cultivo": inv.cultivo.nombre_cultivo if inv.cultivo else None,
-                "activa": inv.activa
-            })
-            
-        parcela_data = {
-            "parcela_id": parcela.parcela_id,
-            "nombre": parcela.nombre,
-            "direccion": parcela.direccion,
-            "ref_catastral": parcela.ref_catastral,
-            "activa": parcela.activa,
-            "num_invernaderos": len(invernaderos_lista),
-            "invernaderos": invernaderos_lista
-        }
-        
-        estruct_localidades[cp]["parcelas"].append(parcela_data)
-        estruct_localidades[cp]["num_parcelas"] += 1
-        estruct_localidades[cp]["num_invernaderos_total"] += len(invernaderos_lista)
-        
-    return list(estruct_localidades.values())
\ No newline at end of file
+            localidad["parcelas"].append(parcela_data)
+            localidad["num_parcelas"] += 1
+
+        if fila.invernadero_id is None:
+            continue # Parcela sin invernaderos (LEFT JOIN)
+        parcela_data["invernaderos"].append({
+            "invernadero_id": fila.invernadero_id,
+            "nombre": fila.invernadero_nombre,
+            "largo_m": fila.largo_m,
+            "ancho_m": fila.ancho_m,
+            "cultivo": fila.nombre_cultivo,
+            "activa": fila.invernadero_activa
+        })
+        parcela_data["num_invernaderos"] += 1
+        estruct_localidades[fila.codigo_postal]["num_invernaderos_total"] += 1
+
+    return list(estruct_localidades.values())
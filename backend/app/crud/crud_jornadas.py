@@ -0,0 +1,120 @@
+from typing import Optional
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from .. import models, schemas
+from ..logic.jornadas import resolutor as resolutor_jornadas
+from ..logic.versiones import versiones
+
+# --- CONVERSIÓN ConfigJornada <-> FILA ---
+def config_a_columnas(config: schemas.ConfigJornada) -> dict:
+    """Separa los flags (columnas propias) de los tramos (JSONB con las claves del formulario)."""
+    datos = config.model_dump(by_alias=True, exclude_none=False)
+    return {
+        "es_laborable": datos.pop("es_laborable"),
+        "heredar_de_global": datos.pop("heredar_de_global"),
+        "tramos": datos
+    }
+
+def fila_a_config(fila: models.JornadaConfig) -> schemas.ConfigJornada:
+    return schemas.ConfigJornada(**fila.tramos, es_laborable=fila.es_laborable,
+                                 heredar_de_global=fila.heredar_de_global)
+
+# --- LECTURA ---
+def get_jornada_cliente(db: Session, cliente_id: int) -> Optional[models.JornadaConfig]:
+    return db.query(models.JornadaConfig).filter(models.JornadaConfig.cliente_id == cliente_id).first()
+
+def get_jornada_invernadero(db: Session, invernadero_id: int) -> Optional[models.JornadaConfig]:
+    return db.query(models.JornadaConfig).filter(models.JornadaConfig.invernadero_id == invernadero_id).first()
+
+def get_resumen_jornadas_cliente(db: Session, cliente_id: int) -> list:
+    """Estado de la jornada de todas las naves del cliente en UNA consulta (LEFT JOIN)."""
+    filas = db.query(
+        models.Invernadero.invernadero_id,
+        models.Invernadero.nombre,
+        func.coalesce(models.Parcela.nombre, models.Parcela.ref_catastral).label("parcela_nombre"),
+        models.JornadaConfig.jornada_id,
+        models.JornadaConfig.es_laborable,
+        models.JornadaConfig.heredar_de_global
+    ).join(models.Parcela, models.Invernadero.parcela_id == models.Parcela.parcela_id)\
+     .outerjoin(models.JornadaConfig, models.JornadaConfig.invernadero_id == models.Invernadero.invernadero_id)\
+     .filter(models.Parcela.cliente_id == cliente_id)\
+     .order_by(models.Invernadero.invernadero_id).all()
+
+    return [{
+        "invernadero_id": f.invernadero_id,
+        "nombre": f.nombre,
+        "parcela_nombre": f.parcela_nombre,
+        "configurado": f.jornada_id is not None,
+        "es_laborable": True if f.es_laborable is None else f.es_laborable,
+        "heredar_de_global": bool(f.heredar_de_global)
+    } for f in filas]
+
+# --- ESCRITURA ---
+def upsert_jornada(db: Session, config: schemas.ConfigJornada, cliente_id: int = None, invernadero_id: int = None):
+    """
+    Inserta o sustituye la jornada de UN ámbito (cliente o invernadero). No hace commit:
+    lo usan los guardados de abajo y el importador de ficheros (scripts/importar_jornadas.py).
+    """
+    columnas = config_a_columnas(config)
+    conflicto = "invernadero_id" if invernadero_id is not None else "cliente_id"
+    stmt = pg_insert(models.JornadaConfig.__table__).values(
+        cliente_id=cliente_id if invernadero_id is None else None,
+        invernadero_id=invernadero_id,
+        **columnas
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[conflicto],
+        set_={**columnas, "fecha_actualizacion": func.now()}
+    ))
+
+def sincronizar_herencia_cliente(db: Session, cliente_id: int) -> int:
+    """
+    Pone TODAS las naves del cliente en modo 'heredar' con una sola sentencia
+    (INSERT ... SELECT ... ON CONFLICT DO UPDATE): las que ya tienen fila solo cambian
+    el flag y conservan sus tramos; las que no, reciben una fila vacía que hereda.
+    """
+    naves = select(
+        models.Invernadero.invernadero_id, literal(True), literal(True), literal({}, models.JornadaConfig.tramos.type)
+    ).join(models.Parcela, models.Invernadero.parcela_id == models.Parcela.parcela_id)\
+     .where(models.Parcela.cliente_id == cliente_id)
+
+    stmt = pg_insert(models.JornadaConfig.__table__).from_select(
+        ["invernadero_id", "es_laborable", "heredar_de_global", "tramos"], naves
+    )
+    resultado = db.execute(stmt.on_conflict_do_update(
+        index_elements=["invernadero_id"],
+        set_={"heredar_de_global": True, "fecha_actualizacion": func.now()}
+    ))
+    return resultado.rowcount
+
+def guardar_jornada_invernadero(db: Session, invernadero_id: int, config: schemas.ConfigJornada):
+    upsert_jornada(db, config, invernadero_id=invernadero_id)
+    db.commit()
+    resolutor_jornadas.invalidar()
+    versiones.cambio_global()
+
+def guardar_jornada_cliente(db: Session, cliente_id: int, config: schemas.ConfigJornada) -> int:
+    """Guarda la jornada maestra y sincroniza la herencia de sus naves (misma transacción)."""
+    upsert_jornada(db, config, cliente_id=cliente_id)
+    sincronizadas = sincronizar_herencia_cliente(db, cliente_id)
+    db.commit()
+    resolutor_jornadas.invalidar()
+    versiones.cambio_global()
+    return sincronizadas
+
+def resetear_jornadas_cliente(db: Session, cliente_id: int) -> int:
+    """Borra la jornada maestra y la de todas las naves del cliente. Retorna las naves limpiadas."""
+    naves = select(models.Invernadero.invernadero_id)\
+        .join(models.Parcela, models.Invernadero.parcela_id == models.Parcela.parcela_id)\
+        .where(models.Parcela.cliente_id == cliente_id)
+    borradas = db.query(models.JornadaConfig)\
+                 .filter(models.JornadaConfig.invernadero_id.in_(naves))\
+                 .delete(synchronize_session=False)
+    db.query(models.JornadaConfig)\
+      .filter(models.JornadaConfig.cliente_id == cliente_id)\
+      .delete(synchronize_session=False)
+    db.commit()
+    resolutor_jornadas.invalidar()
+    versiones.cambio_global()
+    return borradas
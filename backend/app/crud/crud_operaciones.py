@@ -1,17 +1,285 @@
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy import Integer, String, column, func, insert, literal, select, text, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from .paginacion import decodificar_cursor, paginar
+from ..logic.eventos import bus
+from ..logic.versiones import versiones
+
+# Límite físico de la columna MEDICION.valor (NUMERIC(10,2))
+VALOR_MAXIMO_MEDICION = 99999999.99
+
+# Resoluciones de MEDICION_AGREGADA (etiqueta -> segundos por cubeta)
+RESOLUCIONES_AGREGADO = {"1m": 60, "15m": 900, "1h": 3600}
+
+# Mantenimiento del histórico particionado (ver database/30-particionado-medicion.sql)
+MEDICION_PARTICIONES_FUTURAS = int(os.getenv("MEDICION_PARTICIONES_FUTURAS", "3"))
+MEDICION_RETENCION_MESES = int(os.getenv("MEDICION_RETENCION_MESES", "0")) # 0 = conservar todo
+MEDICION_RETENCION_MODO = os.getenv("MEDICION_RETENCION_MODO", "detach") # 'detach' (archivar) o 'drop' (borrar)
 
 # --- MEDICIONES ---
 def create_medicion(db: Session, medicion: schemas.MedicionCreate):
     db_medicion = models.Medicion(**medicion.dict())
     db.add(db_medicion)
+    db.flush() # Obtiene medicion_id y fecha_hora (RETURNING) antes del commit
+    insertada = {
+        "medicion_id": db_medicion.medicion_id,
+        "sensor_id": db_medicion.sensor_id,
+        "fecha_hora": db_medicion.fecha_hora,
+        "valor": db_medicion.valor
+    }
+    upsert_ultimas_lecturas(db, [insertada])
+    upsert_agregados(db, [insertada])
     db.commit()
     db.refresh(db_medicion)
+    bus.notificar_sensores([db_medicion.sensor_id])
+    versiones.cambio_sensores([db_medicion.sensor_id])
     return db_medicion
 
-def get_mediciones(db: Session, skip: int = 0, limit: int = 1000):
-    # Limitamos a 1000 por defecto porque pueden haber millones
-    return db.query(models.Medicion).order_by(models.Medicion.fecha_hora.desc()).offset(skip).limit(limit).all()
+def create_mediciones_lote(db: Session, mediciones: List[tuple[int, schemas.MedicionCreate]]) -> List[dict]:
+    """
+    Ingesta masiva: valida todas las lecturas en una pasada y las inserta con un
+    único INSERT multi-fila dentro de una sola transacción (un único commit).
+    mediciones: lista de (indice_original, MedicionCreate) ya validadas por Pydantic.
+    Retorna la lista de rechazos [{indice, sensor_id, motivo}] (el resto se guarda).
+    """
+    rechazos = []
+    if not mediciones:
+        return rechazos
+
+    # 1. Una sola consulta para comprobar qué sensores existen
+    ids_solicitados = {m.sensor_id for _, m in mediciones}
+    ids_existentes = {
+        fila[0] for fila in db.query(models.Sensor.sensor_id).filter(models.Sensor.sensor_id.in_(ids_solicitados)).all()
+    }
+
+    # 2. Validación de dominio fila a fila (sin tocar la BBDD)
+    # La hora por defecto se fija aquí para que todas las filas compartan columnas en el INSERT multi-fila
+    ahora = datetime.now(timezone.utc)
+    filas = []
+    for indice, m in mediciones:
+        if m.sensor_id not in ids_existentes:
+            rechazos.append({"indice": indice, "sensor_id": m.sensor_id, "motivo": "Sensor no registrado"})
+            continue
+        if not m.valor.is_finite() or abs(m.valor) > VALOR_MAXIMO_MEDICION:
+            rechazos.append({"indice": indice, "sensor_id": m.sensor_id, "motivo": "Valor fuera de rango"})
+            continue
+        filas.append({
+            "sensor_id": m.sensor_id,
+            "valor": m.valor,
+            "fecha_hora": m.fecha_hora or ahora
+        })
+
+    # 3. INSERT multi-fila + actualización de la última lectura + commit único
+    if filas:
+        insertadas = db.execute(
+            insert(models.Medicion).returning(
+                models.Medicion.medicion_id, models.Medicion.sensor_id,
+                models.Medicion.fecha_hora, models.Medicion.valor
+            ),
+            filas
+        ).mappings().all()
+        upsert_ultimas_lecturas(db, insertadas)
+        upsert_agregados(db, insertadas)
+        db.commit()
+        sensores = {m["sensor_id"] for m in insertadas}
+        bus.notificar_sensores(sensores)
+        versiones.cambio_sensores(sensores)
+    return rechazos
+
+def upsert_ultimas_lecturas(db: Session, mediciones: List[dict]):
+    """
+    Mantiene SENSOR_ULTIMA_LECTURA dentro de la transacción en curso (sin commit).
+    Solo se sobrescribe la fila si la nueva lectura es igual o más reciente, así
+    las lecturas que llegan tarde (fecha_hora antigua) no pisan el valor actual.
+    """
+    # Nos quedamos con la lectura más reciente de cada sensor del lote
+    por_sensor = {}
+    for m in mediciones:
+        actual = por_sensor.get(m["sensor_id"])
+        if actual is None or (m["fecha_hora"], m["medicion_id"]) > (actual["fecha_hora"], actual["medicion_id"]):
+            por_sensor[m["sensor_id"]] = m
+    if not por_sensor:
+        return
+
+    tabla = models.SensorUltimaLectura.__table__
+    stmt = pg_insert(tabla).values([
+        {"sensor_id": m["sensor_id"], "medicion_id": m["medicion_id"], "fecha_hora": m["fecha_hora"], "valor": m["valor"]}
+        for m in por_sensor.values()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.sensor_id],
+        set_={
+            "medicion_id": stmt.excluded.medicion_id,
+            "fecha_hora": stmt.excluded.fecha_hora,
+            "valor": stmt.excluded.valor
+        },
+        where=tabla.c.fecha_hora <= stmt.excluded.fecha_hora
+    )
+    db.execute(stmt)
+
+def inicio_cubeta(fecha_hora: datetime, resolucion_s: int) -> datetime:
+    """Inicio (UTC) de la cubeta de 'resolucion_s' segundos que contiene 'fecha_hora'."""
+    if fecha_hora.tzinfo is None:
+        fecha_hora = fecha_hora.replace(tzinfo=timezone.utc) # PostgreSQL guarda las horas sin zona como UTC
+    segundos = int(fecha_hora.timestamp())
+    return datetime.fromtimestamp(segundos - segundos % resolucion_s, tz=timezone.utc)
+
+def upsert_agregados(db: Session, mediciones: List[dict]):
+    """
+    Actualiza MEDICION_AGREGADA de forma incremental dentro de la transacción en curso (sin commit).
+    El lote se pre-agrega en memoria, así cada cubeta afectada recibe un único UPSERT
+    (mín/máx se combinan con LEAST/GREATEST y suma/cuenta se acumulan).
+    """
+    cubetas = {}
+    for m in mediciones:
+        for resolucion_s in RESOLUCIONES_AGREGADO.values():
+            clave = (m["sensor_id"], resolucion_s, inicio_cubeta(m["fecha_hora"], resolucion_s))
+            actual = cubetas.get(clave)
+            if actual is None:
+                cubetas[clave] = {"minimo": m["valor"], "maximo": m["valor"], "suma": m["valor"], "cuenta": 1}
+            else:
+                actual["minimo"] = min(actual["minimo"], m["valor"])
+                actual["maximo"] = max(actual["maximo"], m["valor"])
+                actual["suma"] += m["valor"]
+                actual["cuenta"] += 1
+    if not cubetas:
+        return
+
+    tabla = models.MedicionAgregada.__table__
+    stmt = pg_insert(tabla).values([
+        {"sensor_id": sensor_id, "resolucion_s": resolucion_s, "bucket": bucket, **agregado}
+        for (sensor_id, resolucion_s, bucket), agregado in cubetas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.sensor_id, tabla.c.resolucion_s, tabla.c.bucket],
+        set_={
+            "minimo": func.least(tabla.c.minimo, stmt.excluded.minimo),
+            "maximo": func.greatest(tabla.c.maximo, stmt.excluded.maximo),
+            "suma": tabla.c.suma + stmt.excluded.suma,
+            "cuenta": tabla.c.cuenta + stmt.excluded.cuenta
+        }
+    )
+    db.execute(stmt)
+
+def backfill_ultimas_lecturas(db: Session) -> int:
+    """
+    Reconstruye SENSOR_ULTIMA_LECTURA a partir del histórico de MEDICION
+    (bases de datos existentes). Un único INSERT ... SELECT DISTINCT ON.
+    Retorna el número de sensores actualizados.
+    """
+    ultimas = select(
+        models.Medicion.sensor_id, models.Medicion.medicion_id,
+        models.Medicion.fecha_hora, models.Medicion.valor
+    ).distinct(models.Medicion.sensor_id).order_by(
+        models.Medicion.sensor_id, models.Medicion.fecha_hora.desc(), models.Medicion.medicion_id.desc()
+    )
+    tabla = models.SensorUltimaLectura.__table__
+    stmt = pg_insert(tabla).from_select(["sensor_id", "medicion_id", "fecha_hora", "valor"], ultimas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.sensor_id],
+        set_={
+            "medicion_id": stmt.excluded.medicion_id,
+            "fecha_hora": stmt.excluded.fecha_hora,
+            "valor": stmt.excluded.valor
+        },
+        where=tabla.c.fecha_hora <= stmt.excluded.fecha_hora
+    )
+    resultado = db.execute(stmt)
+    db.commit()
+    return resultado.rowcount
+
+def backfill_agregados(db: Session) -> int:
+    """
+    Recalcula MEDICION_AGREGADA a partir del histórico de MEDICION (bases de datos existentes).
+    Sobrescribe las cubetas con el valor recalculado, por lo que es idempotente.
+    Retorna el número de cubetas escritas.
+    """
+    tabla = models.MedicionAgregada.__table__
+    escritas = 0
+    for resolucion_s in RESOLUCIONES_AGREGADO.values():
+        bucket = func.to_timestamp(
+            func.floor(func.extract("epoch", models.Medicion.fecha_hora) / resolucion_s) * resolucion_s
+        )
+        agregados = select(
+            models.Medicion.sensor_id, literal(resolucion_s), bucket,
+            func.min(models.Medicion.valor), func.max(models.Medicion.valor),
+            func.sum(models.Medicion.valor), func.count()
+        ).group_by(models.Medicion.sensor_id, bucket)
+        stmt = pg_insert(tabla).from_select(
+            ["sensor_id", "resolucion_s", "bucket", "minimo", "maximo", "suma", "cuenta"], agregados
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.sensor_id, tabla.c.resolucion_s, tabla.c.bucket],
+            set_={c: stmt.excluded[c] for c in ("minimo", "maximo", "suma", "cuenta")}
+        )
+        escritas += db.execute(stmt).rowcount
+    db.commit()
+    return escritas
+
+def get_serie_agregada(db: Session, sensor_id: int, resolucion_s: int, desde: datetime, hasta: datetime):
+    """Cubetas de MEDICION_AGREGADA de un sensor en [desde, hasta), en orden cronológico."""
+    return db.query(models.MedicionAgregada).filter(
+        models.MedicionAgregada.sensor_id == sensor_id,
+        models.MedicionAgregada.resolucion_s == resolucion_s,
+        models.MedicionAgregada.bucket >= inicio_cubeta(desde, resolucion_s),
+        models.MedicionAgregada.bucket < hasta
+    ).order_by(models.MedicionAgregada.bucket).all()
+
+def get_serie_cruda(db: Session, sensor_id: int, desde: datetime, hasta: datetime, limit: int):
+    """Mediciones crudas de un sensor en [desde, hasta), en orden cronológico."""
+    return db.query(models.Medicion).filter(
+        models.Medicion.sensor_id == sensor_id,
+        models.Medicion.fecha_hora >= desde,
+        models.Medicion.fecha_hora < hasta
+    ).order_by(models.Medicion.fecha_hora).limit(limit).all()
+
+# Orden de los listados de mediciones: más recientes primero, medicion_id desempata
+CLAVES_MEDICION = [(models.Medicion.fecha_hora, False), (models.Medicion.medicion_id, False)]
+
+def get_mediciones_sensor(db: Session, sensor_id: int, limit: int = 20, desde: datetime = None, cursor: Optional[str] = None):
+    """
+    Últimas 'limit' mediciones de un sensor (más recientes primero).
+    Con 'cursor' continúa hacia atrás desde la última página servida: devuelve (mediciones, siguiente_cursor).
+    """
+    query = db.query(models.Medicion).filter(models.Medicion.sensor_id == sensor_id)
+    if desde:
+        # Acota la ventana temporal: PostgreSQL solo recorre las particiones mensuales implicadas
+        query = query.filter(models.Medicion.fecha_hora >= desde)
+    valores = decodificar_cursor(cursor)["k"] if cursor else None
+    return paginar(query, CLAVES_MEDICION, limit, valores)
+
+def get_mediciones(db: Session, skip: int = 0, limit: int = 1000, cursor: Optional[str] = None):
+    # Limitamos a 1000 por defecto porque pueden haber millones (y OFFSET no escala: mejor 'cursor')
+    valores = decodificar_cursor(cursor)["k"] if cursor else None
+    return paginar(db.query(models.Medicion), CLAVES_MEDICION, limit, valores, saltar=skip)
+
+def crear_particiones_medicion(db: Session, meses_adelante: int = MEDICION_PARTICIONES_FUTURAS) -> int:
+    """
+    Crea las particiones mensuales de MEDICION que falten (mes actual + N futuros).
+    Retorna cuántas se han creado (0 si ya existían o si la tabla no está particionada).
+    """
+    creadas = db.execute(text("SELECT sira_crear_particiones_medicion(:meses)"), {"meses": meses_adelante}).scalar()
+    db.commit()
+    return creadas
+
+def aplicar_retencion_medicion(db: Session, meses_retencion: int = MEDICION_RETENCION_MESES,
+                               modo: str = MEDICION_RETENCION_MODO) -> List[str]:
+    """
+    Suelta las particiones de MEDICION más antiguas que la ventana de retención
+    ('detach' las deja como tablas sueltas para archivarlas, 'drop' las elimina).
+    Retorna los nombres de las particiones afectadas. Con meses_retencion <= 0 no hace nada.
+    """
+    if meses_retencion <= 0:
+        return []
+    particiones = db.execute(
+        text("SELECT sira_retencion_medicion(:meses, :modo)"), {"meses": meses_retencion, "modo": modo}
+    ).scalars().all()
+    db.commit()
+    return particiones
 
 # --- ACCIONES DE ACTUADORES ---
 def create_accion(db: Session, accion: schemas.AccionActuadorCreate):
@@ -19,8 +287,52 @@ def create_accion(db: Session, accion: schemas.AccionActuadorCreate):
     db.add(db_accion)
     db.commit()
     db.refresh(db_accion)
+    bus.notificar_actuadores([db_accion.actuador_id])
+    versiones.cambio_actuadores([db_accion.actuador_id])
     return db_accion
 
+def aplicar_decisiones(db: Session, decisiones: List[tuple[int, str, str]]) -> int:
+    """
+    Sumidero de decisiones del cerebro: aplica varios cambios de estado de golpe.
+    decisiones: lista de (actuador_id, nuevo_estado, accion_detalle).
+    Un único UPDATE ... FROM (VALUES ...) para los estados, un INSERT multi-fila
+    para el log de ACCION_ACTUADOR y un solo commit. Retorna cuántas se han aplicado.
+    """
+    if not decisiones:
+        return 0
+
+    nuevos = values(
+        column("actuador_id", Integer), column("estado", String), name="nuevos"
+    ).data([(actuador_id, estado) for actuador_id, estado, _ in decisiones])
+    tabla = models.Actuador.__table__
+    db.execute(
+        update(tabla)
+        .where(tabla.c.actuador_id == nuevos.c.actuador_id)
+        .values(estado_actuador=nuevos.c.estado)
+    )
+    db.execute(insert(models.AccionActuador.__table__), [
+        {"actuador_id": actuador_id, "accion_detalle": detalle} for actuador_id, _, detalle in decisiones
+    ])
+    db.commit()
+    actuadores = [actuador_id for actuador_id, _, _ in decisiones]
+    bus.notificar_actuadores(actuadores)
+    versiones.cambio_actuadores(actuadores)
+    return len(decisiones)
+
+def get_ultimas_acciones(db: Session, actuador_ids: List[int]) -> dict:
+    """
+    Última acción registrada de cada actuador en UNA sola consulta (DISTINCT ON actuador_id).
+    Retorna {actuador_id: AccionActuador}. Los actuadores sin historial no aparecen.
+    """
+    if not actuador_ids:
+        return {}
+    filas = db.query(models.AccionActuador)\
+              .filter(models.AccionActuador.actuador_id.in_(actuador_ids))\
+              .distinct(models.AccionActuador.actuador_id)\
+              .order_by(models.AccionActuador.actuador_id, models.AccionActuador.fecha_hora.desc(), models.AccionActuador.accion_id.desc())\
+              .all()
+    return {a.actuador_id: a for a in filas}
+
 def get_ultima_accion_manual(db: Session, actuador_id: int):
     """Obtiene la última acción de un actuador que haya sido desencadenada manualmente (Cortesía)."""
     return db.query(models.AccionActuador).filter(
@@ -33,6 +345,8 @@ def update_estado_actuador(db: Session, actuador_id: int, nuevo_estado: str):
     if actuador:
         actuador.estado_actuador = nuevo_estado
         db.commit()
+        bus.notificar_actuadores([actuador_id])
+        versiones.cambio_actuadores([actuador_id])
     return actuador
 
 # --- RECOMENDACIONES DE RIEGO ---
@@ -41,4 +355,4 @@ def create_recomendacion(db: Session, recomendacion: schemas.RecomendacionRiegoC
     db.add(db_rec)
     db.commit()
     db.refresh(db_rec)
-    return db_rec
\ No newline at end of file
+    return db_rec
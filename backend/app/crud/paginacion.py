@@ -0,0 +1,103 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+Con OFFSET, la página N obliga a PostgreSQL a generar y descartar todas las filas anteriores:
+el coste crece con la profundidad. Con un cursor se continúa justo DESPUÉS de la última fila
+servida ("WHERE claves > últimas claves ORDER BY claves LIMIT n") y cada página cuesta lo mismo.
+
+  - El cursor es opaco para el cliente: base64url de un JSON {"k": [valores de las claves de
+    orden de la última fila], ...extra}. Se devuelve en la cabecera X-Next-Cursor (ausente en
+    la última página) y se reenvía en el parámetro 'cursor' con los MISMOS filtros.
+  - Las claves de orden deben identificar la fila de forma única (la última suele ser el id).
+  - Un cursor manipulado o de otro listado responde 400 (también si un valor no es del tipo de
+    su clave: no llega a la BBDD como un error de tipos).
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import and_, literal, or_, tuple_
+
+CABECERA_CURSOR = "X-Next-Cursor"
+
+
+def cursor_no_valido() -> HTTPException:
+    return HTTPException(status_code=400, detail="Cursor no válido.")
+
+
+def codificar_cursor(valores: list, **extra) -> str:
+    def a_json(valor):
+        if isinstance(valor, datetime):
+            return {"dt": valor.isoformat()}
+        raise TypeError(f"Tipo no serializable en el cursor: {type(valor).__name__}")
+    datos = json.dumps({"k": list(valores), **extra}, default=a_json, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> dict:
+    try:
+        datos = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(datos, object_hook=lambda o: datetime.fromisoformat(o["dt"]) if set(o) == {"dt"} else o)
+    except (ValueError, TypeError, KeyError):
+        raise cursor_no_valido()
+    if not isinstance(payload, dict) or not isinstance(payload.get("k"), list):
+        raise cursor_no_valido()
+    return payload
+
+
+def valor_de_clave(expresion, valor) -> bool:
+    """¿'valor' (leído de un cursor) es del tipo de la clave 'expresion'?"""
+    if valor is None or isinstance(valor, (bool, list, dict)):
+        return False
+    try:
+        tipo = expresion.type.python_type
+    except NotImplementedError:
+        return True # Tipo desconocido (p. ej. función sin type_): cualquier escalar
+    if tipo in (int, float, Decimal):
+        return isinstance(valor, int) if tipo is int else isinstance(valor, (int, float))
+    return isinstance(valor, tipo)
+
+
+def despues_de(claves: list, valores: list):
+    """
+    Condición "fila posterior a 'valores'" para el orden 'claves' = [(expresión, ascendente)].
+    Si todas van en el mismo sentido se usa una comparación de filas (aprovecha índices
+    compuestos); si se mezclan, la forma expandida (a > x) OR (a = x AND b > y) ...
+    """
+    if len(claves) != len(valores) or not all(valor_de_clave(e, v) for (e, _), v in zip(claves, valores)):
+        raise cursor_no_valido()
+    sentidos = {ascendente for _, ascendente in claves}
+    if len(sentidos) == 1:
+        fila = tuple_(*[e for e, _ in claves])
+        ultima = tuple_(*[literal(v, e.type) for (e, _), v in zip(claves, valores)])
+        return fila > ultima if sentidos.pop() else fila < ultima
+    ramas = []
+    for i, (expresion, ascendente) in enumerate(claves):
+        iguales = [claves[j][0] == valores[j] for j in range(i)]
+        ramas.append(and_(*iguales, expresion > valores[i] if ascendente else expresion < valores[i]))
+    return or_(*ramas)
+
+
+def paginar(query, claves: list, limite: int, valores: list = None, saltar: int = 0, **extra) -> tuple:
+    """
+    Aplica orden, cursor y límite a 'query'. Devuelve (filas, siguiente_cursor | None).
+    Las filas tienen la misma forma que devolvería query.all() sin paginar.
+    'saltar' (OFFSET) solo se mantiene por compatibilidad y se ignora si hay cursor.
+    'extra' viaja dentro del cursor (p. ej. parámetros que deben quedar fijos entre páginas).
+    """
+    columnas = len(query.column_descriptions)
+    if valores is not None:
+        query = query.filter(despues_de(claves, valores))
+    query = query.add_columns(*[e for e, _ in claves])\
+                 .order_by(*[e.asc() if ascendente else e.desc() for e, ascendente in claves])
+    if valores is None and saltar:
+        query = query.offset(saltar)
+    filas = query.limit(limite + 1).all() # Una de más: indica si hay página siguiente
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1][columnas:], **extra)
+    return [f[0] if columnas == 1 else tuple(f[:columnas]) for f in filas], siguiente
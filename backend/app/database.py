@@ -14,14 +14,22 @@ Aquí definimos 3 elementos clave que usará el resto de la aplicación:
 1. El 'engine' (motor) de SQLAlchemy.
 2. La 'SessionLocal' (fábrica de sesiones) para interactuar con la BBDD.
 3. La 'Base' declarativa de la cual heredarán todos nuestros modelos ORM.
+
+Opcionalmente (SIRA_DB_ASYNC=1) se crea también un motor asíncrono (asyncpg) para
+los endpoints 'async def' de las rutas calientes (autenticación y telemetría).
 """
 
 # --- Importaciones Necesarias ---
 import os # Para poder leer variables de entorno (el .env)
 import sys # Para detener el programa si falta configuración crítica
-from sqlalchemy import create_engine
+import time
+from collections import deque
+from fastapi import Depends
+from sqlalchemy import create_engine, exc as sa_exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 # --- 1. URL DE CONEXIÓN (Seguridad - Leído del .env) ---
 # Leemos la variable de entorno 'DATABASE_URL' que Docker Compose nos inyecta.
@@ -45,10 +53,99 @@ if not SQLALCHEMY_DATABASE_URL:
 # Esto es vital para Docker. Antes de usar una conexión, SQLAlchemy le hace un "ping".
 # Si la BBDD se reinició y la conexión es vieja, la descarta y crea una nueva.
 # Evita errores de "connection closed" en producción.
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    pool_pre_ping=True
-)
+#
+# Dimensionado del pool (por PROCESO): cada worker de uvicorn tiene su propio pool, así que
+# el máximo de conexiones a PostgreSQL es  workers x (SIRA_DB_POOL_SIZE + SIRA_DB_MAX_OVERFLOW)
+# y debe quedar por debajo de 'max_connections'. El uso real se ve en GET /api/v1/sistema/db/pool.
+POOL_SIZE = int(os.getenv("SIRA_DB_POOL_SIZE", "5"))                 # Conexiones que se mantienen abiertas
+MAX_OVERFLOW = int(os.getenv("SIRA_DB_MAX_OVERFLOW", "10"))          # Extra temporales en picos
+POOL_TIMEOUT_S = float(os.getenv("SIRA_DB_POOL_TIMEOUT_S", "30"))    # Espera máxima por una conexión libre
+POOL_RECYCLE_S = int(os.getenv("SIRA_DB_POOL_RECYCLE_S", "1800"))    # Renueva conexiones más viejas (-1 = nunca)
+STATEMENT_TIMEOUT_MS = int(os.getenv("SIRA_DB_STATEMENT_TIMEOUT_MS", "0")) # Corta consultas largas (0 = sin límite)
+
+
+class MetricasPool:
+    """Esperas por conexión de un pool (en memoria, por proceso)."""
+
+    def __init__(self):
+        self.esperas = 0
+        self.timeouts = 0
+        self.espera_total_ms = 0.0
+        self.espera_ms = deque(maxlen=1000)
+
+    def registrar_espera(self, espera_ms: float, timeout: bool = False):
+        self.esperas += 1
+        self.timeouts += timeout
+        self.espera_total_ms += espera_ms
+        self.espera_ms.append(espera_ms)
+
+    def resumen(self) -> dict:
+        muestras = sorted(self.espera_ms)
+
+        def percentil(p):
+            if not muestras:
+                return None
+            return round(muestras[min(len(muestras) - 1, int(len(muestras) * p))], 2)
+
+        return {
+            "checkouts": self.esperas,
+            "timeouts": self.timeouts,
+            "espera_media_ms": round(self.espera_total_ms / self.esperas, 3) if self.esperas else None,
+            "espera_ms": {"p50": percentil(0.50), "p95": percentil(0.95), "p99": percentil(0.99),
+                          "max": round(muestras[-1], 2) if muestras else None}
+        }
+
+
+class _EsperaMedida:
+    """Mide cuánto tarda cada checkout en conseguir conexión (incluye la espera por el pool lleno)."""
+    metricas: MetricasPool
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metricas.registrar_espera((time.perf_counter() - inicio) * 1000, timeout=True)
+            raise
+        self.metricas.registrar_espera((time.perf_counter() - inicio) * 1000)
+        return conexion
+
+
+class PoolMedido(_EsperaMedida, QueuePool):
+    metricas = MetricasPool()
+
+
+class PoolMedidoAsync(_EsperaMedida, AsyncAdaptedQueuePool):
+    metricas = MetricasPool()
+
+
+def opciones_motor(url: str, asincrono: bool = False) -> dict:
+    """Argumentos de create_engine / create_async_engine según la configuración por entorno."""
+    opciones = {"pool_pre_ping": True}
+    if url.startswith("sqlite"):
+        return opciones # SQLite (pruebas locales): pool por defecto, sin sizing ni statement_timeout
+
+    opciones.update(
+        poolclass=PoolMedidoAsync if asincrono else PoolMedido,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT_S,
+        pool_recycle=POOL_RECYCLE_S,
+    )
+    if STATEMENT_TIMEOUT_MS > 0:
+        if asincrono:
+            opciones["connect_args"] = {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}}
+        else:
+            opciones["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+    return opciones
+
+
+def crear_motor(url: str):
+    """Motor síncrono único de la aplicación (API, scripts y planificador)."""
+    return create_engine(url, **opciones_motor(url))
+
+
+engine = crear_motor(SQLALCHEMY_DATABASE_URL)
 
 
 # --- 3. LA FÁBRICA DE SESIONES (SessionLocal) ---
@@ -84,4 +181,91 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# =============================================================================
+# 6. CAMINO ASÍNCRONO (Opcional: SIRA_DB_ASYNC=1)
+# =============================================================================
+# Los endpoints 'def' corren en el threadpool de Starlette, pero los 'async def' corren
+# en el event loop: una consulta bloqueante ahí congela TODAS las peticiones concurrentes.
+# Para ellos existe 'get_async_db', que entrega una 'SesionAsync':
+#   - Con SIRA_DB_ASYNC=1: AsyncSession sobre asyncpg (E/S no bloqueante).
+#   - Sin él (por defecto): la Session síncrona de la petición, ejecutada en el threadpool.
+# En ambos casos el CRUD existente (escrito para Session) se reutiliza tal cual con 'run_sync'.
+DB_ASYNC = os.getenv("SIRA_DB_ASYNC", "0") == "1"
+
+def url_asincrona(url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://... (respeta un driver ya indicado)."""
+    esquema, _, resto = url.partition("://")
+    return f"postgresql+asyncpg://{resto}" if esquema in ("postgresql", "postgres", "postgresql+psycopg2") else url
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    url_async = url_asincrona(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(url_async, **opciones_motor(url_async, asincrono=True))
+    # expire_on_commit=False: los objetos siguen legibles tras el commit sin otra consulta (lazy IO no vale en async)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class SesionAsync:
+    """Sesión para endpoints 'async def': ejecuta funciones CRUD síncronas sin bloquear el event loop."""
+
+    def __init__(self, sesion_async=None, sesion: Session = None):
+        self.sesion_async = sesion_async
+        self.sesion = sesion
+
+    async def run_sync(self, funcion, *args, **kwargs):
+        """Llama a funcion(session, *args, **kwargs) y devuelve su resultado."""
+        if self.sesion_async is not None:
+            return await self.sesion_async.run_sync(funcion, *args, **kwargs)
+        return await run_in_threadpool(funcion, self.sesion, *args, **kwargs)
+
+
+async def get_async_db(db: Session = Depends(get_db)):
+    """
+    Dependencia para endpoints 'async def':  db: SesionAsync = Depends(get_async_db)
+    Sin SIRA_DB_ASYNC envuelve la misma Session de la petición (la de 'get_db').
+    """
+    if AsyncSessionLocal is None:
+        yield SesionAsync(sesion=db)
+        return
+    async with AsyncSessionLocal() as sesion_async:
+        yield SesionAsync(sesion_async=sesion_async)
+
+
+# =============================================================================
+# 7. ESTADO DEL POOL (Endpoint de administración)
+# =============================================================================
+def estado_pool(motor) -> dict:
+    """Foto del pool de un motor: conexiones en uso, libres, overflow y esperas por checkout."""
+    pool = motor.pool
+    estado = {"clase": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        estado.update(
+            tamano=pool.size(),
+            en_uso=pool.checkedout(),
+            libres=pool.checkedin(),
+            overflow=max(pool.overflow(), 0), # Negativo mientras el pool aún no se ha llenado
+            max_overflow=MAX_OVERFLOW,
+        )
+    if isinstance(pool, _EsperaMedida):
+        estado.update(pool.metricas.resumen())
+    return estado
+
+def resumen_pools() -> dict:
+    return {
+        "configuracion": {
+            "pool_size": POOL_SIZE,
+            "max_overflow": MAX_OVERFLOW,
+            "pool_timeout_s": POOL_TIMEOUT_S,
+            "pool_recycle_s": POOL_RECYCLE_S,
+            "statement_timeout_ms": STATEMENT_TIMEOUT_MS,
+            "conexiones_max_por_proceso": (POOL_SIZE + MAX_OVERFLOW) * (2 if async_engine is not None else 1),
+            "pid": os.getpid()
+        },
+        "sincrono": estado_pool(engine),
+        "asincrono": estado_pool(async_engine.sync_engine) if async_engine is not None else None
+    }
@@ -0,0 +1,155 @@
+"""
+Caché de las Consultas Geográficas Externas (Zippopotam / Nominatim).
+
+Solo entra en juego con SIRA_GEO_EXTERNO=1 (ver logic/indice_geo.py). Sin ella, cada pulsación
+del buscador de municipios y cada CP desconocido volvía a salir a internet. Ahora
+geo_logic.consultar_zippopotam / consultar_municipio_externo pasan por 'obtener':
+  - Dos niveles: memoria del proceso (LRU, GEO_CACHE_MAX entradas) y la tabla GEO_CACHE,
+    que sobrevive a los reinicios y se comparte entre workers.
+  - TTL: GEO_CACHE_TTL_H para respuestas con datos y GEO_CACHE_TTL_NEGATIVO_H (más corto)
+    para los "no encontrado" (caché negativa). Los errores de red NO se cachean.
+  - Coalescencia: si varias peticiones piden a la vez la misma clave, solo la primera sale
+    fuera; el resto espera su resultado.
+Las filas caducadas se sobrescriben en la siguiente consulta de esa clave.
+Si la tabla no existe (BBDD sin migrar) se sigue funcionando solo en memoria.
+"""
+import os
+import threading
+import time as reloj
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+CACHE_MAX = int(os.getenv("GEO_CACHE_MAX", "1024"))
+TTL_S = float(os.getenv("GEO_CACHE_TTL_H", "720")) * 3600
+TTL_NEGATIVO_S = float(os.getenv("GEO_CACHE_TTL_NEGATIVO_H", "24")) * 3600
+ESPERA_MAX_S = 30 # Tope de espera de una petición coalescida (las consultas externas tienen timeout de 5 s)
+
+_NADA = object()
+
+
+class CacheGeo:
+
+    def __init__(self, fabrica_sesion=None, maximo: int = CACHE_MAX):
+        self.fabrica_sesion = fabrica_sesion # None = SessionLocal (se importa al usarla)
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        # {clave: (valor, instante de caducidad)}
+        self._entradas = OrderedDict()
+        self._en_vuelo = {} # {clave: Future} de las consultas en curso
+        self.aciertos = 0
+        self.aciertos_bbdd = 0
+        self.coalescidas = 0
+        self.consultas_externas = 0
+        self.negativas = 0
+        self.errores = 0
+
+    def obtener(self, clave: str, consultar):
+        """
+        Valor cacheado de 'clave' o, si no lo hay, el de consultar() (que se guarda).
+        consultar() devuelve None / [] si no hay resultados y LANZA si falla la red:
+        la excepción llega a quien llama (y a los coalescidos) sin cachearse.
+        """
+        with self._lock:
+            valor = self._de_memoria(clave)
+            if valor is not _NADA:
+                self.aciertos += 1
+                return valor
+            futuro = self._en_vuelo.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = self._en_vuelo[clave] = Future()
+            else:
+                self.coalescidas += 1
+        if not propio:
+            return futuro.result(timeout=ESPERA_MAX_S)
+
+        try:
+            valor, caduca = self._de_bbdd(clave)
+            if valor is _NADA:
+                self.consultas_externas += 1
+                valor = consultar()
+                caduca = reloj.time() + (TTL_S if valor else TTL_NEGATIVO_S)
+                if not valor:
+                    self.negativas += 1
+                self._persistir(clave, valor, caduca)
+            else:
+                self.aciertos_bbdd += 1
+            with self._lock:
+                self._a_memoria(clave, valor, caduca)
+            futuro.set_result(valor)
+            return valor
+        except Exception as e:
+            self.errores += 1
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+    # --- Memoria (con el lock tomado) ---
+    def _de_memoria(self, clave: str):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return _NADA
+        if entrada[1] < reloj.time():
+            del self._entradas[clave]
+            return _NADA
+        self._entradas.move_to_end(clave)
+        return entrada[0]
+
+    def _a_memoria(self, clave: str, valor, caduca: float):
+        self._entradas[clave] = (valor, caduca)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.maximo:
+            self._entradas.popitem(last=False)
+
+    # --- Tabla GEO_CACHE ---
+    def _sesion(self):
+        if self.fabrica_sesion is None:
+            from ..database import SessionLocal
+            self.fabrica_sesion = SessionLocal
+        return self.fabrica_sesion()
+
+    def _de_bbdd(self, clave: str) -> tuple:
+        from .. import models
+        try:
+            with self._sesion() as db:
+                fila = db.query(models.GeoCache.respuesta, models.GeoCache.caduca)\
+                         .filter(models.GeoCache.clave == clave).first()
+        except Exception as e:
+            print(f"⚠️ Caché geográfica: no se pudo leer GEO_CACHE ({e.__class__.__name__}); solo memoria.")
+            return _NADA, None
+        if fila is None:
+            return _NADA, None
+        caduca = fila.caduca if fila.caduca.tzinfo else fila.caduca.replace(tzinfo=timezone.utc)
+        if caduca.timestamp() < reloj.time():
+            return _NADA, None
+        return fila.respuesta, caduca.timestamp()
+
+    def _persistir(self, clave: str, valor, caduca: float):
+        from .. import models
+        try:
+            with self._sesion() as db:
+                db.merge(models.GeoCache(clave=clave, respuesta=valor,
+                                         caduca=datetime.fromtimestamp(caduca, tz=timezone.utc)))
+                db.commit()
+        except Exception as e:
+            print(f"⚠️ Caché geográfica: no se pudo guardar '{clave}' en GEO_CACHE ({e.__class__.__name__}).")
+
+    def resumen(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "maximo": self.maximo,
+            "ttl_h": TTL_S / 3600,
+            "ttl_negativo_h": TTL_NEGATIVO_S / 3600,
+            "aciertos": self.aciertos,
+            "aciertos_bbdd": self.aciertos_bbdd,
+            "coalescidas": self.coalescidas,
+            "consultas_externas": self.consultas_externas,
+            "negativas": self.negativas,
+            "errores": self.errores
+        }
+
+
+cache_geo = CacheGeo()
@@ -0,0 +1,86 @@
+"""
+Caché de la Jerarquía del Dashboard (por proceso).
+
+GET /api/v1/clientes/me/jerarquia se pide en cada navegación del dashboard y el árbol casi
+nunca cambia. Se guarda ya serializado (JSON de schemas.JerarquiaCliente) por
+(cliente_id, ver_ocultos):
+
+  - Invalidación write-through: las altas/cambios/bajas de crud_infraestructura (parcelas,
+    invernaderos, localidades), los renombrados de cultivos y los cambios del cliente
+    descartan justo las entradas de los clientes afectados.
+  - Expulsión LRU por encima de JERARQUIA_CACHE_MAX entradas.
+  - JERARQUIA_CACHE_TTL_S acota lo que escriba otro proceso (otro worker de uvicorn).
+  - Una generación por cliente evita guardar un árbol calculado ANTES de una invalidación.
+"""
+import os
+import threading
+import time as reloj
+from collections import OrderedDict, defaultdict
+
+CACHE_MAX = int(os.getenv("JERARQUIA_CACHE_MAX", "256"))
+CACHE_TTL_S = float(os.getenv("JERARQUIA_CACHE_TTL_S", "60"))
+
+
+class CacheJerarquia:
+
+    def __init__(self, maximo: int = CACHE_MAX):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        # {(cliente_id, ver_ocultos): (json_bytes, instante de caducidad)}
+        self._entradas = OrderedDict()
+        self._generaciones = defaultdict(int)
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.expulsiones = 0
+
+    def generacion(self, cliente_id: int) -> int:
+        """Leer ANTES de construir el árbol y pasarla a 'guardar'."""
+        return self._generaciones[cliente_id]
+
+    def obtener(self, cliente_id: int, ver_ocultos: bool):
+        clave = (cliente_id, ver_ocultos)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[1] < reloj.monotonic():
+                self._entradas.pop(clave, None)
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, cliente_id: int, ver_ocultos: bool, contenido: bytes, generacion: int):
+        with self._lock:
+            if generacion != self._generaciones[cliente_id]:
+                return # Hubo una escritura mientras se construía: el árbol puede estar desfasado
+            self._entradas[(cliente_id, ver_ocultos)] = (contenido, reloj.monotonic() + CACHE_TTL_S)
+            self._entradas.move_to_end((cliente_id, ver_ocultos))
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def invalidar(self, *cliente_ids):
+        """Descarta los árboles de estos clientes (None se ignora)."""
+        with self._lock:
+            for cliente_id in set(cliente_ids) - {None}:
+                self._generaciones[cliente_id] += 1
+                for ver_ocultos in (False, True):
+                    if self._entradas.pop((cliente_id, ver_ocultos), None) is not None:
+                        self.invalidaciones += 1
+
+    def resumen(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "maximo": self.maximo,
+            "ttl_s": CACHE_TTL_S,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_acierto": round(self.aciertos / consultas, 3) if consultas else None,
+            "invalidaciones": self.invalidaciones,
+            "expulsiones": self.expulsiones
+        }
+
+
+cache_jerarquia = CacheJerarquia()
@@ -0,0 +1,63 @@
+"""
+Catálogo en memoria de TIPO_SENSOR y TIPO_ACTUADOR (por proceso).
+
+Las dos tablas son diminutas y casi nunca cambian, así que se cargan una vez
+(una consulta por tabla) y se resuelven por id sin tocar la BBDD:
+  - nombre del tipo,
+  - clave de lectura del sensor ('temperatura', 'luz', ...; control_brain.map_sensor_type),
+  - roles del actuador en el cerebro ('ventana', 'riego', ...; control_brain.roles_de_tipo).
+
+Se invalida al crear tipos (crud_dispositivos.create_tipo_*, provisionar_iot_defecto).
+Si aparece un id desconocido (tipo creado desde otro proceso) se recarga una vez.
+"""
+import threading
+
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+class CatalogoTipos:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Instantánea inmutable: ({tipo_sensor_id: nombre_tipo}, {tipo_actuador_id: nombre_tipo})
+        self._datos = None
+
+    def invalidar(self):
+        self._datos = None
+
+    def _cargar(self, db: Session) -> tuple:
+        with self._lock:
+            self._datos = (
+                dict(db.query(models.TipoSensor.tipo_sensor_id, models.TipoSensor.nombre_tipo).all()),
+                dict(db.query(models.TipoActuador.tipo_actuador_id, models.TipoActuador.nombre_tipo).all())
+            )
+            return self._datos
+
+    def _buscar(self, db: Session, indice: int, tipo_id: int) -> str:
+        datos = self._datos
+        if datos is None or tipo_id not in datos[indice]:
+            datos = self._cargar(db)
+        return datos[indice].get(tipo_id)
+
+    # --- SENSORES ---
+    def nombre_sensor(self, db: Session, tipo_sensor_id: int) -> str:
+        return self._buscar(db, 0, tipo_sensor_id)
+
+    def clave_sensor(self, db: Session, tipo_sensor_id: int) -> str:
+        """Clave de lectura que usa el cerebro para este tipo de sensor."""
+        from .control_brain import map_sensor_type
+        return map_sensor_type(self.nombre_sensor(db, tipo_sensor_id) or "")
+
+    # --- ACTUADORES ---
+    def nombre_actuador(self, db: Session, tipo_actuador_id: int) -> str:
+        return self._buscar(db, 1, tipo_actuador_id)
+
+    def roles_actuador(self, db: Session, tipo_actuador_id: int) -> tuple:
+        """Roles del cerebro que cubre este tipo de actuador (normalmente uno)."""
+        from .control_brain import roles_de_tipo
+        return roles_de_tipo((self.nombre_actuador(db, tipo_actuador_id) or "").lower())
+
+
+catalogo = CatalogoTipos()
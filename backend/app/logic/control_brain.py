@@ -1,9 +1,12 @@
 import json
 import os
 from datetime import datetime, timedelta, time
+from functools import lru_cache
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from .. import models
 from ..crud import crud_operaciones
+from .catalogo_tipos import catalogo
+from .jornadas import resolutor as resolutor_jornadas
 
 # Constantes Lógicas
 PRIORIDAD_VIENTO_KMH = 45.0
@@ -13,10 +16,55 @@ TEMP_VENTILACION = 30.0
 HUMEDAD_SUELO_RIEGO_ON = 65.0
 HUMEDAD_SUELO_RIEGO_OFF = 80.0
 HUMEDAD_AIRE_EXTRACTOR = 90.0
+TEMP_EXTRACTOR = 35.0
 RADIACION_LUCES_ON = 200.0
 RADIACION_LUCES_OFF = 250.0
 MINUTOS_CORTESIA = 120
 
+# Roles del cerebro y fragmentos del nombre_tipo (en minúsculas) que los identifican.
+# El orden importa: es el orden de evaluación de decidir_estados.
+ROLES_ACTUADOR = {
+    "ventana": ("ventana",),
+    "led": ("luz", "iluminación", "led"),
+    "riego": ("riego", "valvula", "válvula"),
+    "calefaccion": ("calefaccion", "calefacción"),
+    "extractor": ("extractor", "ventilador")
+}
+
+@lru_cache(maxsize=256)
+def map_sensor_type(nombre_tipo: str) -> str:
+    nombre = nombre_tipo.lower()
+    if 'temp' in nombre: return 'temperatura'
+    if 'luz' in nombre or 'rad' in nombre or 'sol' in nombre: return 'luz'
+    if 'suelo' in nombre: return 'humedad_suelo'
+    if 'vient' in nombre or 'aire' in nombre: return 'viento'
+    if 'lluv' in nombre or 'agua' in nombre: return 'lluvia'
+    return 'temperatura' # fallback
+
+def obtener_lecturas_actuales(db: Session, invernadero_id: int) -> dict:
+    """
+    Últimas lecturas del invernadero en el formato que espera el cerebro
+    ({'temperatura': 25.0, 'viento': 10.0, ...}), leídas de SENSOR_ULTIMA_LECTURA en una consulta
+    (el tipo de cada sensor sale del catálogo en memoria).
+    """
+    filas = db.query(models.Sensor.tipo_sensor_id, models.SensorUltimaLectura.valor)\
+              .join(models.SensorUltimaLectura, models.Sensor.sensor_id == models.SensorUltimaLectura.sensor_id)\
+              .filter(models.Sensor.invernadero_id == invernadero_id)\
+              .order_by(models.Sensor.sensor_id).all()
+    return {catalogo.clave_sensor(db, tipo_sensor_id): float(valor) for tipo_sensor_id, valor in filas}
+
+def ejecutar_ciclo_invernadero(db: Session, invernadero_id: int):
+    """
+    Ciclo de control "real" de un invernadero: lecturas actuales + jornada a la hora
+    del sistema -> ejecutar_ciclo_control. Es la unidad de trabajo del planificador.
+    """
+    inv = db.query(models.Invernadero).filter(models.Invernadero.invernadero_id == invernadero_id).first()
+    if not inv:
+        return {"status": "error", "message": "Invernadero no encontrado."}
+    cliente_id = inv.parcela.cliente_id if inv.parcela else 1
+    lecturas = obtener_lecturas_actuales(db, invernadero_id)
+    return ejecutar_ciclo_control(db, invernadero_id, lecturas, esta_en_jornada_laboral(cliente_id, invernadero_id=invernadero_id))
+
 def provisionar_iot_defecto(db: Session, invernadero_id: int):
     """Instala automáticamente los 5 sensores y 5 actuadores si el invernadero está plantado."""
     # 1. Definir los tipos base
@@ -41,6 +89,7 @@ def provisionar_iot_defecto(db: Session, invernadero_id: int):
             db.add(db_tipo)
             db.commit()
             db.refresh(db_tipo)
+            catalogo.invalidar()
         
         # Crear sensor si no existe
         existente = db.query(models.Sensor).filter(
@@ -57,6 +106,7 @@ def provisionar_iot_defecto(db: Session, invernadero_id: int):
             db.add(db_tipo)
             db.commit()
             db.refresh(db_tipo)
+            catalogo.invalidar()
             
         # Crear actuador si no existe
         existente = db.query(models.Actuador).filter(
@@ -68,36 +118,14 @@ def provisionar_iot_defecto(db: Session, invernadero_id: int):
             
     db.commit()
 
-def esta_en_jornada_laboral(cliente_id: int, hora_test: time = None) -> tuple[bool, bool]:
+def esta_en_jornada_laboral(cliente_id: int, hora_test: time = None, invernadero_id: int = None) -> tuple[bool, bool]:
     """
     Verifica si una hora (u hora actual) está dentro de la jornada definida.
+    Con invernadero_id se usa la jornada propia de la nave (salvo que herede la del cliente).
+    Resuelto en memoria por logic/jornadas.py (sin leer ficheros en cada llamada).
     Retorna: (está_en_jornada: bool, configurada: bool)
     """
-    import os
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    ruta_json = os.path.join(base_dir, "..", "config_clientes", f"jornada_cliente_{cliente_id}.json")
-    
-    if not os.path.exists(ruta_json):
-        # Si no hay configuración, NO hay jornada (y marcamos configurada=False)
-        return False, False
-    
-    try:
-        with open(ruta_json, "r", encoding="utf-8") as f:
-            config = json.load(f)
-            
-        tramos = config.get("default", [])
-        if not tramos:
-            return False, True
-            
-        ahora = hora_test if hora_test else datetime.now().time()
-        for tramo in tramos:
-            inicio = datetime.strptime(tramo["inicio"], "%H:%M").time()
-            fin = datetime.strptime(tramo["fin"], "%H:%M").time()
-            if inicio <= ahora <= fin:
-                return True, True
-        return False, True
-    except Exception:
-        return False, False
+    return resolutor_jornadas.en_jornada(cliente_id, invernadero_id=invernadero_id, hora_test=hora_test)
 
 def evaluar_estado_cortesia(db: Session, actuador_id: int) -> bool:
     """Retorna True si el actuador está bloqueado por intervención manual reciente."""
@@ -106,6 +134,13 @@ def evaluar_estado_cortesia(db: Session, actuador_id: int) -> bool:
         models.AccionActuador.actuador_id == actuador_id
     ).order_by(models.AccionActuador.fecha_hora.desc()).first()
     
+    return accion_en_cortesia(ultima_accion)
+
+def accion_en_cortesia(ultima_accion) -> bool:
+    """
+    Versión sin BBDD de 'evaluar_estado_cortesia': decide a partir de la última
+    acción ya cargada (ej: obtenida en bloque con crud_operaciones.get_ultimas_acciones).
+    """
     if not ultima_accion:
         return False
         
@@ -119,42 +154,39 @@ def evaluar_estado_cortesia(db: Session, actuador_id: int) -> bool:
     tiempo_transcurrido = ahora - ultima_accion.fecha_hora
     return tiempo_transcurrido <= timedelta(minutes=MINUTOS_CORTESIA)
 
-def ejecutar_ciclo_control(db: Session, invernadero_id: int, lecturas: dict, info_jornada: tuple = None):
+@lru_cache(maxsize=256)
+def roles_de_tipo(nombre_tipo: str) -> tuple:
+    """Roles que cubre un tipo de actuador según su nombre en minúsculas (normalmente uno)."""
+    return tuple(rol for rol, claves in ROLES_ACTUADOR.items() if any(c in nombre_tipo for c in claves))
+
+def resolver_roles(mapa_actuadores: dict) -> dict:
     """
-    Motor Neural de SIRA: Recibe las últimas lecturas de los sensores del invernadero
-    y determina el estado óptimo de cada actuador respetando jerarquías de seguridad.
-    lecturas format: {'temperatura': 25, 'lluvia': 0, 'viento': 10, ...}
-    info_jornada: tuple (en_jornada: bool, jornada_configurada: bool). Si None, se calcula.
+    Asigna a cada rol del cerebro el actuador que lo cubre a partir de
+    {nombre_tipo en minúsculas: actuador}. Retorna {rol: actuador o None}.
+    Si varios tipos encajan en un rol, gana el primero del mapa.
     """
-    # Obtenemos los actuadores del invernadero para poder modificar su estado
-    actuadores = db.query(models.Actuador).filter(models.Actuador.invernadero_id == invernadero_id).all()
-    
-    # Si no hay sensores o actuadores, no hay nada que controlar
-    if not actuadores or not lecturas:
-        return {"status": "ok", "message": "Faltan dispositivos para el control."}
-
-    # Determinamos la jornada laboral usando el parámetro recibido o calculándola
-    if info_jornada is not None:
-        en_jornada, jornada_configurada = info_jornada
-    else:
-        inv = db.query(models.Invernadero).filter(models.Invernadero.invernadero_id == invernadero_id).first()
-        cliente_id = inv.parcela.cliente_id if inv else 1
-        en_jornada, jornada_configurada = esta_en_jornada_laboral(cliente_id)
-
-    # Identificadores de actuadores (simplificado: basamos la acción en el nombre_tipo)
-    # y control de cortesía. Mapeamos TipoActuador.nombre_tipo a su ID
-    mapa_actuadores = {}
-    for act in actuadores:
-        nombre_tipo = db.query(models.TipoActuador).filter(models.TipoActuador.tipo_actuador_id == act.tipo_actuador_id).first().nombre_tipo.lower()
-        mapa_actuadores[nombre_tipo] = act
+    roles = dict.fromkeys(ROLES_ACTUADOR)
+    for nombre_tipo, actuador in mapa_actuadores.items():
+        for rol in roles_de_tipo(nombre_tipo):
+            if roles[rol] is None:
+                roles[rol] = actuador
+    return roles
 
+def decidir_estados(roles: dict, lecturas: dict, info_jornada: tuple, en_cortesia) -> dict:
+    """
+    Reglas del cerebro sin acceso a BBDD. Retorna {actuador_id: estado_decidido}.
+    roles: salida de resolver_roles. en_cortesia: callable(actuador_id) -> bool, solo se
+    consulta para los actuadores que lo necesitan (igual que el ciclo original).
+    'control_vectorial.evaluar_lote' replica estas reglas en bloque y debe dar el mismo resultado.
+    """
+    en_jornada, jornada_configurada = info_jornada
     decisiones = {}
 
     # === ALGORITMOS DE DECISIÓN (SIRA JERARQUÍA) ===
 
     # 1. MOTOR VENTANA (Seguridad vs Clima)
-    act_ventana = next((v for k, v in mapa_actuadores.items() if "ventana" in k), None)
-    if act_ventana and not evaluar_estado_cortesia(db, act_ventana.actuador_id):
+    act_ventana = roles["ventana"]
+    if act_ventana and not en_cortesia(act_ventana.actuador_id):
         viento = lecturas.get('viento', 0)
         lluvia = lecturas.get('lluvia', 0)
         temp = lecturas.get('temperatura', 20)
@@ -169,12 +201,12 @@ def ejecutar_ciclo_control(db: Session, invernadero_id: int, lecturas: dict, inf
             decisiones[act_ventana.actuador_id] = "ENTREABIERTO 20%"
 
     # 2. ILUMINACIÓN LED (Dependiente de Jornada Configurada y Fotoperiodo)
-    act_led = next((v for k, v in mapa_actuadores.items() if "luz" in k or "iluminación" in k or "led" in k), None)
+    act_led = roles["led"]
     if act_led:
         # SI NO HAY JORNADA CONFIGURADA -> SIEMPRE APAGADO (A menos que manual)
         if not jornada_configurada:
              decisiones[act_led.actuador_id] = "APAGADO"
-        elif not evaluar_estado_cortesia(db, act_led.actuador_id):
+        elif not en_cortesia(act_led.actuador_id):
             luz_solar = lecturas.get('luz', 1000)
             if not en_jornada:
                 decisiones[act_led.actuador_id] = "APAGADO"
@@ -185,8 +217,8 @@ def ejecutar_ciclo_control(db: Session, invernadero_id: int, lecturas: dict, inf
                     decisiones[act_led.actuador_id] = "APAGADO"
 
     # 3. ELECTROVÁLVULA RIEGO (Humedad Suelo)
-    act_riego = next((v for k, v in mapa_actuadores.items() if "riego" in k or "valvula" in k or "válvula" in k), None)
-    if act_riego and not evaluar_estado_cortesia(db, act_riego.actuador_id):
+    act_riego = roles["riego"]
+    if act_riego and not en_cortesia(act_riego.actuador_id):
         hum_suelo = lecturas.get('humedad_suelo', 100)
         lluvia = lecturas.get('lluvia', 0)
         
@@ -200,8 +232,8 @@ def ejecutar_ciclo_control(db: Session, invernadero_id: int, lecturas: dict, inf
             decisiones[act_riego.actuador_id] = "APAGADO"
 
     # 4. CALEFACCIÓN (Protección de Heladas)
-    act_calefaccion = next((v for k, v in mapa_actuadores.items() if "calefaccion" in k or "calefacción" in k), None)
-    if act_calefaccion and not evaluar_estado_cortesia(db, act_calefaccion.actuador_id):
+    act_calefaccion = roles["calefaccion"]
+    if act_calefaccion and not en_cortesia(act_calefaccion.actuador_id):
         temp = lecturas.get('temperatura', 20)
         if temp < TEMP_RESCATE_HELADA:
             decisiones[act_calefaccion.actuador_id] = "ENCENDIDO"
@@ -209,29 +241,63 @@ def ejecutar_ciclo_control(db: Session, invernadero_id: int, lecturas: dict, inf
             decisiones[act_calefaccion.actuador_id] = "APAGADO"
 
     # 5. VENTILADOR EXTRACTOR (Por Humedad o Exceso de Calor)
-    act_extractor = next((v for k, v in mapa_actuadores.items() if "extractor" in k or "ventilador" in k), None)
-    if act_extractor and not evaluar_estado_cortesia(db, act_extractor.actuador_id):
+    act_extractor = roles["extractor"]
+    if act_extractor and not en_cortesia(act_extractor.actuador_id):
         temp = lecturas.get('temperatura', 20)
         hum_relativa = lecturas.get('humedad_relativa', 50)
-        if hum_relativa > HUMEDAD_AIRE_EXTRACTOR or temp > 35.0:
+        if hum_relativa > HUMEDAD_AIRE_EXTRACTOR or temp > TEMP_EXTRACTOR:
              decisiones[act_extractor.actuador_id] = "ENCENDIDO 100%"
         else:
              decisiones[act_extractor.actuador_id] = "APAGADO"
 
+    return decisiones
+
+def ejecutar_ciclo_control(db: Session, invernadero_id: int, lecturas: dict, info_jornada: tuple = None):
+    """
+    Motor Neural de SIRA: Recibe las últimas lecturas de los sensores del invernadero
+    y determina el estado óptimo de cada actuador respetando jerarquías de seguridad.
+    lecturas format: {'temperatura': 25, 'lluvia': 0, 'viento': 10, ...}
+    info_jornada: tuple (en_jornada: bool, jornada_configurada: bool). Si None, se calcula.
+    """
+    # Obtenemos los actuadores del invernadero para poder modificar su estado
+    actuadores = db.query(models.Actuador).filter(models.Actuador.invernadero_id == invernadero_id).all()
+    
+    # Si no hay sensores o actuadores, no hay nada que controlar
+    if not actuadores or not lecturas:
+        return {"status": "ok", "message": "Faltan dispositivos para el control."}
+
+    # Determinamos la jornada laboral usando el parámetro recibido o calculándola
+    if info_jornada is not None:
+        en_jornada, jornada_configurada = info_jornada
+    else:
+        inv = db.query(models.Invernadero).filter(models.Invernadero.invernadero_id == invernadero_id).first()
+        cliente_id = inv.parcela.cliente_id if inv else 1
+        en_jornada, jornada_configurada = esta_en_jornada_laboral(cliente_id, invernadero_id=invernadero_id)
+
+    # Identificadores de actuadores (simplificado: basamos la acción en el nombre_tipo)
+    # y control de cortesía. Mapeamos TipoActuador.nombre_tipo (catálogo en memoria) a su ID
+    mapa_actuadores = {}
+    for act in actuadores:
+        mapa_actuadores[catalogo.nombre_actuador(db, act.tipo_actuador_id).lower()] = act
+
+    decisiones = decidir_estados(
+        resolver_roles(mapa_actuadores), lecturas, (en_jornada, jornada_configurada),
+        lambda actuador_id: evaluar_estado_cortesia(db, actuador_id)
+    )
+
     # === EJECUCIÓN Y REGISTRO ===
     # Solo registramos un cambio si el estado decidido es diferente al actual
     cambios = []
+    pendientes = []
     for actuador in actuadores:
         nuevo_estado = decisiones.get(actuador.actuador_id)
         if nuevo_estado and actuador.estado_actuador != nuevo_estado:
-            # Actualiza físicamente en BD
-            crud_operaciones.update_estado_actuador(db, actuador.actuador_id, nuevo_estado)
             # Log de la acción (AUTOMÁTICA)
-            crud_operaciones.create_accion(db, schemas.AccionActuadorCreate(
-                actuador_id=actuador.actuador_id,
-                accion_detalle=f"AUTO: {nuevo_estado}"
-            ))
-            cambios.append(f"{actuador.tipo_actuador.nombre_tipo} -> {nuevo_estado}")
+            pendientes.append((actuador.actuador_id, nuevo_estado, f"AUTO: {nuevo_estado}"))
+            cambios.append(f"{catalogo.nombre_actuador(db, actuador.tipo_actuador_id)} -> {nuevo_estado}")
+
+    # Actualiza físicamente en BD todos los cambios en una sola transacción
+    crud_operaciones.aplicar_decisiones(db, pendientes)
             
     return {"status": "ok", "decisiones_ejecutadas": len(cambios), "detalles": cambios}
 
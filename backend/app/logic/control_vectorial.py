@@ -0,0 +1,198 @@
+"""
+Evaluación en bloque (NumPy) de las reglas del cerebro para muchos invernaderos a la vez.
+
+Replica exactamente 'control_brain.decidir_estados', pero con máscaras vectoriales sobre
+arrays columnares (una posición por invernadero) en lugar de ramas Python por actuador.
+Pensado para el tick de flota del planificador (SIRA_CONTROL_MODO=vectorial).
+
+Flujo:
+  1. cargar_lote: lecturas, actuadores, cortesía y jornada de N invernaderos con un
+     número fijo de consultas.
+  2. evaluar_lote: decisiones vectorizadas -> solo los cambios de estado (diffs).
+  3. ejecutar_ciclo_flota: persiste los cambios (crud_operaciones.aplicar_decisiones).
+"""
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..crud import crud_operaciones
+from . import control_brain
+from .catalogo_tipos import catalogo
+from .control_brain import (
+    PRIORIDAD_VIENTO_KMH, TEMP_RESCATE_HELADA, TEMP_PARADA_HELADA, TEMP_VENTILACION,
+    HUMEDAD_SUELO_RIEGO_ON, HUMEDAD_SUELO_RIEGO_OFF, HUMEDAD_AIRE_EXTRACTOR, TEMP_EXTRACTOR,
+    RADIACION_LUCES_ON, RADIACION_LUCES_OFF
+)
+
+# Columnas de lecturas y valor que asume el cerebro cuando falta el sensor
+VALORES_POR_DEFECTO = {
+    "temperatura": 20.0,
+    "luz": 1000.0,
+    "humedad_suelo": 100.0,
+    "viento": 0.0,
+    "lluvia": 0.0,
+    "humedad_relativa": 50.0
+}
+
+# Orden de evaluación de los roles (el mismo que en decidir_estados)
+ROLES = tuple(control_brain.ROLES_ACTUADOR)
+
+# Catálogo de estados: las decisiones se calculan como índices sobre esta tabla
+ESTADOS = np.array(
+    ["CERRADO", "ABIERTO 100%", "ENTREABIERTO 20%", "ENCENDIDO", "APAGADO", "ENCENDIDO 100%", None],
+    dtype=object
+)
+CERRADO, ABIERTO, ENTREABIERTO, ENCENDIDO, APAGADO, ENCENDIDO_100, SIN_DECISION = range(7)
+
+
+def evaluar_lote(lecturas: dict, en_jornada: np.ndarray, jornada_configurada: np.ndarray, actuadores: dict) -> list:
+    """
+    lecturas: {columna: array float (NaN = sin sensor)} con las columnas de VALORES_POR_DEFECTO.
+    en_jornada / jornada_configurada: arrays bool.
+    actuadores: {rol: {"id": array int (-1 = sin actuador), "estado": array object, "cortesia": array bool}}.
+    Retorna solo los cambios a aplicar: [(fila, actuador_id, nuevo_estado)].
+    """
+    n = len(en_jornada)
+    # Un invernadero sin ninguna lectura no se controla (igual que en el ciclo escalar)
+    hay_lecturas = np.zeros(n, dtype=bool)
+    valores = {}
+    for columna, defecto in VALORES_POR_DEFECTO.items():
+        bruto = np.asarray(lecturas.get(columna, np.full(n, np.nan)), dtype=float)
+        hay_lecturas |= ~np.isnan(bruto)
+        valores[columna] = np.where(np.isnan(bruto), defecto, bruto)
+
+    temp, luz, viento, lluvia = valores["temperatura"], valores["luz"], valores["viento"], valores["lluvia"]
+    hum_suelo, hum_relativa = valores["humedad_suelo"], valores["humedad_relativa"]
+
+    def activo(rol):
+        return (actuadores[rol]["id"] >= 0) & hay_lecturas
+
+    def libre(rol):
+        return activo(rol) & ~actuadores[rol]["cortesia"]
+
+    codigos = {}
+
+    # 1. MOTOR VENTANA: seguridad > ventilación > posición de reposo
+    codigos["ventana"] = np.where(
+        libre("ventana"),
+        np.select([(viento > PRIORIDAD_VIENTO_KMH) | (lluvia > 0), temp > TEMP_VENTILACION],
+                  [CERRADO, ABIERTO], default=ENTREABIERTO),
+        SIN_DECISION
+    )
+
+    # 2. ILUMINACIÓN LED: sin jornada configurada se apaga incluso en cortesía
+    led_fotoperiodo = np.select(
+        [~en_jornada, luz < RADIACION_LUCES_ON, luz > RADIACION_LUCES_OFF],
+        [APAGADO, ENCENDIDO, APAGADO], default=SIN_DECISION
+    )
+    codigos["led"] = np.select(
+        [activo("led") & ~jornada_configurada, libre("led")],
+        [APAGADO, led_fotoperiodo], default=SIN_DECISION
+    )
+
+    # 3. ELECTROVÁLVULA RIEGO: lluvia > histéresis de humedad de suelo
+    codigos["riego"] = np.where(
+        libre("riego"),
+        np.select([lluvia > 0, hum_suelo < HUMEDAD_SUELO_RIEGO_ON, hum_suelo >= HUMEDAD_SUELO_RIEGO_OFF],
+                  [APAGADO, ENCENDIDO, APAGADO], default=SIN_DECISION),
+        SIN_DECISION
+    )
+
+    # 4. CALEFACCIÓN: histéresis de helada
+    codigos["calefaccion"] = np.where(
+        libre("calefaccion"),
+        np.select([temp < TEMP_RESCATE_HELADA, temp >= TEMP_PARADA_HELADA],
+                  [ENCENDIDO, APAGADO], default=SIN_DECISION),
+        SIN_DECISION
+    )
+
+    # 5. VENTILADOR EXTRACTOR: humedad ambiente o calor extremo
+    codigos["extractor"] = np.where(
+        libre("extractor"),
+        np.where((hum_relativa > HUMEDAD_AIRE_EXTRACTOR) | (temp > TEMP_EXTRACTOR), ENCENDIDO_100, APAGADO),
+        SIN_DECISION
+    )
+
+    # Si un mismo actuador cubre dos roles, manda la última decisión (como el dict de decidir_estados)
+    for i, rol in enumerate(ROLES):
+        for posterior in ROLES[i + 1:]:
+            pisado = (actuadores[rol]["id"] == actuadores[posterior]["id"]) & (codigos[posterior] != SIN_DECISION)
+            codigos[rol] = np.where(pisado, SIN_DECISION, codigos[rol])
+
+    cambios = []
+    for rol in ROLES:
+        nuevos = ESTADOS[codigos[rol]]
+        mascara = (codigos[rol] != SIN_DECISION) & (nuevos != actuadores[rol]["estado"])
+        for fila in np.flatnonzero(mascara):
+            cambios.append((int(fila), int(actuadores[rol]["id"][fila]), nuevos[fila]))
+    return cambios
+
+
+def cargar_lote(db: Session, invernadero_ids: list) -> dict:
+    """
+    Prepara los arrays de entrada de evaluar_lote para varios invernaderos con un número
+    fijo de consultas (lecturas, actuadores, últimas acciones y clientes).
+    """
+    n = len(invernadero_ids)
+    fila_de = {inv_id: i for i, inv_id in enumerate(invernadero_ids)}
+
+    # Lecturas actuales (mismo criterio que control_brain.obtener_lecturas_actuales)
+    lecturas = {columna: np.full(n, np.nan) for columna in VALORES_POR_DEFECTO}
+    filas = db.query(models.Sensor.invernadero_id, models.Sensor.tipo_sensor_id, models.SensorUltimaLectura.valor)\
+              .join(models.SensorUltimaLectura, models.Sensor.sensor_id == models.SensorUltimaLectura.sensor_id)\
+              .filter(models.Sensor.invernadero_id.in_(invernadero_ids))\
+              .order_by(models.Sensor.sensor_id).all()
+    for inv_id, tipo_sensor_id, valor in filas:
+        lecturas[catalogo.clave_sensor(db, tipo_sensor_id)][fila_de[inv_id]] = float(valor)
+
+    # Actuadores por invernadero y rol
+    actuadores = {rol: {"id": np.full(n, -1, dtype=np.int64),
+                        "estado": np.full(n, None, dtype=object),
+                        "cortesia": np.zeros(n, dtype=bool)} for rol in ROLES}
+    todos = db.query(models.Actuador)\
+              .filter(models.Actuador.invernadero_id.in_(invernadero_ids))\
+              .order_by(models.Actuador.actuador_id).all()
+    mapas = {inv_id: {} for inv_id in invernadero_ids}
+    for act in todos:
+        mapas[act.invernadero_id][catalogo.nombre_actuador(db, act.tipo_actuador_id).lower()] = act
+
+    ultimas = crud_operaciones.get_ultimas_acciones(db, [a.actuador_id for a in todos])
+    for inv_id, mapa in mapas.items():
+        fila = fila_de[inv_id]
+        for rol, act in control_brain.resolver_roles(mapa).items():
+            if act:
+                actuadores[rol]["id"][fila] = act.actuador_id
+                actuadores[rol]["estado"][fila] = act.estado_actuador
+                actuadores[rol]["cortesia"][fila] = control_brain.accion_en_cortesia(ultimas.get(act.actuador_id))
+
+    # Jornada laboral (resuelta en memoria por el resolutor de jornadas)
+    en_jornada = np.zeros(n, dtype=bool)
+    jornada_configurada = np.zeros(n, dtype=bool)
+    invernaderos = db.query(models.Invernadero.invernadero_id, models.Parcela.cliente_id)\
+                     .join(models.Parcela, models.Invernadero.parcela_id == models.Parcela.parcela_id)\
+                     .filter(models.Invernadero.invernadero_id.in_(invernadero_ids)).all()
+    for inv_id, cliente_id in invernaderos:
+        en_jornada[fila_de[inv_id]], jornada_configurada[fila_de[inv_id]] = \
+            control_brain.esta_en_jornada_laboral(cliente_id, invernadero_id=inv_id)
+
+    return {
+        "lecturas": lecturas,
+        "en_jornada": en_jornada,
+        "jornada_configurada": jornada_configurada,
+        "actuadores": actuadores
+    }
+
+
+def ejecutar_ciclo_flota(db: Session, invernadero_ids: list) -> dict:
+    """Ciclo de control de varios invernaderos en bloque: carga, evalúa y persiste los cambios."""
+    if not invernadero_ids:
+        return {"status": "ok", "invernaderos": 0, "decisiones_ejecutadas": 0}
+
+    lote = cargar_lote(db, invernadero_ids)
+    cambios = evaluar_lote(**lote)
+
+    crud_operaciones.aplicar_decisiones(db, [
+        (actuador_id, nuevo_estado, f"AUTO: {nuevo_estado}") for _, actuador_id, nuevo_estado in cambios
+    ])
+
+    return {"status": "ok", "invernaderos": len(invernadero_ids), "decisiones_ejecutadas": len(cambios)}
@@ -0,0 +1,192 @@
+"""
+Bus de Eventos del Estado en Vivo (por proceso).
+
+Alimenta GET /api/v1/iot/estado/{id}/stream (Server-Sent Events). En lugar de que cada
+dashboard recargue la página y recalcule el estado completo, el servidor empuja:
+  - 'snapshot': el estado completo al conectarse.
+  - 'delta': solo lo que ha cambiado, y solo cuando llega una Medicion o una AccionActuador
+    de ese invernadero.
+
+Funcionamiento:
+  - Las rutas de escritura (crud_operaciones: ingesta y acciones) llaman a
+    'notificar_sensores' / 'notificar_actuadores' tras el commit. Es un aviso en memoria,
+    seguro desde cualquier hilo, y no hace nada si nadie está mirando ese invernadero.
+  - Un CanalInvernadero por invernadero observado, con UNA tarea que recalcula el estado
+    (agrupando los avisos de SSE_AGRUPAR_S segundos), calcula el delta y lo reparte a todos
+    los espectadores. El coste no depende de cuántos dashboards haya conectados.
+  - El canal se crea con el primer espectador y se cierra al irse el último.
+
+Solo ve las escrituras de su propio proceso: el cerebro de control debe ejecutarse dentro de
+la API (SIRA_CONTROL_AUTOMATICO=1) para que sus decisiones lleguen a los streams.
+"""
+import asyncio
+import os
+import threading
+
+from starlette.concurrency import run_in_threadpool
+
+AGRUPAR_S = float(os.getenv("SSE_AGRUPAR_S", "0.5"))  # Ventana para agrupar avisos en un solo recálculo
+COLA_MAX = 100                                         # Eventos pendientes por espectador antes de resincronizarlo
+
+
+def calcular_delta(anterior: dict, actual: dict) -> dict:
+    """
+    Diferencias entre dos estados: sensores y actuadores que han cambiado (por id) y las
+    claves de primer nivel cuyo valor es distinto. Vacío si no ha cambiado nada.
+    """
+    delta = {}
+    for clave, id_clave in (("sensores", "sensor_id"), ("actuadores", "actuador_id")):
+        previos = {e[id_clave]: e for e in anterior.get(clave, [])}
+        cambiados = [e for e in actual.get(clave, []) if previos.get(e[id_clave]) != e]
+        eliminados = set(previos) - {e[id_clave] for e in actual.get(clave, [])}
+        if cambiados:
+            delta[clave] = cambiados
+        if eliminados:
+            delta[f"{clave}_eliminados"] = sorted(eliminados)
+    for clave, valor in actual.items():
+        if clave not in ("sensores", "actuadores") and anterior.get(clave) != valor:
+            delta[clave] = valor
+    return delta
+
+
+class CanalInvernadero:
+    """Fan-out del estado de un invernadero: un recálculo, N espectadores."""
+
+    def __init__(self, invernadero_id: int, calcular, al_cambiar_dispositivos=None):
+        self.invernadero_id = invernadero_id
+        self.calcular = calcular # calcular(invernadero_id) -> dict (síncrona, se ejecuta en el threadpool)
+        self.al_cambiar_dispositivos = al_cambiar_dispositivos
+        self.espectadores = set()
+        self.estado = None
+        self.sensores = set()
+        self.actuadores = set()
+        self._aviso = asyncio.Event()
+        self._tarea = None
+
+    async def estado_actual(self) -> dict:
+        if self.estado is None:
+            self._actualizar(await run_in_threadpool(self.calcular, self.invernadero_id))
+        return self.estado
+
+    def _actualizar(self, estado: dict):
+        self.estado = estado
+        sensores = {s["sensor_id"] for s in estado.get("sensores", [])}
+        actuadores = {a["actuador_id"] for a in estado.get("actuadores", [])}
+        if (sensores, actuadores) != (self.sensores, self.actuadores):
+            self.sensores, self.actuadores = sensores, actuadores
+            if self.al_cambiar_dispositivos:
+                self.al_cambiar_dispositivos()
+
+    def avisar(self):
+        self._aviso.set()
+
+    def iniciar(self):
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self.bucle())
+
+    def detener(self):
+        if self._tarea and not self._tarea.done():
+            self._tarea.cancel()
+
+    async def bucle(self):
+        while True:
+            await self._aviso.wait()
+            await asyncio.sleep(AGRUPAR_S) # Un lote de mediciones -> un único recálculo
+            self._aviso.clear()
+            try:
+                nuevo = await run_in_threadpool(self.calcular, self.invernadero_id)
+            except Exception as e:
+                print(f"⚠️ Stream del invernadero {self.invernadero_id}: error al recalcular el estado: {e}")
+                continue
+            delta = calcular_delta(self.estado or {}, nuevo)
+            self._actualizar(nuevo)
+            if delta:
+                self.repartir(("delta", delta))
+
+    def repartir(self, evento):
+        for cola in list(self.espectadores):
+            try:
+                cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Espectador lento: se descartan sus deltas atrasados y se le reenvía el estado completo
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait(("snapshot", self.estado))
+
+
+class BusEstado:
+
+    def __init__(self):
+        self._canales = {}
+        self._loop = None
+        self._lock = threading.Lock()
+        # Índices inversos solo de los invernaderos observados: {sensor_id | actuador_id: invernadero_id}
+        self._por_sensor = {}
+        self._por_actuador = {}
+
+    @property
+    def espectadores(self) -> int:
+        return sum(len(c.espectadores) for c in self._canales.values())
+
+    # --- Espectadores (event loop) ---
+    async def suscribir(self, invernadero_id: int, calcular) -> asyncio.Queue:
+        """Registra un espectador y le encola el snapshot inicial."""
+        self._loop = asyncio.get_running_loop()
+        canal = self._canales.get(invernadero_id)
+        if canal is None:
+            canal = self._canales[invernadero_id] = CanalInvernadero(invernadero_id, calcular, self._reindexar)
+            canal.iniciar()
+        cola = asyncio.Queue(maxsize=COLA_MAX)
+        canal.espectadores.add(cola)
+        try:
+            cola.put_nowait(("snapshot", await canal.estado_actual()))
+        except Exception:
+            self.desuscribir(invernadero_id, cola)
+            raise
+        return cola
+
+    def desuscribir(self, invernadero_id: int, cola: asyncio.Queue):
+        canal = self._canales.get(invernadero_id)
+        if canal is None:
+            return
+        canal.espectadores.discard(cola)
+        if not canal.espectadores:
+            canal.detener()
+            del self._canales[invernadero_id]
+        self._reindexar()
+
+    def _reindexar(self):
+        por_sensor, por_actuador = {}, {}
+        for inv_id, canal in self._canales.items():
+            por_sensor.update(dict.fromkeys(canal.sensores, inv_id))
+            por_actuador.update(dict.fromkeys(canal.actuadores, inv_id))
+        with self._lock:
+            self._por_sensor, self._por_actuador = por_sensor, por_actuador
+
+    # --- Productores (cualquier hilo) ---
+    def notificar_sensores(self, sensor_ids):
+        """Llegaron mediciones de estos sensores."""
+        with self._lock:
+            invernaderos = {self._por_sensor[s] for s in sensor_ids if s in self._por_sensor}
+        self._avisar(invernaderos)
+
+    def notificar_actuadores(self, actuador_ids):
+        """Cambió el estado o el log de acciones de estos actuadores."""
+        with self._lock:
+            invernaderos = {self._por_actuador[a] for a in actuador_ids if a in self._por_actuador}
+        self._avisar(invernaderos)
+
+    def _avisar(self, invernaderos: set):
+        if not invernaderos or self._loop is None or self._loop.is_closed():
+            return
+        # asyncio.Event no es thread-safe: el aviso se entrega dentro del event loop
+        self._loop.call_soon_threadsafe(self._avisar_en_loop, invernaderos)
+
+    def _avisar_en_loop(self, invernaderos: set):
+        for inv_id in invernaderos:
+            canal = self._canales.get(inv_id)
+            if canal is not None:
+                canal.avisar()
+
+
+bus = BusEstado()
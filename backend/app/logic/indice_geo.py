@@ -0,0 +1,93 @@
+"""
+Índice Geográfico Local: códigos postales y municipios de España (por proceso).
+
+GET /api/v1/geo/check-cp y /geo/search-municipio consultaban Zippopotam / Nominatim en cada
+petición (hasta 5 s bloqueando un hilo del threadpool y sin respuesta si no hay red). Ahora se
+resuelven contra un fichero CSV empaquetado (codigo_postal,municipio,provincia) cargado una vez
+en memoria:
+  - Por CP: diccionario {cp: [(municipio, provincia), ...]} (un CP puede cubrir varios núcleos).
+  - Por nombre: array ORDENADO de claves plegadas (minúsculas, sin tildes ni signos) con una
+    entrada por cada palabra del municipio, así 'ejido' encuentra 'El Ejido' y 'huercal overa'
+    encuentra 'Huércal-Overa'. Un prefijo se resuelve con bisect: O(log n) + resultados.
+
+El fichero por defecto (codigos_postales.csv, junto a este módulo) trae las localidades de la
+semilla y las capitales de provincia. El callejero completo se genera con
+scripts/importar_codigos_postales.py y se indica con SIRA_GEO_DATASET.
+"""
+import bisect
+import csv
+import os
+import re
+import threading
+import unicodedata
+
+DATASET = os.getenv("SIRA_GEO_DATASET", os.path.join(os.path.dirname(os.path.abspath(__file__)), "codigos_postales.csv"))
+
+
+def plegar(texto: str) -> str:
+    """'Huércal-Overa' -> 'huercal overa' (mismo criterio para el índice y para la búsqueda)."""
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(re.split(r"[^0-9a-z]+", sin_tildes.lower())).strip()
+
+
+class IndiceGeografico:
+
+    def __init__(self, ruta: str = DATASET):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        # Instantánea inmutable: ({cp: [(municipio, provincia)]}, [clave plegada], [fila])
+        self._datos = None
+
+    def _cargar(self) -> tuple:
+        with self._lock:
+            if self._datos is not None:
+                return self._datos
+            por_cp, entradas = {}, []
+            try:
+                with open(self.ruta, newline="", encoding="utf-8") as f:
+                    filas = [(r["codigo_postal"].strip(), r["municipio"].strip(), r["provincia"].strip()) for r in csv.DictReader(f)]
+            except OSError as e:
+                print(f"⚠️ Índice geográfico: no se pudo leer {self.ruta}: {e}")
+                filas = []
+            for cp, municipio, provincia in filas:
+                por_cp.setdefault(cp, []).append((municipio, provincia))
+                palabras = plegar(municipio).split()
+                for i in range(len(palabras)):
+                    entradas.append((" ".join(palabras[i:]), cp, municipio, provincia))
+            entradas.sort()
+            self._datos = (por_cp, [e[0] for e in entradas], [e[1:] for e in entradas])
+            return self._datos
+
+    def recargar(self):
+        self._datos = None
+
+    @property
+    def total(self) -> int:
+        return len((self._datos or self._cargar())[0])
+
+    def buscar_cp(self, cp: str):
+        """Primer municipio del CP como dict de respuesta, o None si no está en el índice."""
+        por_cp = (self._datos or self._cargar())[0]
+        if cp not in por_cp:
+            return None
+        municipio, provincia = por_cp[cp][0]
+        return {"codigo_postal": cp, "municipio": municipio, "provincia": provincia, "origen": "indice"}
+
+    def buscar_municipio(self, nombre: str, limite: int = 20) -> list:
+        """Municipios con alguna palabra que empiece por 'nombre' (sin tildes); un resultado por CP."""
+        _, claves, filas = self._datos or self._cargar()
+        prefijo = plegar(nombre)
+        if not prefijo:
+            return []
+        resultados, vistos = [], set()
+        i = bisect.bisect_left(claves, prefijo)
+        while i < len(claves) and claves[i].startswith(prefijo) and len(resultados) < limite:
+            cp, municipio, provincia = filas[i]
+            if cp not in vistos:
+                vistos.add(cp)
+                resultados.append({"codigo_postal": cp, "municipio": municipio, "provincia": provincia, "origen": "indice"})
+            i += 1
+        return resultados
+
+
+indice_geo = IndiceGeografico()
@@ -0,0 +1,141 @@
+"""
+Resolutor de Jornada Laboral (con caché en memoria).
+
+Las jornadas viven en la tabla JORNADA_CONFIG (una fila por cliente y por invernadero).
+El resolutor carga la tabla entera en una sola consulta y compila cada fila a una tabla de
+7 días con los tramos en segundos del día, de modo que la pregunta "¿estamos en jornada?"
+se responde con comparaciones de enteros, sin tocar la BBDD.
+
+Reglas (mismas claves que schemas.ConfigJornada y el formulario de jornada):
+  - Claves "0".."6": día de la semana (0 = domingo ... 6 = sábado).
+      null  -> se usa 'default'
+      []    -> día libre
+      [...] -> tramos propios de ese día
+  - es_laborable = False -> configurado, pero nunca en jornada.
+  - Invernadero con heredar_de_global = True (o sin fila propia) -> jornada del cliente.
+
+Invalidación:
+  - Explícita al guardar / resetear (crud_jornadas).
+  - Recarga completa como mucho cada JORNADA_REVALIDAR_S segundos
+    (cubre cambios hechos desde otro proceso, p. ej. la API vista desde el worker de control).
+"""
+import os
+import threading
+import time as reloj
+from datetime import datetime, time
+
+from .. import models
+
+REVALIDAR_S = float(os.getenv("JORNADA_REVALIDAR_S", "30"))
+
+
+def cargar_desde_bbdd() -> list:
+    """[(cliente_id, invernadero_id, config)] de todas las filas de JORNADA_CONFIG."""
+    from ..database import SessionLocal
+    db = SessionLocal()
+    try:
+        filas = db.query(models.JornadaConfig.cliente_id, models.JornadaConfig.invernadero_id,
+                         models.JornadaConfig.es_laborable, models.JornadaConfig.heredar_de_global,
+                         models.JornadaConfig.tramos).all()
+        return [
+            (cliente_id, invernadero_id, {**tramos, "es_laborable": es_laborable, "heredar_de_global": heredar})
+            for cliente_id, invernadero_id, es_laborable, heredar, tramos in filas
+        ]
+    finally:
+        db.close()
+
+
+def a_segundos(hora: str) -> int:
+    """'HH:MM' o 'HH:MM:SS' -> segundos desde medianoche."""
+    partes = [int(p) for p in hora.split(":")]
+    return partes[0] * 3600 + partes[1] * 60 + (partes[2] if len(partes) > 2 else 0)
+
+
+class JornadaCompilada:
+    """Configuración de jornada ya preparada para consultas rápidas."""
+    __slots__ = ("es_laborable", "heredar_de_global", "tramos_por_dia")
+
+    def __init__(self, config: dict):
+        self.es_laborable = config.get("es_laborable", True)
+        self.heredar_de_global = config.get("heredar_de_global", False)
+        por_defecto = self.compilar_tramos(config.get("default") or [])
+        # tramos_por_dia[0] = domingo ... [6] = sábado
+        self.tramos_por_dia = tuple(
+            por_defecto if config.get(str(dia)) is None else self.compilar_tramos(config[str(dia)])
+            for dia in range(7)
+        )
+
+    @staticmethod
+    def compilar_tramos(tramos: list) -> tuple:
+        return tuple((a_segundos(t["inicio"]), a_segundos(t["fin"])) for t in tramos)
+
+    def contiene(self, dia_semana: int, segundo_del_dia: int) -> bool:
+        if not self.es_laborable:
+            return False
+        return any(inicio <= segundo_del_dia <= fin for inicio, fin in self.tramos_por_dia[dia_semana])
+
+
+class ResolutorJornadas:
+
+    def __init__(self, cargador=cargar_desde_bbdd):
+        # cargador() -> [(cliente_id, invernadero_id, config)]; inyectable en los tests
+        self.cargador = cargador
+        self._lock = threading.Lock()
+        # Instantánea inmutable: ({cliente_id: JornadaCompilada}, {invernadero_id: JornadaCompilada}, instante de carga)
+        self._datos = None
+        self._generacion = 0
+
+    def invalidar(self):
+        self._generacion += 1
+        self._datos = None
+
+    def _instantanea(self) -> tuple:
+        datos = self._datos
+        if datos is not None and reloj.monotonic() - datos[2] < REVALIDAR_S:
+            return datos
+        with self._lock:
+            generacion = self._generacion
+            clientes, invernaderos = {}, {}
+            for cliente_id, invernadero_id, config in self.cargador():
+                try:
+                    compilada = JornadaCompilada(config)
+                except Exception:
+                    continue # Fila corrupta: se trata como "sin configurar"
+                if invernadero_id is not None:
+                    invernaderos[invernadero_id] = compilada
+                else:
+                    clientes[cliente_id] = compilada
+            datos = (clientes, invernaderos, reloj.monotonic())
+            # Si se invalidó durante la carga, no se guarda (podría ser anterior al cambio)
+            if generacion == self._generacion:
+                self._datos = datos
+            return datos
+
+    # --- Consulta ---
+    def en_jornada(self, cliente_id: int, invernadero_id: int = None, hora_test: time = None,
+                   momento: datetime = None) -> tuple[bool, bool]:
+        """
+        ¿Está el invernadero (o el cliente) en jornada en 'momento' (por defecto ahora)?
+        hora_test sustituye la hora manteniendo el día de hoy (hora virtual del simulador).
+        Retorna: (está_en_jornada: bool, configurada: bool)
+        """
+        clientes, invernaderos, _ = self._instantanea()
+        jornada = None
+        if invernadero_id is not None:
+            propia = invernaderos.get(invernadero_id)
+            if propia and not propia.heredar_de_global:
+                jornada = propia
+        if jornada is None:
+            jornada = clientes.get(cliente_id)
+        if jornada is None:
+            # Si no hay configuración, NO hay jornada (y marcamos configurada=False)
+            return False, False
+
+        momento = momento or datetime.now()
+        hora = hora_test or momento.time()
+        dia_semana = (momento.weekday() + 1) % 7 # Python: lunes=0 -> formato jornada: domingo=0
+        segundo = hora.hour * 3600 + hora.minute * 60 + hora.second
+        return jornada.contiene(dia_semana, segundo), True
+
+
+resolutor = ResolutorJornadas()
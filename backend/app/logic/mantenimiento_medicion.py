@@ -0,0 +1,76 @@
+"""
+Mantenimiento Periódico del Histórico Particionado de MEDICION (por proceso).
+
+Las particiones mensuales solo se pre-crean MEDICION_PARTICIONES_FUTURAS meses por delante.
+Si nadie vuelve a crearlas, al agotarse las lecturas caen en 'medicion_default' y pierden las
+ventajas del particionado. Por eso la API repite el mantenimiento en segundo plano:
+
+  - Al arrancar y luego cada MEDICION_MANTENIMIENTO_HORAS horas (0 = solo al arrancar; entonces
+    hay que programar scripts/mantenimiento_medicion.py con cron).
+  - Crea las particiones que falten (las funciones SQL mueven a su partición las filas que ya
+    hubieran caído en la DEFAULT) y aplica la retención MEDICION_RETENCION_MESES/MODO.
+
+Con varios workers de uvicorn cada uno lanza su mantenimiento: las funciones SQL toman un
+cerrojo consultivo y son idempotentes, así que el segundo no encuentra nada que hacer.
+"""
+import asyncio
+import os
+
+from ..crud import crud_operaciones
+
+INTERVALO_H = float(os.getenv("MEDICION_MANTENIMIENTO_HORAS", "6"))
+
+
+def ejecutar_mantenimiento(db, meses_adelante: int = None, meses_retencion: int = None, modo: str = None):
+    """Crea las particiones que falten y aplica la retención. Retorna (creadas, particiones soltadas)."""
+    meses_adelante = crud_operaciones.MEDICION_PARTICIONES_FUTURAS if meses_adelante is None else meses_adelante
+    meses_retencion = crud_operaciones.MEDICION_RETENCION_MESES if meses_retencion is None else meses_retencion
+    modo = modo or crud_operaciones.MEDICION_RETENCION_MODO
+    creadas = crud_operaciones.crear_particiones_medicion(db, meses_adelante)
+    sueltas = crud_operaciones.aplicar_retencion_medicion(db, meses_retencion, modo)
+    return creadas, sueltas
+
+
+class MantenimientoMedicion:
+
+    def __init__(self):
+        self._tarea = None
+
+    def _ejecutar_con_sesion(self):
+        from ..database import SessionLocal
+        with SessionLocal() as db:
+            try:
+                return ejecutar_mantenimiento(db)
+            except Exception:
+                db.rollback()
+                raise
+
+    async def bucle(self):
+        while True:
+            try:
+                creadas, sueltas = await asyncio.to_thread(self._ejecutar_con_sesion)
+                if creadas or sueltas:
+                    print(f"📅 Particiones de MEDICION: {creadas} nuevas, {len(sueltas)} soltadas por retención.")
+            except Exception as e:
+                # BBDD sin migrar (30-particionado-medicion.sql no aplicado) o motor distinto de PostgreSQL
+                print(f"⚠️ Aviso: No se pudo mantener las particiones de MEDICION: {getattr(e, 'orig', e)}")
+            if INTERVALO_H <= 0:
+                return
+            await asyncio.sleep(INTERVALO_H * 3600)
+
+    def iniciar(self):
+        """Lanza el bucle en el event loop actual (llamar desde código async)."""
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self.bucle())
+
+    async def detener(self):
+        if self._tarea and not self._tarea.done():
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = None
+
+
+mantenimiento_medicion = MantenimientoMedicion()
@@ -0,0 +1,288 @@
+"""
+Métricas y perfilado por petición (opt-in con SIRA_METRICAS=1).
+
+- Middleware ASGI: por cada petición (método + plantilla de ruta, p. ej.
+  "/api/v1/iot/estado/{invernadero_id}") registra la latencia en un histograma, el código de
+  estado y lo que ha hecho en la BBDD: consultas, tiempo en la BBDD y filas (cursor.rowcount,
+  SQLite no lo informa en los SELECT).
+- Las consultas se cuentan con los eventos before/after_cursor_execute de SQLAlchemy sobre los
+  motores de database.py. El contador de la petición viaja en un ContextVar, que también llega
+  al threadpool (rutas 'def') y a run_sync (motor asíncrono).
+- GET /metrics (main.py) devuelve todo en formato de texto de Prometheus. Los datos son de ESTE
+  proceso (con varios workers, cada uno tiene los suyos). Nginx no publica /metrics: se lee
+  desde la red interna (http://api:8000/metrics).
+- Con SIRA_PERFIL_UMBRAL_MS > 0, las peticiones se ejecutan bajo un perfilador (pyinstrument si
+  está instalado, si no cProfile) y las que superan el umbral se guardan en SIRA_PERFIL_DIR junto
+  con sus consultas SQL más lentas. Se perfila una petición a la vez. El perfilador solo ve el hilo
+  del event loop: en las rutas 'def' el trabajo del threadpool aparece como espera, y el desglose
+  SQL es lo que explica el tiempo. Es una herramienta de diagnóstico, no para dejarla activa.
+- Streams SSE (ruta terminada en /stream o respuesta text/event-stream): duran lo que la conexión,
+  así que no se perfilan ni entran en los histogramas por petición (solo en los contadores).
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+
+METRICAS_ACTIVAS = os.getenv("SIRA_METRICAS", "0") == "1"
+PERFIL_UMBRAL_MS = float(os.getenv("SIRA_PERFIL_UMBRAL_MS", "0")) # 0 = sin perfilado
+PERFIL_DIR = os.getenv("SIRA_PERFIL_DIR", "/tmp/sira_perfiles")
+PERFIL_MAX_FICHEROS = int(os.getenv("SIRA_PERFIL_MAX_FICHEROS", "100")) # Se borran los más antiguos
+
+RUTA_METRICAS = "/metrics"
+SUFIJO_STREAM = "/stream" # Rutas SSE (telemetria.stream_estado_iot)
+BUCKETS_DURACION_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+CONSULTAS_EN_PERFIL = 20 # Consultas más lentas que acompañan a cada perfil
+
+
+class ContadorBD:
+    """Lo que ha hecho una petición en la BBDD."""
+
+    def __init__(self, detalle: bool = False):
+        self.consultas = 0
+        self.tiempo_s = 0.0
+        self.filas = 0
+        self.detalle = [] if detalle else None # (segundos, sql) solo si se está perfilando
+
+    def registrar(self, duracion_s: float, filas: int, sql: str):
+        self.consultas += 1
+        self.tiempo_s += duracion_s
+        if filas > 0:
+            self.filas += filas
+        if self.detalle is not None:
+            self.detalle.append((duracion_s, sql))
+
+
+contador_actual: ContextVar[Optional[ContadorBD]] = ContextVar("contador_bd", default=None)
+
+
+# --- Eventos de SQLAlchemy ---
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sira_inicio", []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["sira_inicio"].pop()
+    contador = contador_actual.get()
+    if contador is not None:
+        contador.registrar(time.perf_counter() - inicio, cursor.rowcount, statement)
+
+
+def _error(contexto_excepcion):
+    # Si la consulta falla no hay 'after_cursor_execute': se descarta su marca de inicio
+    conn = contexto_excepcion.connection
+    if conn is not None and conn.info.get("sira_inicio"):
+        conn.info["sira_inicio"].pop()
+
+
+def instrumentar_motor(motor):
+    """Engancha los contadores a un Engine síncrono (para el asíncrono, 'async_engine.sync_engine')."""
+    if not event.contains(motor, "before_cursor_execute", _antes):
+        event.listen(motor, "before_cursor_execute", _antes)
+        event.listen(motor, "after_cursor_execute", _despues)
+        event.listen(motor, "handle_error", _error)
+
+
+# --- Métricas agregadas ---
+class Histograma:
+
+    def __init__(self, limites: tuple):
+        self.limites = limites
+        self.cuentas = [0] * len(limites)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cuentas[i] += 1
+        self.suma += valor
+        self.total += 1
+
+
+def _etiquetas(**valores) -> str:
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in valores.items()) + "}"
+
+
+class MetricasPeticiones:
+    """Contadores e histogramas por ruta (en memoria, por proceso)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = defaultdict(int)                                       # (método, ruta, estado)
+        self.duracion = defaultdict(lambda: Histograma(BUCKETS_DURACION_S))      # (método, ruta)
+        self.consultas = defaultdict(lambda: Histograma(BUCKETS_CONSULTAS))      # (método, ruta)
+        self.tiempo_bd_s = defaultdict(float)
+        self.filas = defaultdict(int)
+        self.perfiles_guardados = 0
+
+    def registrar(self, metodo: str, ruta: str, estado: int, duracion_s: float, bd: ContadorBD, stream: bool = False):
+        clave = (metodo, ruta)
+        with self._lock:
+            self.peticiones[(metodo, ruta, estado)] += 1
+            if not stream: # Un stream dura lo que la conexión: deformaría los histogramas
+                self.duracion[clave].observar(duracion_s)
+                self.consultas[clave].observar(bd.consultas)
+            self.tiempo_bd_s[clave] += bd.tiempo_s
+            self.filas[clave] += bd.filas
+
+    def contar_perfil(self):
+        with self._lock:
+            self.perfiles_guardados += 1
+
+    def prometheus(self) -> str:
+        """Exposición en formato de texto de Prometheus (version 0.0.4)."""
+        lineas = []
+
+        def cabecera(nombre, tipo, ayuda):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+        def histograma(nombre, datos):
+            for (metodo, ruta), h in sorted(datos.items()):
+                for limite, cuenta in zip(h.limites, h.cuentas):
+                    lineas.append(f"{nombre}_bucket{_etiquetas(metodo=metodo, ruta=ruta, le=limite)} {cuenta}")
+                lineas.append(f"{nombre}_bucket{_etiquetas(metodo=metodo, ruta=ruta, le='+Inf')} {h.total}")
+                lineas.append(f"{nombre}_sum{_etiquetas(metodo=metodo, ruta=ruta)} {h.suma:.6f}")
+                lineas.append(f"{nombre}_count{_etiquetas(metodo=metodo, ruta=ruta)} {h.total}")
+
+        with self._lock:
+            cabecera("sira_http_peticiones_total", "counter", "Peticiones HTTP atendidas por ruta y código de estado.")
+            for (metodo, ruta, estado), n in sorted(self.peticiones.items()):
+                lineas.append(f"sira_http_peticiones_total{_etiquetas(metodo=metodo, ruta=ruta, estado=estado)} {n}")
+            cabecera("sira_http_duracion_segundos", "histogram", "Latencia de las peticiones HTTP.")
+            histograma("sira_http_duracion_segundos", self.duracion)
+            cabecera("sira_bd_consultas_por_peticion", "histogram", "Consultas SQL lanzadas por petición.")
+            histograma("sira_bd_consultas_por_peticion", self.consultas)
+            cabecera("sira_bd_tiempo_segundos_total", "counter", "Tiempo total en la BBDD por ruta.")
+            for (metodo, ruta), s in sorted(self.tiempo_bd_s.items()):
+                lineas.append(f"sira_bd_tiempo_segundos_total{_etiquetas(metodo=metodo, ruta=ruta)} {s:.6f}")
+            cabecera("sira_bd_filas_total", "counter", "Filas devueltas o afectadas (cursor.rowcount) por ruta.")
+            for (metodo, ruta), n in sorted(self.filas.items()):
+                lineas.append(f"sira_bd_filas_total{_etiquetas(metodo=metodo, ruta=ruta)} {n}")
+            cabecera("sira_perfiles_guardados_total", "counter", "Perfiles de peticiones lentas escritos en disco.")
+            lineas.append(f"sira_perfiles_guardados_total {self.perfiles_guardados}")
+        return "\n".join(lineas) + "\n"
+
+
+metricas = MetricasPeticiones()
+
+
+# --- Perfilado de peticiones lentas ---
+class Perfil:
+    """pyinstrument (consciente de async) si está instalado; si no, cProfile."""
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+            self.perfilador, self.extension = Profiler(async_mode="enabled"), "html"
+            self.perfilador.start()
+        except ImportError:
+            self.perfilador, self.extension = cProfile.Profile(), "txt"
+            self.perfilador.enable()
+
+    def detener(self):
+        if self.extension == "html":
+            self.perfilador.stop()
+        else:
+            self.perfilador.disable()
+
+    def texto(self) -> str:
+        if self.extension == "html":
+            return self.perfilador.output_html()
+        salida = io.StringIO()
+        pstats.Stats(self.perfilador, stream=salida).sort_stats("cumulative").print_stats(60)
+        return salida.getvalue()
+
+
+_perfilando = threading.Lock() # Una petición perfilada a la vez (el resto pasa sin perfilar)
+
+
+def guardar_perfil(perfil: Perfil, metodo: str, ruta: str, duracion_s: float, bd: ContadorBD) -> str:
+    os.makedirs(PERFIL_DIR, exist_ok=True)
+    nombre = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{metodo}_{re.sub(r'[^A-Za-z0-9]+', '_', ruta).strip('_')}_{duracion_s * 1000:.0f}ms"
+    consultas = sorted(bd.detalle, key=lambda c: c[0], reverse=True)[:CONSULTAS_EN_PERFIL]
+    with open(os.path.join(PERFIL_DIR, f"{nombre}.sql.txt"), "w", encoding="utf-8") as f:
+        f.write(f"{metodo} {ruta}: {duracion_s * 1000:.1f} ms, {bd.consultas} consultas, "
+                f"{bd.tiempo_s * 1000:.1f} ms en BBDD, {bd.filas} filas\n\n")
+        for segundos, sql in consultas:
+            f.write(f"-- {segundos * 1000:.2f} ms\n{sql.strip()}\n\n")
+    ruta_perfil = os.path.join(PERFIL_DIR, f"{nombre}.{perfil.extension}")
+    with open(ruta_perfil, "w", encoding="utf-8") as f:
+        f.write(perfil.texto())
+
+    # Rotación: solo se conservan los PERFIL_MAX_FICHEROS perfiles más recientes
+    perfiles = sorted(n for n in os.listdir(PERFIL_DIR) if not n.endswith(".sql.txt"))
+    for antiguo in perfiles[:max(0, len(perfiles) - PERFIL_MAX_FICHEROS)]:
+        for fichero in (antiguo, antiguo.rsplit(".", 1)[0] + ".sql.txt"):
+            try:
+                os.remove(os.path.join(PERFIL_DIR, fichero))
+            except OSError:
+                pass
+    return ruta_perfil
+
+
+# --- Middleware ---
+class MiddlewarePerfilado:
+    """Middleware ASGI puro (no bufferiza la respuesta, apto para los streams SSE)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == RUTA_METRICAS:
+            return await self.app(scope, receive, send)
+
+        stream = scope["path"].endswith(SUFIJO_STREAM)
+        perfil = None
+        if PERFIL_UMBRAL_MS > 0 and not stream and _perfilando.acquire(blocking=False):
+            perfil = Perfil()
+        bd = ContadorBD(detalle=perfil is not None)
+        token = contador_actual.set(bd)
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado, stream, perfil
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                cabeceras = dict(mensaje.get("headers") or [])
+                if cabeceras.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    stream = True
+                    if perfil is not None:
+                        # Se suelta ya: un stream abierto no debe bloquear el perfilado del resto
+                        perfil.detener()
+                        perfil = None
+                        bd.detalle = None
+                        _perfilando.release()
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion_s = time.perf_counter() - inicio
+            contador_actual.reset(token)
+            # Plantilla de la ruta (la deja el router en el scope): sin ids, cardinalidad acotada
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            metricas.registrar(scope["method"], ruta, estado, duracion_s, bd, stream=stream)
+            if perfil is not None:
+                try:
+                    perfil.detener()
+                    if duracion_s * 1000 >= PERFIL_UMBRAL_MS:
+                        guardar_perfil(perfil, scope["method"], ruta, duracion_s, bd)
+                        metricas.contar_perfil()
+                except Exception as e:
+                    print(f"⚠️ No se pudo guardar el perfil de {ruta}: {e}")
+                finally:
+                    _perfilando.release()
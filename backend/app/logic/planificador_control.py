@@ -0,0 +1,196 @@
+"""
+Planificador del Cerebro de Control (Flota Completa).
+
+Ejecuta 'control_brain.ejecutar_ciclo_invernadero' para todos los invernaderos activos
+cada SIRA_CONTROL_INTERVALO_S segundos, sin depender de que alguien llame a /simular.
+
+- Concurrencia acotada: como mucho SIRA_CONTROL_CONCURRENCIA ciclos a la vez (cada uno
+  en un hilo con su propia sesión de BBDD, el cerebro es síncrono).
+- Jitter por invernadero: cada invernadero arranca con un desfase fijo dentro de
+  SIRA_CONTROL_JITTER_S para no disparar todos los ciclos en el mismo instante.
+- Detección de solapes: si el tick anterior sigue en marcha cuando toca el siguiente,
+  el nuevo tick se salta y se contabiliza.
+- Métricas de latencia por ciclo y por tick (ver 'metricas.resumen()').
+- SIRA_CONTROL_MODO=vectorial: en vez de un ciclo por invernadero, cada unidad de trabajo
+  es un lote de SIRA_CONTROL_LOTE invernaderos evaluado en bloque (control_vectorial).
+
+Dos formas de arrancarlo:
+  - Dentro de la API: SIRA_CONTROL_AUTOMATICO=1 (solo con UN proceso de uvicorn).
+  - Como proceso aparte: python scripts/worker_control.py
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from ..database import SessionLocal
+from .. import models
+from . import control_brain
+
+CONTROL_AUTOMATICO = os.getenv("SIRA_CONTROL_AUTOMATICO", "0") == "1"
+INTERVALO_S = float(os.getenv("SIRA_CONTROL_INTERVALO_S", "60"))
+CONCURRENCIA = int(os.getenv("SIRA_CONTROL_CONCURRENCIA", "4"))
+JITTER_S = float(os.getenv("SIRA_CONTROL_JITTER_S", str(min(5.0, INTERVALO_S / 4))))
+# 'invernadero': un ciclo escalar por invernadero. 'vectorial': lotes evaluados con NumPy (control_vectorial)
+MODO = os.getenv("SIRA_CONTROL_MODO", "invernadero")
+TAMANO_LOTE = int(os.getenv("SIRA_CONTROL_LOTE", "500"))
+
+MUESTRAS_LATENCIA = 1000 # Ventana de ciclos recientes para los percentiles
+
+
+class MetricasControl:
+    """Contadores y latencias del planificador (en memoria, por proceso)."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.ticks_saltados = 0
+        self.ciclos_ok = 0
+        self.ciclos_error = 0
+        self.cambios_aplicados = 0
+        self.ultimo_tick = None
+        self.duracion_ultimo_tick_ms = None
+        self.latencias_ms = deque(maxlen=MUESTRAS_LATENCIA)
+
+    def registrar_ciclo(self, latencia_ms: float, resultado: dict = None, error: bool = False):
+        self.latencias_ms.append(latencia_ms)
+        if error:
+            self.ciclos_error += 1
+        else:
+            self.ciclos_ok += 1
+            self.cambios_aplicados += (resultado or {}).get("decisiones_ejecutadas", 0)
+
+    def resumen(self) -> dict:
+        muestras = sorted(self.latencias_ms)
+
+        def percentil(p):
+            if not muestras:
+                return None
+            return round(muestras[min(len(muestras) - 1, int(len(muestras) * p))], 2)
+
+        return {
+            "activo": planificador.en_marcha,
+            "modo": MODO,
+            "intervalo_s": INTERVALO_S,
+            "concurrencia": CONCURRENCIA,
+            "jitter_s": JITTER_S,
+            "ticks": self.ticks,
+            "ticks_saltados": self.ticks_saltados,
+            "ciclos_ok": self.ciclos_ok,
+            "ciclos_error": self.ciclos_error,
+            "cambios_aplicados": self.cambios_aplicados,
+            "ultimo_tick": self.ultimo_tick,
+            "duracion_ultimo_tick_ms": self.duracion_ultimo_tick_ms,
+            "latencia_ciclo_ms": {
+                "p50": percentil(0.50),
+                "p95": percentil(0.95),
+                "p99": percentil(0.99),
+                "max": round(muestras[-1], 2) if muestras else None
+            }
+        }
+
+
+metricas = MetricasControl()
+
+
+def listar_invernaderos_activos() -> list[int]:
+    """Invernaderos a controlar: activos y plantados (los que tienen IoT provisionado)."""
+    with SessionLocal() as db:
+        filas = db.query(models.Invernadero.invernadero_id).filter(
+            models.Invernadero.activa == True,
+            models.Invernadero.cultivo_id.isnot(None)
+        ).order_by(models.Invernadero.invernadero_id).all()
+    return [inv_id for (inv_id,) in filas]
+
+
+def ciclo_invernadero(invernadero_id: int) -> dict:
+    """Un ciclo de control con su propia sesión (se ejecuta en un hilo del pool)."""
+    with SessionLocal() as db:
+        return control_brain.ejecutar_ciclo_invernadero(db, invernadero_id)
+
+
+def ciclo_lote(invernadero_ids: list) -> dict:
+    """Ciclo de control vectorizado de un lote de invernaderos con su propia sesión."""
+    from . import control_vectorial # Solo se carga NumPy si se usa el modo vectorial
+    with SessionLocal() as db:
+        return control_vectorial.ejecutar_ciclo_flota(db, invernadero_ids)
+
+
+def desfase_invernadero(invernadero_id: int) -> float:
+    """Jitter determinista: el mismo invernadero cae siempre en el mismo hueco del intervalo."""
+    if JITTER_S <= 0:
+        return 0.0
+    return (invernadero_id * 2654435761 % 1000) / 1000 * JITTER_S
+
+
+class PlanificadorControl:
+
+    def __init__(self):
+        self._tarea = None
+        self._tick_en_curso = None
+        self._semaforo = None
+
+    @property
+    def en_marcha(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def iniciar(self):
+        """Lanza el bucle en el event loop actual (llamar desde código async)."""
+        if not self.en_marcha:
+            self._tarea = asyncio.create_task(self.bucle())
+
+    async def detener(self):
+        for tarea in (self._tarea, self._tick_en_curso):
+            if tarea and not tarea.done():
+                tarea.cancel()
+                try:
+                    await tarea
+                except asyncio.CancelledError:
+                    pass
+        self._tarea = None
+
+    async def bucle(self):
+        self._semaforo = asyncio.Semaphore(CONCURRENCIA)
+        print(f"⏱️ Planificador de control activo (cada {INTERVALO_S}s, concurrencia {CONCURRENCIA}).")
+        proximo = time.monotonic()
+        while True:
+            if self._tick_en_curso and not self._tick_en_curso.done():
+                # El tick anterior no ha terminado: no se solapan ciclos del mismo invernadero
+                metricas.ticks_saltados += 1
+                print("⚠️ Planificador: tick saltado (el anterior sigue en marcha).")
+            else:
+                self._tick_en_curso = asyncio.create_task(self.tick())
+            # Cadencia fija respecto al reloj, no respecto al final del tick
+            proximo += INTERVALO_S
+            await asyncio.sleep(max(0.0, proximo - time.monotonic()))
+
+    async def tick(self):
+        inicio = time.perf_counter()
+        metricas.ticks += 1
+        metricas.ultimo_tick = datetime.now(timezone.utc)
+        try:
+            invernaderos = await asyncio.to_thread(listar_invernaderos_activos)
+            if MODO == "vectorial":
+                lotes = [invernaderos[i:i + TAMANO_LOTE] for i in range(0, len(invernaderos), TAMANO_LOTE)]
+                await asyncio.gather(*(self.ciclo(lote[0], ciclo_lote, lote) for lote in lotes))
+            else:
+                await asyncio.gather(*(self.ciclo(inv_id, ciclo_invernadero, inv_id) for inv_id in invernaderos))
+        except Exception as e:
+            print(f"❌ Planificador: error al preparar el tick: {e}")
+        finally:
+            metricas.duracion_ultimo_tick_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    async def ciclo(self, invernadero_id: int, funcion, argumento):
+        """Unidad de trabajo (un invernadero o un lote que empieza por 'invernadero_id')."""
+        await asyncio.sleep(desfase_invernadero(invernadero_id))
+        async with self._semaforo:
+            inicio = time.perf_counter()
+            try:
+                resultado = await asyncio.to_thread(funcion, argumento)
+                metricas.registrar_ciclo((time.perf_counter() - inicio) * 1000, resultado)
+            except Exception as e:
+                metricas.registrar_ciclo((time.perf_counter() - inicio) * 1000, error=True)
+                print(f"❌ Planificador: fallo en el invernadero {invernadero_id}: {e}")
+
+
+planificador = PlanificadorControl()
@@ -0,0 +1,158 @@
+"""
+Caché de Sesiones y Actividad de Usuarios (por proceso).
+
+Antes 'auth.get_current_user' hacía, en CADA petición autenticada, un SELECT del cliente
+y un UPDATE de 'ultima_actividad' con su commit. Con el dashboard refrescando cada pocos
+segundos eso era una escritura (y un flush del WAL) por petición. Ahora:
+
+  - Validación: (cif, sid) validado contra la BBDD se recuerda AUTH_CACHE_TTL_S segundos
+    junto con las columnas del cliente. Mientras no caduque no hay SELECT.
+  - Actividad: cada petición solo anota "ahora" en memoria. El volcador escribe todas las
+    actividades pendientes con UN UPDATE cada AUTH_ACTIVIDAD_VOLCADO_S segundos.
+
+La semántica no cambia:
+  - Timeout deslizante de 30 minutos: se compara con la actividad más reciente entre la BBDD
+    y la pendiente en memoria (la BBDD va como mucho un intervalo de volcado por detrás).
+  - Sesión única: login, logout y cambios del cliente invalidan su entrada. Un login hecho
+    desde OTRO proceso se detecta, como tarde, al caducar el TTL.
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import time as reloj
+
+from sqlalchemy import DateTime, Integer, column, func, inspect, update, values
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+
+CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "30"))
+VOLCADO_S = float(os.getenv("AUTH_ACTIVIDAD_VOLCADO_S", "60"))
+TIMEOUT_INACTIVIDAD = timedelta(minutes=30)
+
+
+class CacheSesiones:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {cif: (sid, {columna: valor}, instante de caducidad)}
+        self._validadas = {}
+        # {cliente_id: datetime UTC} actividad aún no escrita en la BBDD
+        self._pendientes = {}
+        self._tarea = None
+
+    # --- Validación ---
+    def obtener(self, db: Session, cif: str, sid: str):
+        """Cliente cacheado (ya unido a 'db', sin SELECT) o None si no hay entrada vigente."""
+        entrada = self._validadas.get(cif)
+        if not entrada or entrada[0] != sid or entrada[2] < reloj.monotonic():
+            return None
+        return self._adjuntar(db, entrada[1])
+
+    def guardar(self, cif: str, sid: str, cliente: models.Cliente):
+        self._validadas[cif] = (sid, self._columnas(cliente), reloj.monotonic() + CACHE_TTL_S)
+
+    def adjuntar(self, db: Session, cliente: models.Cliente):
+        """Copia del cliente unida a 'db' (sin SELECT), p. ej. si se cargó con otra sesión."""
+        return self._adjuntar(db, self._columnas(cliente))
+
+    @staticmethod
+    def _columnas(cliente: models.Cliente) -> dict:
+        return {attr.key: getattr(cliente, attr.key) for attr in inspect(models.Cliente).column_attrs}
+
+    @staticmethod
+    def _adjuntar(db: Session, columnas: dict):
+        cliente = models.Cliente(**columnas)
+        make_transient_to_detached(cliente)
+        return db.merge(cliente, load=False)
+
+    def invalidar(self, cif: str = None):
+        """Olvida la validación de un cliente (o de todos si no se indica)."""
+        if cif is None:
+            self._validadas.clear()
+        else:
+            self._validadas.pop(cif, None)
+
+    # --- Actividad ---
+    def ultima_actividad(self, cliente_id: int, en_bbdd: datetime = None):
+        """La más reciente entre la guardada en BBDD y la pendiente de volcar."""
+        if en_bbdd is not None and en_bbdd.tzinfo is None:
+            en_bbdd = en_bbdd.replace(tzinfo=timezone.utc)
+        pendiente = self._pendientes.get(cliente_id)
+        return max(filter(None, (en_bbdd, pendiente)), default=None)
+
+    def marcar_actividad(self, cliente_id: int):
+        with self._lock:
+            self._pendientes[cliente_id] = datetime.now(timezone.utc)
+
+    def descartar_actividad(self, cliente_id: int):
+        with self._lock:
+            self._pendientes.pop(cliente_id, None)
+
+    def volcar(self, db: Session) -> int:
+        """Escribe todas las actividades pendientes con un único UPDATE ... FROM (VALUES ...)."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return 0
+
+        lote = values(
+            column("cliente_id", Integer), column("ultima_actividad", DateTime(timezone=True)),
+            name="actividad"
+        ).data(list(pendientes.items()))
+        tabla = models.Cliente.__table__
+        try:
+            db.execute(
+                update(tabla)
+                .where(tabla.c.cliente_id == lote.c.cliente_id)
+                # greatest: otro proceso puede haber escrito ya una actividad más reciente
+                .values(ultima_actividad=func.greatest(
+                    func.coalesce(tabla.c.ultima_actividad, lote.c.ultima_actividad), lote.c.ultima_actividad
+                ))
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Se reintenta en el siguiente volcado (lo anotado mientras tanto es más reciente)
+            with self._lock:
+                for cliente_id, momento in pendientes.items():
+                    self._pendientes.setdefault(cliente_id, momento)
+            raise
+        return len(pendientes)
+
+    # --- Volcador en segundo plano ---
+    def _volcar_con_sesion(self) -> int:
+        from ..database import SessionLocal
+        with SessionLocal() as db:
+            return self.volcar(db)
+
+    async def bucle_volcado(self):
+        while True:
+            await asyncio.sleep(VOLCADO_S)
+            try:
+                await asyncio.to_thread(self._volcar_con_sesion)
+            except Exception as e:
+                print(f"⚠️ Error al volcar la actividad de usuarios: {e}")
+
+    def iniciar(self):
+        """Lanza el volcador en el event loop actual (llamar desde código async)."""
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self.bucle_volcado())
+
+    async def detener(self):
+        """Para el volcador y escribe lo que quede pendiente."""
+        if self._tarea and not self._tarea.done():
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = None
+        try:
+            await asyncio.to_thread(self._volcar_con_sesion)
+        except Exception as e:
+            print(f"⚠️ Error al volcar la actividad de usuarios: {e}")
+
+
+sesiones = CacheSesiones()
@@ -0,0 +1,98 @@
+"""
+Versiones para ETag / GET condicional (por proceso).
+
+GET /api/v1/iot/estado/{id} y GET /api/v1/clientes/me/jerarquia devuelven documentos grandes
+que casi nunca cambian entre dos refrescos del dashboard. Cada escritura relevante sube un
+contador en memoria y el ETag se construye SOLO con contadores, así un 'If-None-Match' que
+coincide se responde con 304 antes de lanzar ninguna consulta pesada ni 'generar_resumen_humano'.
+
+  - Invernadero: mediciones de sus sensores, estado/acciones de sus actuadores, sus datos.
+  - Cliente: sus parcelas e invernaderos (altas, cambios, archivado) y sus propios datos.
+  - Global: cambios raros que afectan a muchos documentos (jornadas, cultivos, localidades).
+
+El ETag incluye además:
+  - Un identificador del proceso: un ETag emitido por otro worker (u otro arranque) nunca coincide.
+  - La ventana temporal de ETAG_VENTANA_S segundos: acota a ese tiempo lo que no pasa por este
+    proceso (escrituras del worker de control o de otro worker, cambio de jornada por la hora).
+
+Por eso es un ETag DÉBIL (W/"..."): no garantiza que el documento sea idéntico byte a byte, solo
+que es equivalente salvo esos cambios externos, que pueden tardar hasta ETAG_VENTANA_S segundos
+en verse (con ETAG_VENTANA_S=0, hasta que este proceso registre otra escritura). Vale para
+If-None-Match (comparación débil), no para peticiones de rangos ni If-Match.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+VENTANA_S = int(os.getenv("ETAG_VENTANA_S", "60"))
+
+
+def no_modificado(if_none_match: str, etag: str) -> bool:
+    """True si la cabecera If-None-Match del cliente incluye 'etag' (o es '*'). Comparación débil."""
+    if not if_none_match:
+        return False
+    candidatas = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+    return "*" in candidatas or etag.removeprefix("W/") in candidatas
+
+
+class Versiones:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proceso = uuid.uuid4().hex[:8]
+        self._global = 0
+        self._invernaderos = defaultdict(int)
+        self._clientes = defaultdict(int)
+        # Índices inversos de los invernaderos ya servidos: {sensor_id | actuador_id: invernadero_id}
+        self._inv_por_sensor = {}
+        self._inv_por_actuador = {}
+
+    # --- ETags (leer SIEMPRE antes de calcular el documento) ---
+    def etag_invernadero(self, invernadero_id: int, *variantes) -> str:
+        return self._etag("i", invernadero_id, self._invernaderos[invernadero_id], variantes)
+
+    def etag_cliente(self, cliente_id: int, *variantes) -> str:
+        return self._etag("c", cliente_id, self._clientes[cliente_id], variantes)
+
+    def _etag(self, ambito: str, ident: int, version: int, variantes: tuple) -> str:
+        ventana = int(time.time() // VENTANA_S) if VENTANA_S > 0 else 0
+        huella = hashlib.sha1(repr(variantes).encode()).hexdigest()[:12]
+        return f'W/"{self._proceso}-{ambito}{ident}-{self._global}.{version}-{ventana}-{huella}"'
+
+    def registrar_dispositivos(self, invernadero_id: int, sensor_ids, actuador_ids):
+        """Recuerda a qué invernadero pertenece cada dispositivo (se llama al construir el estado)."""
+        with self._lock:
+            self._inv_por_sensor.update(dict.fromkeys(sensor_ids, invernadero_id))
+            self._inv_por_actuador.update(dict.fromkeys(actuador_ids, invernadero_id))
+
+    # --- Escrituras ---
+    def cambio_sensores(self, sensor_ids):
+        # Un sensor desconocido es de un invernadero cuyo estado aún no se ha servido: sin ETag que invalidar
+        with self._lock:
+            for inv_id in {self._inv_por_sensor[s] for s in sensor_ids if s in self._inv_por_sensor}:
+                self._invernaderos[inv_id] += 1
+
+    def cambio_actuadores(self, actuador_ids):
+        with self._lock:
+            for inv_id in {self._inv_por_actuador[a] for a in actuador_ids if a in self._inv_por_actuador}:
+                self._invernaderos[inv_id] += 1
+
+    def cambio_invernadero(self, invernadero_id: int):
+        with self._lock:
+            self._invernaderos[invernadero_id] += 1
+
+    def cambio_cliente(self, *cliente_ids):
+        with self._lock:
+            for cliente_id in cliente_ids:
+                if cliente_id is not None:
+                    self._clientes[cliente_id] += 1
+
+    def cambio_global(self):
+        with self._lock:
+            self._global += 1
+
+
+versiones = Versiones()
@@ -35,20 +35,94 @@ models.Base.metadata.create_all(bind=engine)
 from sqlalchemy import text
 from sqlalchemy.exc import ProgrammingError
 
+# sira_unaccent (envoltorio IMMUTABLE, ver 10-schema.sql) va en este mismo paso y NO en el de los
+# índices: los buscadores la necesitan siempre, aunque pg_trgm o los índices no se puedan crear.
+SQL_SIRA_UNACCENT = """
+CREATE OR REPLACE FUNCTION sira_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$
+"""
+
 try:
     with engine.connect() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent;"))
+        conn.exec_driver_sql(SQL_SIRA_UNACCENT, execution_options={"no_parameters": True})
         conn.commit()
-        print("✅ Extensión 'unaccent' verificada/activada.")
+        print("✅ Extensión 'unaccent' y función 'sira_unaccent' verificadas/activadas.")
 except Exception as e:
     # Si falla (ej: usando SQLite o sin permisos de superusuario), ignoramos para no tirar la API
     print(f"⚠️ Aviso: No se pudo activar 'unaccent' automáticamente: {e}")
 
+# Columna de orden del listado de clientes (V8.4 de 10-schema.sql) en BBDD existentes.
+# Paso propio y sin extensiones: el modelo Cliente la mapea, así que sin ella fallaría CUALQUIER
+# consulta de clientes (login incluido). En BBDD nuevas ya la crean 10-schema.sql o create_all.
+SQL_ORDEN_CLIENTES = (
+    "ALTER TABLE CLIENTE ADD COLUMN IF NOT EXISTS rango_prioridad int "
+    "GENERATED ALWAYS AS (CASE rol WHEN 'root' THEN 0 WHEN 'admin' THEN 1 ELSE 2 END) STORED",
+    "CREATE INDEX IF NOT EXISTS idx_cliente_orden ON CLIENTE (rango_prioridad, cliente_id)",
+)
+
+try:
+    with engine.begin() as conn:
+        for sentencia in SQL_ORDEN_CLIENTES:
+            conn.exec_driver_sql(sentencia)
+    print("✅ Columna de orden de clientes (rango_prioridad) verificada.")
+except Exception as e:
+    # SQLite (create_all ya la crea como columna generada) o sin permisos sobre CLIENTE
+    print(f"⚠️ Aviso: No se pudo verificar la columna de orden de clientes: {getattr(e, 'orig', e)}")
+
+# Índices de búsqueda de texto (pg_trgm + sira_unaccent): el script es idempotente
+import os
+RUTA_INDICES_BUSQUEDA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "40-indices-busqueda.sql")
+
+def aplicar_indices_busqueda(motor) -> None:
+    """
+    Ejecuta 40-indices-busqueda.sql en una transacción. Se envía SIN parámetros: si no,
+    psycopg interpretaría los '%' del script (comentarios, format()) como marcadores.
+    """
+    with open(RUTA_INDICES_BUSQUEDA, encoding="utf-8") as f, motor.begin() as conn:
+        conn.exec_driver_sql(f.read(), execution_options={"no_parameters": True})
+
+try:
+    aplicar_indices_busqueda(engine)
+    print("✅ Índices de búsqueda (pg_trgm) verificados.")
+except Exception as e:
+    # SQLite, sin permisos para crear extensiones o sin la carpeta 'database' junto a 'app'
+    print(f"⚠️ Aviso: No se pudieron verificar los índices de búsqueda: {getattr(e, 'orig', e)}")
+
 # --- 2. INICIALIZACIÓN DE LA APP ---
+from contextlib import asynccontextmanager
+from .logic.planificador_control import CONTROL_AUTOMATICO, planificador
+from .logic.sesiones import sesiones
+from .logic.mantenimiento_medicion import mantenimiento_medicion
+from .database import async_engine
+
+@asynccontextmanager
+async def ciclo_vida(app: FastAPI):
+    """
+    Arranca/para las tareas de fondo:
+      - Volcador por lotes de la actividad de usuarios (logic/sesiones.py).
+      - Planificador del cerebro de control, si está activado por entorno.
+      - Mantenimiento de las particiones de MEDICION (creación y retención periódicas).
+    """
+    sesiones.iniciar()
+    mantenimiento_medicion.iniciar()
+    if CONTROL_AUTOMATICO:
+        planificador.iniciar()
+    yield
+    await planificador.detener()
+    await mantenimiento_medicion.detener()
+    await sesiones.detener()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 app = FastAPI(
     title="SIRA API",
     description="Backend para el Sistema Integral de Riego Automático",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=ciclo_vida
 )
 
 # --- 3. CONEXIÓN DE ROUTERS ---
@@ -62,6 +136,22 @@ app.include_router(telemetria.router)
 app.include_router(configuracion.router)
 app.include_router(sistema.router)
 
+# Métricas por ruta (latencia, consultas SQL, tiempo en BBDD) y perfilado de peticiones lentas.
+# Opt-in con SIRA_METRICAS=1 (logic/perfilado.py): sin ella no hay middleware ni eventos.
+from fastapi.responses import PlainTextResponse
+from .logic import perfilado
+
+if perfilado.METRICAS_ACTIVAS:
+    perfilado.instrumentar_motor(engine)
+    if async_engine is not None:
+        perfilado.instrumentar_motor(async_engine.sync_engine)
+    app.add_middleware(perfilado.MiddlewarePerfilado)
+
+    @app.get(perfilado.RUTA_METRICAS, include_in_schema=False)
+    def metricas_prometheus():
+        """Métricas de ESTE proceso en formato Prometheus (solo red interna: Nginx no publica /metrics)."""
+        return PlainTextResponse(perfilado.metricas.prometheus(), media_type="text/plain; version=0.0.4")
+
 
 # --- 4. ENDPOINT DE VERIFICACIÓN ---
 @app.get("/")
@@ -23,7 +23,8 @@ utilizado por 'schemas.py' (Pydantic) y toda la lógica de la API (CRUD).
 """
 
 # Importamos los tipos de datos y funciones necesarios de SQLAlchemy.
-from sqlalchemy import (Column, Integer, String, Date, ForeignKey, DateTime, CHAR, Numeric, Index, Boolean)
+from sqlalchemy import (Column, Integer, String, Date, ForeignKey, DateTime, CHAR, Numeric, Index, Boolean, CheckConstraint, Computed)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from decimal import Decimal # Importación explícita para Type Hinting correcto
@@ -56,6 +57,8 @@ class Cliente(Base):
     debe_cambiar_pw: bool = Column(Boolean, default=True) # Obligar a cambio en primer login
     session_id: str = Column(String(255), nullable=True) # Identificador de sesión activa para control de concurrencia
     ultima_actividad = Column(DateTime(timezone=True), nullable=True) # Huella digital para estado "En Línea"
+    # Columna generada (root 0, admin 1, cliente 2): clave de orden indexada del listado (40-indices-busqueda.sql)
+    rango_prioridad: int = Column(Integer, Computed("CASE rol WHEN 'root' THEN 0 WHEN 'admin' THEN 1 ELSE 2 END", persisted=True))
 
     # --- Relaciones (ORM) ---
     parcelas = relationship("Parcela", back_populates="cliente")
@@ -223,11 +226,14 @@ class Sensor(Base):
     invernadero = relationship("Invernadero", back_populates="sensores")
     tipo_sensor = relationship("TipoSensor", back_populates="sensores")
     mediciones = relationship("Medicion", back_populates="sensor")
+    ultima_lectura = relationship("SensorUltimaLectura", uselist=False, back_populates="sensor")
 
 # 10. MEDICION
 class Medicion(Base):
     """
     Dato atómico capturado por un sensor (Serie Temporal).
+    En PostgreSQL la tabla está particionada por mes sobre 'fecha_hora' (30-particionado-medicion.sql),
+    con PK física (medicion_id, fecha_hora). medicion_id sigue siendo único (secuencia).
     """
     __tablename__ = 'medicion'
     
@@ -241,6 +247,75 @@ class Medicion(Base):
     # --- Relaciones ---
     sensor = relationship("Sensor", back_populates="mediciones")
 
+    # Recupera 'fecha_hora' (server_default) en el propio INSERT ... RETURNING, sin SELECT extra
+    __mapper_args__ = {"eager_defaults": True}
+
+# 10b. SENSOR_ULTIMA_LECTURA
+class SensorUltimaLectura(Base):
+    """
+    Valor actual de cada sensor (una fila por sensor).
+    Se actualiza (UPSERT) en la misma transacción que cada nueva Medicion, de modo que
+    consultar el "estado actual" cuesta O(sensores) y no O(histórico de mediciones).
+    """
+    __tablename__ = 'sensor_ultima_lectura'
+
+    sensor_id: int = Column(Integer, ForeignKey('sensor.sensor_id', ondelete='CASCADE'), primary_key=True)
+    medicion_id: int = Column(Integer, nullable=False) # Referencia informativa a MEDICION (sin FK para no bloquear la purga del histórico)
+    fecha_hora: DateTime = Column(DateTime(timezone=True), nullable=False)
+    valor: Decimal = Column(Numeric(10,2), nullable=False)
+
+    # --- Relaciones ---
+    sensor = relationship("Sensor", back_populates="ultima_lectura")
+
+# 10c. MEDICION_AGREGADA
+class MedicionAgregada(Base):
+    """
+    Resumen (mín/máx/suma/cuenta) de las mediciones de un sensor dentro de una cubeta
+    temporal de 'resolucion_s' segundos (60, 900 o 3600). Alimenta las gráficas históricas.
+    """
+    __tablename__ = 'medicion_agregada'
+
+    sensor_id: int = Column(Integer, ForeignKey('sensor.sensor_id', ondelete='CASCADE'), primary_key=True)
+    resolucion_s: int = Column(Integer, primary_key=True)
+    bucket: DateTime = Column(DateTime(timezone=True), primary_key=True) # Inicio de la cubeta (UTC)
+    minimo: Decimal = Column(Numeric(10,2), nullable=False)
+    maximo: Decimal = Column(Numeric(10,2), nullable=False)
+    suma: Decimal = Column(Numeric(16,2), nullable=False)
+    cuenta: int = Column(Integer, nullable=False)
+
+# 10d. JORNADA_CONFIG
+class JornadaConfig(Base):
+    """
+    Jornada laboral semanal de un cliente (configuración global) o de un invernadero.
+    Una fila por ámbito: exactamente uno de 'cliente_id' / 'invernadero_id' está informado.
+    'tramos' guarda las claves del formulario: {"default": [...], "0": ..., "6": ...}.
+    """
+    __tablename__ = 'jornada_config'
+
+    jornada_id: int = Column(Integer, primary_key=True)
+    cliente_id: int = Column(Integer, ForeignKey('cliente.cliente_id', ondelete='CASCADE'), unique=True, nullable=True)
+    invernadero_id: int = Column(Integer, ForeignKey('invernadero.invernadero_id', ondelete='CASCADE'), unique=True, nullable=True)
+    es_laborable: bool = Column(Boolean, nullable=False, default=True)
+    heredar_de_global: bool = Column(Boolean, nullable=False, default=False)
+    tramos: dict = Column(JSONB, nullable=False, default=dict)
+    fecha_actualizacion: DateTime = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        CheckConstraint('(cliente_id IS NULL) <> (invernadero_id IS NULL)', name='ck_jornada_ambito'),
+    )
+
+# 10e. GEO_CACHE
+class GeoCache(Base):
+    """
+    Respuestas de las APIs geográficas externas (Zippopotam / Nominatim), ver logic/cache_geo.py.
+    'respuesta' NULL o [] = no encontrado (caché negativa, con caducidad más corta).
+    """
+    __tablename__ = 'geo_cache'
+
+    clave: str = Column(String(150), primary_key=True) # 'cp:04700' | 'municipio:el ejido'
+    respuesta = Column(JSONB, nullable=True)
+    caduca: DateTime = Column(DateTime(timezone=True), nullable=False)
+
 # 11. TIPO_ACTUADOR
 class TipoActuador(Base):
     """
@@ -308,6 +383,7 @@ Index('idx_accion_actuador', AccionActuador.actuador_id)
 Index('idx_recomendacion_invernadero', RecomendacionRiego.invernadero_id)
 
 # Índices Críticos para IoT (Series Temporales)
-Index('idx_medicion_sensor', Medicion.sensor_id)
+# Compuesto (sensor, fecha DESC): "últimas N lecturas del sensor X" (ver 30-particionado-medicion.sql)
+Index('idx_medicion_sensor_fecha', Medicion.sensor_id, Medicion.fecha_hora.desc())
 # Índice descendente para optimizar "Dame la última temperatura"
 Index('idx_medicion_fecha', Medicion.fecha_hora.desc())
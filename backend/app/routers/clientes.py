@@ -1,21 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import crud, models, schemas, auth
-from ..database import SessionLocal
+from ..database import get_db
+from ..crud.paginacion import CABECERA_CURSOR
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Gestión de Clientes"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/clientes/", response_model=schemas.Cliente, status_code=status.HTTP_201_CREATED, summary="Crear Cliente")
 def crear_cliente(
     cliente: schemas.ClienteCreate, 
@@ -43,14 +37,22 @@ def crear_cliente(
 
 @router.get("/clientes/", response_model=List[schemas.Cliente], summary="Listar Clientes")
 def listar_clientes(
+    response: Response,
     skip: int = 0, 
-    limit: int = 1000, 
+    limit: int = Query(1000, ge=1, le=1000), 
     q: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.Cliente = Depends(auth.require_admin)
 ):
-    """Lista todos los clientes registrados. Solo para administradores."""
-    return crud.get_clientes(db, skip=skip, limit=limit, q=q)
+    """
+    Lista todos los clientes registrados. Solo para administradores.
+    Si hay más páginas, la cabecera X-Next-Cursor trae el 'cursor' para pedir la siguiente.
+    """
+    clientes, siguiente = crud.get_clientes(db, skip=skip, limit=limit, q=q, cursor=cursor)
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
+    return clientes
 
 @router.get("/clientes/{cliente_id}", response_model=schemas.Cliente, summary="Obtener Cliente Individual")
 def obtener_cliente(
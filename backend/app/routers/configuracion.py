@@ -1,25 +1,13 @@
-import os
-import json
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
 from sqlalchemy.orm import Session
 from .. import auth, schemas, models, database
+from ..crud import crud_jornadas
 
 router = APIRouter(
     prefix="/api/v1/config",
     tags=["Configuración IoT"],
 )
 
-CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config_clientes")
-
-def get_invernadero_config_path(invernadero_id: int):
-    """Devuelve la ruta al fichero JSON del invernadero."""
-    return os.path.join(CONFIG_DIR, f"jornada_inv_{invernadero_id}.json")
-
-def get_cliente_config_path(cliente_id: int):
-    """Devuelve la ruta al fichero JSON de configuración global del cliente."""
-    return os.path.join(CONFIG_DIR, f"jornada_cliente_{cliente_id}.json")
-
 def verificar_propiedad_invernadero(invernadero_id: int, current_user: models.Cliente, db: Session):
     """Verifica si el invernadero pertenece al usuario actual."""
     if current_user.rol in ["root", "admin"]:
@@ -46,15 +34,13 @@ def obtener_jornada(
     """Obtiene la configuración de jornada de un invernadero."""
     verificar_propiedad_invernadero(invernadero_id, current_user, db)
 
-    path = get_invernadero_config_path(invernadero_id)
-    if not os.path.exists(path):
+    fila = crud_jornadas.get_jornada_invernadero(db, invernadero_id)
+    if not fila:
         # Devolver una estructura vacía con es_laborable=True por defecto
         return schemas.ConfigJornada(default=[], es_laborable=True)
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return schemas.ConfigJornada(**data)
+        return crud_jornadas.fila_a_config(fila)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -71,18 +57,11 @@ def guardar_jornada(
     """Guarda la configuración de jornada de un invernadero."""
     verificar_propiedad_invernadero(invernadero_id, current_user, db)
 
-    # Asegurar que el directorio existe
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR)
-
-    path = get_invernadero_config_path(invernadero_id)
-    
     try:
-        data_to_save = config.model_dump(by_alias=True, exclude_none=False)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data_to_save, f, indent=2, ensure_ascii=False)
+        crud_jornadas.guardar_jornada_invernadero(db, invernadero_id, config)
         return {"mensaje": "Configuración guardada correctamente"}
     except Exception as e:
+        db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error al guardar la configuración: {str(e)}"
@@ -98,14 +77,12 @@ def obtener_jornada_cliente(
     if current_user.rol not in ["root", "admin"] and current_user.cliente_id != cliente_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    path = get_cliente_config_path(cliente_id)
-    if not os.path.exists(path):
+    fila = crud_jornadas.get_jornada_cliente(db, cliente_id)
+    if not fila:
         return schemas.ConfigJornada(default=[], es_laborable=True, heredar_de_global=False)
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return schemas.ConfigJornada(**data)
+        return crud_jornadas.fila_a_config(fila)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al leer la configuración global: {str(e)}")
 
@@ -120,39 +97,14 @@ def guardar_jornada_cliente(
     if current_user.rol not in ["root", "admin"] and current_user.cliente_id != cliente_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR)
-
-    path = get_cliente_config_path(cliente_id)
     try:
-        data_to_save = config.model_dump(by_alias=True, exclude_none=False)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data_to_save, f, indent=2, ensure_ascii=False)
-        
         # --- SINCRONIZACIÓN MASIVA ---
         # Al guardar el maestro, todas las naves del cliente se ponen en modo 'heredar'
-        invernaderos = db.query(models.Invernadero).join(models.Parcela).filter(
-            models.Parcela.cliente_id == cliente_id
-        ).all()
-
-        for inv in invernaderos:
-            inv_path = get_invernadero_config_path(inv.invernadero_id)
-            inv_config = {"default": [], "es_laborable": True} # Default inicial
-            
-            if os.path.exists(inv_path):
-                try:
-                    with open(inv_path, "r") as f:
-                        inv_config = json.load(f)
-                except:
-                    pass
-            
-            inv_config["heredar_de_global"] = True
-            
-            with open(inv_path, "w") as f:
-                json.dump(inv_config, f, indent=2, ensure_ascii=False)
-
+        # (una única sentencia, sin recorrer las naves una a una)
+        crud_jornadas.guardar_jornada_cliente(db, cliente_id, config)
         return {"mensaje": "Configuración global guardada y sincronizada con todas las naves"}
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al guardar y sincronizar: {str(e)}")
 
 @router.get("/jornada/cliente/{cliente_id}/resumen")
@@ -165,37 +117,7 @@ def obtener_resumen_jornadas_cliente(
     if current_user.rol not in ["root", "admin"] and current_user.cliente_id != cliente_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    # Obtener todos los invernaderos del cliente
-    invernaderos = db.query(models.Invernadero).join(models.Parcela).filter(
-        models.Parcela.cliente_id == cliente_id
-    ).all()
-
-    resumen = []
-    for inv in invernaderos:
-        path = get_invernadero_config_path(inv.invernadero_id)
-        configurado = os.path.exists(path)
-        es_laborable = True
-        heredar_de_global = False
-        
-        if configurado:
-            try:
-                with open(path, "r") as f:
-                    data = json.load(f)
-                    es_laborable = data.get("es_laborable", True)
-                    heredar_de_global = data.get("heredar_de_global", False)
-            except:
-                pass
-        
-        resumen.append({
-            "invernadero_id": inv.invernadero_id,
-            "nombre": inv.nombre,
-            "parcela_nombre": inv.parcela.nombre or inv.parcela.ref_catastral,
-            "configurado": configurado,
-            "es_laborable": es_laborable,
-            "heredar_de_global": heredar_de_global
-        })
-
-    return resumen
+    return crud_jornadas.get_resumen_jornadas_cliente(db, cliente_id)
 
 @router.delete("/jornada/cliente/{cliente_id}/reset", status_code=status.HTTP_200_OK)
 def resetear_jornada_cliente(
@@ -205,28 +127,13 @@ def resetear_jornada_cliente(
 ):
     """
     Elimina TODA la configuración de jornada de un cliente.
-    1. Borra el JSON maestro del cliente.
-    2. Borra los JSON individuales de todas sus naves.
+    1. Borra la jornada maestra del cliente.
+    2. Borra la jornada individual de todas sus naves.
     """
     if current_user.rol not in ["root", "admin"] and current_user.cliente_id != cliente_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    # 1. Borrar configuración maestra
-    path_maestro = get_cliente_config_path(cliente_id)
-    if os.path.exists(path_maestro):
-        os.remove(path_maestro)
-
-    # 2. Borrar configuraciones de naves
-    invernaderos = db.query(models.Invernadero).join(models.Parcela).filter(
-        models.Parcela.cliente_id == cliente_id
-    ).all()
-
-    borrados = 0
-    for inv in invernaderos:
-        path_inv = get_invernadero_config_path(inv.invernadero_id)
-        if os.path.exists(path_inv):
-            os.remove(path_inv)
-            borrados += 1
+    borrados = crud_jornadas.resetear_jornadas_cliente(db, cliente_id)
 
     return {
         "mensaje": "Configuración maestra e individual reseteada correctamente",
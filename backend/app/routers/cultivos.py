@@ -1,21 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import crud, models, schemas, auth
-from ..database import SessionLocal
+from ..database import get_db
+from ..crud.paginacion import CABECERA_CURSOR
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Catálogo de Cultivos"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/cultivos/", response_model=schemas.Cultivo, status_code=status.HTTP_201_CREATED, summary="Crear Cultivo")
 def crear_cultivo(
     cultivo: schemas.CultivoCreate, 
@@ -33,14 +27,21 @@ def crear_cultivo(
 
 @router.get("/cultivos/", response_model=List[schemas.Cultivo], summary="Listar Cultivos")
 def listar_cultivos(
+    response: Response,
     skip: int = 0, 
-    limit: int = 200, 
+    limit: int = Query(200, ge=1, le=500), 
     ver_inactivos: bool = False,
     q: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Devuelve el catálogo de cultivos con sus parámetros (V11 Modular)."""
-    results = crud.get_cultivos(db, skip=skip, limit=limit, ver_inactivos=ver_inactivos, q=q)
+    """
+    Devuelve el catálogo de cultivos con sus parámetros (V11 Modular).
+    Si hay más páginas, la cabecera X-Next-Cursor trae el 'cursor' para pedir la siguiente.
+    """
+    results, siguiente = crud.get_cultivos(db, skip=skip, limit=limit, ver_inactivos=ver_inactivos, q=q, cursor=cursor)
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
     
     cultivos = []
     for c_model, nombre_cli in results:
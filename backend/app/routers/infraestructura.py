@@ -1,21 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, models, schemas, auth
-from ..database import SessionLocal
+from ..database import get_db
+from ..logic.versiones import versiones, no_modificado
+from ..logic.cache_jerarquia import cache_jerarquia
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Infraestructura (Parcelas e Invernaderos)"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # --- 1. PARCELAS ---
 
 @router.post("/parcelas/", response_model=schemas.Parcela, status_code=status.HTTP_201_CREATED, summary="Crear Parcela")
@@ -121,6 +116,7 @@ def borrar_invernadero(invernadero_id: int, db: Session = Depends(get_db)):
 def obtener_jerarquia(
     cliente_id: int = None,
     ver_ocultos: bool = False,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: models.Cliente = Depends(auth.get_current_user)
 ):
@@ -142,12 +138,23 @@ def obtener_jerarquia(
         target_id = cliente_id
         nombre_mostrar = target_cliente.nombre_empresa
 
-    # Llamada al nuevo motor CRUD (Fase 1)
-    localidades_jerarquia = crud.get_jerarquia_datos(db, target_id, activa_only=not ver_ocultos)
-
-    return schemas.JerarquiaCliente(
-        cliente_id=target_id,
-        nombre_empresa=nombre_mostrar,
-        num_localidades=len(localidades_jerarquia),
-        localidades=localidades_jerarquia
-    )
+    # GET condicional (tras los permisos): 304 sin montar el árbol si no ha cambiado nada
+    etag = versiones.etag_cliente(target_id, ver_ocultos)
+    if no_modificado(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    # Árbol ya serializado en caché (invalidado por las escrituras de crud_infraestructura)
+    contenido = cache_jerarquia.obtener(target_id, ver_ocultos)
+    if contenido is None:
+        generacion = cache_jerarquia.generacion(target_id)
+        # Llamada al nuevo motor CRUD (Fase 1)
+        localidades_jerarquia = crud.get_jerarquia_datos(db, target_id, activa_only=not ver_ocultos)
+        contenido = schemas.JerarquiaCliente(
+            cliente_id=target_id,
+            nombre_empresa=nombre_mostrar,
+            num_localidades=len(localidades_jerarquia),
+            localidades=localidades_jerarquia
+        ).model_dump_json().encode()
+        cache_jerarquia.guardar(target_id, ver_ocultos, contenido, generacion)
+
+    return Response(content=contenido, media_type="application/json", headers={"ETag": etag})
@@ -19,6 +19,7 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import Cliente
 from .. import schemas, auth, crud
+from ..logic.sesiones import sesiones
 
 router = APIRouter(prefix="/api/auth", tags=["Autenticación"])
 
@@ -74,6 +75,7 @@ def login_for_access_token(
     new_sid = str(uuid.uuid4())
     user.session_id = new_sid
     db.commit()
+    sesiones.invalidar(user.cif) # El token anterior deja de valer también en la caché
 
     # Generar el Token JWT con el payload necesario para el Frontend e incluyeno el SID
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -113,4 +115,5 @@ def logout(
     """
     current_user.session_id = None
     db.commit()
+    sesiones.invalidar(current_user.cif)
     return {"message": "Sesión cerrada correctamente"}
\ No newline at end of file
@@ -1,22 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import crud, schemas
-from ..database import SessionLocal
+from ..database import get_db
+from ..crud.paginacion import CABECERA_CURSOR
 from ..utils import geo_logic  # Importamos nuestra nueva utilidad
+from ..logic.indice_geo import indice_geo, plegar
 
 router = APIRouter(
     prefix="/api/v1",
     tags=["Geografía y Localidades"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/localidades/", response_model=schemas.Localidad, status_code=status.HTTP_201_CREATED, summary="Crear Localidad")
 def crear_localidad(localidad: schemas.LocalidadCreate, db: Session = Depends(get_db)):
     db_localidad = crud.get_localidad(db, codigo_postal=localidad.codigo_postal)
@@ -45,19 +40,27 @@ def actualizar_localidad(
 
 @router.get("/localidades/", response_model=List[schemas.Localidad], summary="Listar Localidades")
 def listar_localidades(
+    response: Response,
     skip: int = 0, 
-    limit: int = 1000, 
+    limit: int = Query(1000, ge=1, le=1000), 
     q: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Lista municipios con soporte para búsqueda (ilike + unaccent)."""
-    return crud.get_localidades(db, skip=skip, limit=limit, q=q)
+    """
+    Lista municipios con soporte para búsqueda (ilike + unaccent).
+    Si hay más páginas, la cabecera X-Next-Cursor trae el 'cursor' para pedir la siguiente.
+    """
+    localidades, siguiente = crud.get_localidades(db, skip=skip, limit=limit, q=q, cursor=cursor)
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
+    return localidades
 
-@router.get("/geo/check-cp/{cp}", summary="Validar CP (Local + Externo)")
+@router.get("/geo/check-cp/{cp}", summary="Validar CP (Local + Índice + Externo)")
 def validar_cp_inteligente(cp: str, db: Session = Depends(get_db)):
     """
-    Busca un CP en BBDD local. Si no está, consulta la API de Zippopotam.
-    Utiliza la utilidad modular geo_logic.
+    Busca un CP en BBDD local y, si no está, en el índice geográfico en memoria.
+    Solo con SIRA_GEO_EXTERNO=1 se consulta además la API de Zippopotam.
     """
     if len(cp) != 5 or not cp.isdigit():
         raise HTTPException(status_code=400, detail="CP inválido.")
@@ -72,8 +75,13 @@ def validar_cp_inteligente(cp: str, db: Session = Depends(get_db)):
             "origen": "local"
         }
 
-    # 2. Búsqueda externa (Delegada a utilidad)
-    externo = geo_logic.consultar_zippopotam(cp)
+    # 2. Índice local de CPs (sin red)
+    indexado = indice_geo.buscar_cp(cp)
+    if indexado:
+        return indexado
+
+    # 3. Búsqueda externa (Delegada a utilidad), solo si está activada
+    externo = geo_logic.consultar_zippopotam(cp) if geo_logic.EXTERNO_ACTIVO else None
     if externo:
         return externo
 
@@ -82,14 +90,14 @@ def validar_cp_inteligente(cp: str, db: Session = Depends(get_db)):
 @router.get("/geo/search-municipio/{nombre}", summary="Buscar CPs por Municipio (Híbrido)")
 def buscar_municipio_inteligente(nombre: str, db: Session = Depends(get_db)):
     """
-    Búsqueda híbrida: busca en BBDD local y complementa con OpenStreetMap
-    para ofrecer una cobertura total de España.
+    Búsqueda híbrida: busca en BBDD local y complementa con el índice geográfico
+    en memoria (y con OpenStreetMap si SIRA_GEO_EXTERNO=1).
     """
     if len(nombre) < 3:
         raise HTTPException(status_code=400, detail="Mínimo 3 caracteres.")
 
     # 1. Resultados locales
-    db_locs = crud.get_localidades(db, q=nombre, limit=10)
+    db_locs, _ = crud.get_localidades(db, q=nombre, limit=10)
     resultados = [
         {
             "codigo_postal": loc.codigo_postal,
@@ -99,21 +107,27 @@ def buscar_municipio_inteligente(nombre: str, db: Session = Depends(get_db)):
         } for loc in db_locs
     ]
 
-    # 2. Si no hay suficientes locales, buscamos fuera (ampliamos a 20 resultados externos)
-    if len(resultados) < 10:
+    # 2. Completamos con el índice local de municipios (prefijo sin tildes, sin red)
+    cps_vistos = {r["codigo_postal"] for r in resultados}
+    for indexado in indice_geo.buscar_municipio(nombre, limite=20):
+        if indexado["codigo_postal"] not in cps_vistos:
+            cps_vistos.add(indexado["codigo_postal"])
+            resultados.append(indexado)
+
+    # 3. Si aún no hay suficientes, buscamos fuera (solo si está activado)
+    if len(resultados) < 10 and geo_logic.EXTERNO_ACTIVO:
         externos = geo_logic.consultar_municipio_externo(nombre)
-        cps_locales = {r["codigo_postal"] for r in resultados}
         for ext in externos:
-            if ext["codigo_postal"] not in cps_locales:
+            if ext["codigo_postal"] not in cps_vistos:
                 resultados.append(ext)
 
     if not resultados:
         raise HTTPException(status_code=404, detail="No se encontraron coincidencias en toda España.")
 
-    # 3. Ordenación inteligente: Priorizar los que EMPIEZAN por el nombre buscado
-    nombre_buscado = nombre.lower()
+    # 4. Ordenación inteligente: Priorizar los que EMPIEZAN por el nombre buscado
+    nombre_buscado = plegar(nombre)
     resultados.sort(key=lambda x: (
-        0 if x["municipio"].lower().startswith(nombre_buscado) else 1,
+        0 if plegar(x["municipio"]).startswith(nombre_buscado) else 1,
         x["municipio"]
     ))
 
@@ -2,6 +2,10 @@ import os
 import json
 from fastapi import APIRouter, Depends, HTTPException, status
 from .. import auth, schemas, models
+from ..database import resumen_pools
+from ..logic.cache_jerarquia import cache_jerarquia
+from ..logic.cache_geo import cache_geo
+from ..logic.planificador_control import metricas as metricas_control
 
 router = APIRouter(
     prefix="/api/v1/sistema",
@@ -59,3 +63,23 @@ def guardar_social(
             status_code=500,
             detail=f"Error al guardar la configuración: {str(e)}"
         )
+
+@router.get("/control/metricas")
+def obtener_metricas_control(current_user: models.Cliente = Depends(auth.require_admin)):
+    """Estado y latencias del planificador del cerebro de control (ticks, solapes, p50/p95/p99)."""
+    return metricas_control.resumen()
+
+@router.get("/db/pool")
+def obtener_estado_pool(current_user: models.Cliente = Depends(auth.require_admin)):
+    """Uso del pool de conexiones de ESTE proceso (en uso, overflow, esperas p50/p95/p99) para dimensionarlo."""
+    return resumen_pools()
+
+@router.get("/cache/jerarquia")
+def obtener_metricas_cache_jerarquia(current_user: models.Cliente = Depends(auth.require_admin)):
+    """Aciertos/fallos, invalidaciones y expulsiones LRU de la caché de jerarquías de ESTE proceso."""
+    return cache_jerarquia.resumen()
+
+@router.get("/cache/geo")
+def obtener_metricas_cache_geo(current_user: models.Cliente = Depends(auth.require_admin)):
+    """Aciertos (memoria / GEO_CACHE), consultas externas, negativas y coalescidas de la caché geográfica de ESTE proceso."""
+    return cache_geo.resumen()
@@ -1,15 +1,21 @@
 import os
 import json
+import asyncio
 import random
 import re
-from datetime import time as dt_time, timedelta, datetime
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel as PydanticBaseModel
+from datetime import time as dt_time, timedelta, datetime, timezone
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from typing import Any, List, Optional
+from pydantic import BaseModel as PydanticBaseModel, ValidationError
 from .. import crud, models, schemas
-from ..database import get_db
+from ..database import get_db, get_async_db, SesionAsync, SessionLocal
 from ..logic import control_brain
+from ..logic.catalogo_tipos import catalogo
+from ..logic.eventos import bus
+from ..logic.versiones import versiones, no_modificado
 
 router = APIRouter(
     prefix="/api/v1/iot",
@@ -22,28 +28,131 @@ def listar_sensores_invernadero(invernadero_id: int, db: Session = Depends(get_d
     return db.query(models.Sensor).filter(models.Sensor.invernadero_id == invernadero_id).all()
 
 # --- MEDICIONES ---
+# Rutas calientes (polling del dashboard e ingesta): 'async def' sobre SesionAsync, así la
+# BBDD nunca bloquea el event loop (asyncpg con SIRA_DB_ASYNC=1, threadpool si no).
 @router.get("/mediciones/sensor/{sensor_id}", response_model=List[schemas.Medicion])
-def listar_mediciones_sensor(sensor_id: int, limit: int = 20, db: Session = Depends(get_db)):
-    return db.query(models.Medicion)\
-             .filter(models.Medicion.sensor_id == sensor_id)\
-             .order_by(models.Medicion.fecha_hora.desc())\
-             .limit(limit).all()
+async def listar_mediciones_sensor(sensor_id: int, response: Response, limit: int = Query(20, ge=1, le=1000),
+                                   desde: Optional[datetime] = None, cursor: Optional[str] = None,
+                                   db: SesionAsync = Depends(get_async_db)):
+    """Más recientes primero. La cabecera X-Next-Cursor trae el 'cursor' para seguir hacia atrás."""
+    from ..crud import crud_operaciones
+    from ..crud.paginacion import CABECERA_CURSOR
+    mediciones, siguiente = await db.run_sync(crud_operaciones.get_mediciones_sensor, sensor_id,
+                                              limit=limit, desde=desde, cursor=cursor)
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
+    return mediciones
+
+INTERVALO_LECTURA_S = 10 # Cadencia nominal de los sensores (ESP32 / simulador)
+MAX_PUNTOS_SERIE = 5000
+
+def elegir_resolucion(rango: timedelta, puntos: int) -> str:
+    """
+    Resolución más fina cuyo número de puntos en 'rango' no supera 'puntos'.
+    Si ni la agregación horaria cabe, se usa igualmente '1h' (la más gruesa).
+    """
+    from ..crud.crud_operaciones import RESOLUCIONES_AGREGADO
+    candidatas = [("raw", INTERVALO_LECTURA_S)] + list(RESOLUCIONES_AGREGADO.items())
+    for nombre, segundos in candidatas:
+        if rango.total_seconds() / segundos <= puntos:
+            return nombre
+    return candidatas[-1][0]
+
+@router.get("/mediciones/sensor/{sensor_id}/serie", response_model=schemas.SerieMedicion)
+def serie_mediciones_sensor(sensor_id: int,
+                            desde: Optional[datetime] = None,
+                            hasta: Optional[datetime] = None,
+                            resolucion: str = "auto",
+                            puntos: int = Query(300, ge=10, le=MAX_PUNTOS_SERIE),
+                            db: Session = Depends(get_db)):
+    """
+    Serie histórica de un sensor para las gráficas del dashboard.
+    Por defecto las últimas 24 h. Con resolucion='auto' se elige la tabla de agregados
+    (1m / 15m / 1h) que deja la serie por debajo de 'puntos'; en rangos cortos se sirven
+    las mediciones crudas ('raw').
+    """
+    from ..crud import crud_operaciones
+    hasta = hasta or datetime.now(timezone.utc)
+    desde = desde or hasta - timedelta(hours=24)
+    # Fechas sin zona horaria -> UTC (igual que las guarda PostgreSQL)
+    hasta = hasta if hasta.tzinfo else hasta.replace(tzinfo=timezone.utc)
+    desde = desde if desde.tzinfo else desde.replace(tzinfo=timezone.utc)
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="'desde' debe ser anterior a 'hasta'.")
+
+    if resolucion == "auto":
+        resolucion = elegir_resolucion(hasta - desde, puntos)
+    elif resolucion != "raw" and resolucion not in crud_operaciones.RESOLUCIONES_AGREGADO:
+        raise HTTPException(status_code=400, detail="Resolución no válida. Usa auto, raw, 1m, 15m o 1h.")
+
+    if resolucion == "raw":
+        serie = [
+            {"fecha_hora": m.fecha_hora, "valor": m.valor, "minimo": m.valor, "maximo": m.valor, "cuenta": 1}
+            for m in crud_operaciones.get_serie_cruda(db, sensor_id, desde, hasta, limit=MAX_PUNTOS_SERIE)
+        ]
+    else:
+        resolucion_s = crud_operaciones.RESOLUCIONES_AGREGADO[resolucion]
+        if (hasta - desde).total_seconds() / resolucion_s > MAX_PUNTOS_SERIE:
+            raise HTTPException(status_code=400, detail=f"Rango demasiado amplio para '{resolucion}' (máximo {MAX_PUNTOS_SERIE} puntos).")
+        serie = [
+            {"fecha_hora": a.bucket, "valor": round(a.suma / a.cuenta, 2), "minimo": a.minimo, "maximo": a.maximo, "cuenta": a.cuenta}
+            for a in crud_operaciones.get_serie_agregada(db, sensor_id, resolucion_s, desde, hasta)
+        ]
+
+    return {"sensor_id": sensor_id, "resolucion": resolucion, "desde": desde, "hasta": hasta, "puntos": serie}
 
 @router.post("/mediciones/", response_model=schemas.Medicion, status_code=status.HTTP_201_CREATED)
-def crear_medicion(medicion: schemas.MedicionCreate, db: Session = Depends(get_db)):
+async def crear_medicion(medicion: schemas.MedicionCreate, db: SesionAsync = Depends(get_async_db)):
     from ..crud import crud_operaciones
-    return crud_operaciones.create_medicion(db=db, medicion=medicion)
+    return await db.run_sync(crud_operaciones.create_medicion, medicion=medicion)
+
+MAX_LOTE_MEDICIONES = 5000
+
+@router.post("/mediciones/batch", response_model=schemas.MedicionLoteResultado, status_code=status.HTTP_200_OK)
+async def crear_mediciones_lote(lecturas: List[Any] = Body(...), db: SesionAsync = Depends(get_async_db)):
+    """
+    Ingesta masiva de telemetría (varios sensores / invernaderos en una sola petición).
+    Cada lectura se valida de forma independiente: las erróneas se devuelven en 'rechazos'
+    y el resto se guarda con un único INSERT multi-fila en una sola transacción.
+    """
+    from ..crud import crud_operaciones
+    if len(lecturas) > MAX_LOTE_MEDICIONES:
+        raise HTTPException(status_code=413, detail=f"Lote demasiado grande. Máximo {MAX_LOTE_MEDICIONES} lecturas por petición.")
+
+    validas = []
+    rechazos = []
+    for indice, bruto in enumerate(lecturas):
+        try:
+            validas.append((indice, schemas.MedicionCreate.model_validate(bruto)))
+        except ValidationError as e:
+            sensor_id = bruto.get("sensor_id") if isinstance(bruto, dict) else None
+            rechazos.append({
+                "indice": indice,
+                "sensor_id": sensor_id if isinstance(sensor_id, int) else None,
+                "motivo": "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            })
+
+    rechazos.extend(await db.run_sync(crud_operaciones.create_mediciones_lote, validas))
+    rechazos.sort(key=lambda r: r["indice"])
+
+    return {
+        "recibidas": len(lecturas),
+        "aceptadas": len(lecturas) - len(rechazos),
+        "rechazadas": len(rechazos),
+        "rechazos": rechazos
+    }
 
 # --- [ NUEVOS ENDPOINTS DE SIMULACIÓN Y CONTROL ] ---
 
-def map_sensor_type(nombre_tipo: str) -> str:
-    nombre = nombre_tipo.lower()
-    if 'temp' in nombre: return 'temperatura'
-    if 'luz' in nombre or 'rad' in nombre or 'sol' in nombre: return 'luz'
-    if 'suelo' in nombre: return 'humedad_suelo'
-    if 'vient' in nombre or 'aire' in nombre: return 'viento'
-    if 'lluv' in nombre or 'agua' in nombre: return 'lluvia'
-    return 'temperatura' # fallback
+# Se mantiene el nombre en este módulo por compatibilidad (la lógica vive en el cerebro)
+map_sensor_type = control_brain.map_sensor_type
+
+def listar_sensores_con_tipo(db: Session, invernadero_id: int):
+    """Sensores del invernadero con su TipoSensor y su última lectura ya cargados (una sola consulta)."""
+    return db.query(models.Sensor).options(
+        joinedload(models.Sensor.tipo_sensor),
+        joinedload(models.Sensor.ultima_lectura)
+    ).filter(models.Sensor.invernadero_id == invernadero_id).all()
 
 def get_ubicacion_invernadero(inv) -> dict:
     """Devuelve la ubicación real del invernadero desde la DB (parcela → localidad)."""
@@ -102,18 +211,21 @@ def simular_escenario(invernadero_id: int, escenario: str, db: Session = Depends
     # 2. Inyectar mediciones en BBDD
     from ..crud import crud_operaciones
     lecturas_invernadero = {}
+    lote = []
     
     for sensor in sensores:
-        tipo_str = db.query(models.TipoSensor).filter(models.TipoSensor.tipo_sensor_id == sensor.tipo_sensor_id).first().nombre_tipo
-        clave_preset = map_sensor_type(tipo_str)
+        clave_preset = catalogo.clave_sensor(db, sensor.tipo_sensor_id)
         # Añadir algo de ruido para realismo
         valor_base = lecturas_preset.get(clave_preset, 20.0)
         ruido = random.uniform(-0.5, 0.5)
         valor_final = round(valor_base + ruido, 2)
         
-        crud_operaciones.create_medicion(db, schemas.MedicionCreate(sensor_id=sensor.sensor_id, valor=valor_final))
+        lote.append((len(lote), schemas.MedicionCreate(sensor_id=sensor.sensor_id, valor=valor_final)))
         lecturas_invernadero[clave_preset] = valor_final
 
+    # Todas las lecturas del preset en un único INSERT multi-fila
+    crud_operaciones.create_mediciones_lote(db, lote)
+
     # 3. Parsear hora virtual y ALEATORIZARLA (v8.2)
     momento_str = preset.get("momento", "")
     hora_virtual = None
@@ -132,7 +244,7 @@ def simular_escenario(invernadero_id: int, escenario: str, db: Session = Depends
     ubicacion = get_ubicacion_invernadero(inv)
 
     cliente_id = inv.parcela.cliente_id if inv.parcela else 1
-    info_jornada = control_brain.esta_en_jornada_laboral(cliente_id, hora_test=hora_virtual)
+    info_jornada = control_brain.esta_en_jornada_laboral(cliente_id, hora_test=hora_virtual, invernadero_id=invernadero_id)
 
     # 4. Ejecutar el Control Brain
     resultado_control = control_brain.ejecutar_ciclo_control(db, invernadero_id, lecturas_invernadero, info_jornada)
@@ -167,28 +279,81 @@ def simular_escenario(invernadero_id: int, escenario: str, db: Session = Depends
     }
 
 @router.get("/estado/{invernadero_id}")
-def obtener_estado_iot(invernadero_id: int, hora_virtual: str = None, escenario: str = None, ubicacion: str = None, tz: str = None, db: Session = Depends(get_db)):
+async def obtener_estado_iot(invernadero_id: int, response: Response, hora_virtual: str = None, escenario: str = None, ubicacion: str = None, tz: str = None,
+                             if_none_match: Optional[str] = Header(None), db: SesionAsync = Depends(get_async_db)):
     """Devuelve el estado actual de los sensores y actuadores de un invernadero."""
+    # GET condicional: si nada ha cambiado desde el último refresco, 304 sin tocar la BBDD
+    etag = versiones.etag_invernadero(invernadero_id, hora_virtual, escenario, ubicacion, tz)
+    if no_modificado(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return await db.run_sync(construir_estado_iot, invernadero_id, hora_virtual, escenario, ubicacion, tz)
+
+SSE_KEEPALIVE_S = 15 # Comentario periódico para que proxies y navegador no cierren la conexión
+
+def calcular_estado_stream(invernadero_id: int) -> dict:
+    """Estado para los streams (sin parámetros de simulación), con su propia sesión."""
+    with SessionLocal() as db:
+        return construir_estado_iot(db, invernadero_id)
+
+@router.get("/estado/{invernadero_id}/stream")
+async def stream_estado_iot(invernadero_id: int, request: Request):
+    """
+    Estado en vivo por Server-Sent Events: un evento 'snapshot' con el estado completo al conectar
+    y eventos 'delta' con solo lo que cambia cuando llegan mediciones o acciones (logic/eventos.py).
+    """
+    cola = await bus.suscribir(invernadero_id, calcular_estado_stream)
+
+    async def eventos():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    tipo, datos = await asyncio.wait_for(cola.get(), timeout=SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {tipo}\ndata: {json.dumps(jsonable_encoder(datos), ensure_ascii=False)}\n\n"
+        finally:
+            bus.desuscribir(invernadero_id, cola)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no" # Nginx: entregar cada evento al momento, sin buffer
+    })
+
+def construir_estado_iot(db: Session, invernadero_id: int, hora_virtual: str = None, escenario: str = None, ubicacion: str = None, tz: str = None):
+    """Cuerpo síncrono de GET /estado (se ejecuta fuera del event loop con SesionAsync.run_sync)."""
     
     # Nota: no hay persistencia en disco — si no vienen parámetros,
     # se usan valores por defecto (hora real, sin ubicación de simulación).
 
-    inv = db.query(models.Invernadero).filter(models.Invernadero.invernadero_id == invernadero_id).first()
+    # Número de consultas FIJO (no depende de cuántos sensores/actuadores haya):
+    # invernadero (+parcela, cultivo), sensores (+tipo, +última lectura), actuadores (+tipo),
+    # últimas acciones (DISTINCT ON) y parámetros.
+    inv = db.query(models.Invernadero).options(
+        joinedload(models.Invernadero.parcela),
+        joinedload(models.Invernadero.cultivo)
+    ).filter(models.Invernadero.invernadero_id == invernadero_id).first()
     if not inv:
          raise HTTPException(status_code=404, detail="Invernadero no encontrado")
          
-    sensores = db.query(models.Sensor).filter(models.Sensor.invernadero_id == invernadero_id).all()
+    sensores = listar_sensores_con_tipo(db, invernadero_id)
     
     # Auto-Aprovisionamiento en Vista: Si está plantado, asumimos "Sensórica Activa"
     if not sensores and inv.cultivo_id is not None:
          control_brain.provisionar_iot_defecto(db, invernadero_id)
-         sensores = db.query(models.Sensor).filter(models.Sensor.invernadero_id == invernadero_id).all()
+         sensores = listar_sensores_con_tipo(db, invernadero_id)
          
-    actuadores = db.query(models.Actuador).filter(models.Actuador.invernadero_id == invernadero_id).all()
+    actuadores = db.query(models.Actuador).options(joinedload(models.Actuador.tipo_actuador))\
+                   .filter(models.Actuador.invernadero_id == invernadero_id).all()
+
+    from ..crud import crud_operaciones
+    ultimas_acciones = crud_operaciones.get_ultimas_acciones(db, [a.actuador_id for a in actuadores])
+    versiones.registrar_dispositivos(invernadero_id, [s.sensor_id for s in sensores], [a.actuador_id for a in actuadores])
     
     res_sensores = []
     for s in sensores:
-        ultima_med = db.query(models.Medicion).filter(models.Medicion.sensor_id == s.sensor_id).order_by(models.Medicion.fecha_hora.desc()).first()
+        ultima_med = s.ultima_lectura
         res_sensores.append({
             "sensor_id": s.sensor_id,
             "ubicacion": s.ubicacion_sensor,
@@ -197,10 +362,9 @@ def obtener_estado_iot(invernadero_id: int, hora_virtual: str = None, escenario:
             "valor": ultima_med.valor if ultima_med else None
         })
 
-    from ..crud import crud_operaciones
     res_actuadores = []
     for a in actuadores:
-        en_cortesia = control_brain.evaluar_estado_cortesia(db, a.actuador_id)
+        en_cortesia = control_brain.accion_en_cortesia(ultimas_acciones.get(a.actuador_id))
         res_actuadores.append({
             "actuador_id": a.actuador_id,
             "ubicacion": a.ubicacion_actuador,
@@ -210,8 +374,7 @@ def obtener_estado_iot(invernadero_id: int, hora_virtual: str = None, escenario:
         })
         
     # Verificar si está en jornada laboral (con soporte para hora virtual)
-    inv = db.query(models.Invernadero).filter(models.Invernadero.invernadero_id == invernadero_id).first()
-    cliente_id = inv.parcela.cliente_id if inv else 1
+    cliente_id = inv.parcela.cliente_id if inv.parcela else 1
     
     hora_v = None
     if hora_virtual:
@@ -223,7 +386,7 @@ def obtener_estado_iot(invernadero_id: int, hora_virtual: str = None, escenario:
         except:
             pass
 
-    info_jornada = control_brain.esta_en_jornada_laboral(cliente_id, hora_test=hora_v)
+    info_jornada = control_brain.esta_en_jornada_laboral(cliente_id, hora_test=hora_v, invernadero_id=invernadero_id)
     en_jornada, jornada_configurada = info_jornada
 
     nombre_cultivo_str = inv.cultivo.nombre_cultivo if inv and inv.cultivo else "Barbecho (Sin Plantar)"
@@ -283,35 +446,31 @@ def control_manual(override: OverrideRequest, db: Session = Depends(get_db)):
     is_reverting_to_auto = override.nuevo_estado.upper() == "AUTO"
     detalle = "AUTO: RESTABLECER CORTESÍA O SIMULADOR" if is_reverting_to_auto else f"{prefix}: {override.nuevo_estado}"
     
-    # 1. Registrar la acción en el LOG (Crítico para que el Brain sepa si tiene permiso)
-    accion = crud_operaciones.create_accion(db, schemas.AccionActuadorCreate(
-        actuador_id=override.actuador_id,
-        accion_detalle=detalle
-    ))
-
-    # 2. Si el usuario pide un estado específico (ON/OFF/%), actualizamos YA.
+    # 1. Si el usuario pide un estado específico (ON/OFF/%), actualizamos YA.
+    # Estado + registro en el LOG (Crítico para que el Brain sepa si tiene permiso) en una transacción.
     if not is_reverting_to_auto:
-         crud_operaciones.update_estado_actuador(db, override.actuador_id, override.nuevo_estado)
+        crud_operaciones.aplicar_decisiones(db, [(override.actuador_id, override.nuevo_estado, detalle)])
     else:
+        # 2. Registrar la vuelta a AUTO en el LOG antes de consultar al Brain
+        crud_operaciones.create_accion(db, schemas.AccionActuadorCreate(
+            actuador_id=override.actuador_id,
+            accion_detalle=detalle
+        ))
+
         # 3. Si el usuario pide VOLVER A AUTO, forzamos una ejecución del Brain para este actuador.
         # Así el cambio de estado es instantáneo y no hay que esperar a otro ciclo.
         act = db.query(models.Actuador).filter(models.Actuador.actuador_id == override.actuador_id).first()
         if act:
             inv_id = act.invernadero_id
-            # Recuperar últimas lecturas de sensores
-            sensores = db.query(models.Sensor).filter(models.Sensor.invernadero_id == inv_id).all()
-            lecturas = {}
-            for s in sensores:
-                ult = db.query(models.Medicion).filter(models.Medicion.sensor_id == s.sensor_id).order_by(models.Medicion.fecha_hora.desc()).first()
-                if ult:
-                    lecturas[map_sensor_type(s.tipo_sensor.nombre_tipo)] = float(ult.valor)
+            # Recuperar últimas lecturas de sensores (SENSOR_ULTIMA_LECTURA, sin recorrer el histórico)
+            lecturas = control_brain.obtener_lecturas_actuales(db, inv_id)
             
             # El contexto de hora virtual no se persiste en disco.
             # Se usa la hora real del sistema para recalcular jornada.
             hora_v = None
 
             cliente_id = act.invernadero.parcela.cliente_id if act.invernadero and act.invernadero.parcela else 1
-            info_j = control_brain.esta_en_jornada_laboral(cliente_id, hora_test=hora_v)
+            info_j = control_brain.esta_en_jornada_laboral(cliente_id, hora_test=hora_v, invernadero_id=inv_id)
             
             # Ejecutar cerebro (Ahora sí, evaluar_estado_cortesia devolverá False gracias al log de arriba)
             decisiones = control_brain.ejecutar_ciclo_control(db, inv_id, lecturas, info_j)
@@ -297,6 +297,35 @@ class Medicion(MedicionBase):
     sensor_id: int   
     model_config = ConfigDict(from_attributes=True)
 
+class RechazoMedicion(BaseModel):
+    """Lectura descartada dentro de un lote (el resto del lote sí se guarda)."""
+    indice: int # Posición de la lectura en el array recibido
+    sensor_id: Optional[int] = None
+    motivo: str
+
+class MedicionLoteResultado(BaseModel):
+    """Resumen de la ingesta masiva de telemetría."""
+    recibidas: int
+    aceptadas: int
+    rechazadas: int
+    rechazos: List[RechazoMedicion] = []
+
+class PuntoSerie(BaseModel):
+    """Punto de una gráfica histórica (una cubeta agregada o una medición cruda)."""
+    fecha_hora: datetime # Inicio de la cubeta (o instante de la medición cruda)
+    valor: Decimal # Media de la cubeta
+    minimo: Decimal
+    maximo: Decimal
+    cuenta: int
+
+class SerieMedicion(BaseModel):
+    """Serie temporal de un sensor a la resolución elegida ('raw', '1m', '15m' o '1h')."""
+    sensor_id: int
+    resolucion: str
+    desde: datetime
+    hasta: datetime
+    puntos: List[PuntoSerie] = []
+
 class AccionActuadorBase(BaseModel):
     fecha_hora: Optional[datetime] = None
     accion_detalle: str = Field(..., max_length=100)
@@ -359,7 +388,7 @@ class JerarquiaCliente(BaseModel):
     num_localidades: int = 0
     localidades: List[LocalidadJerarquia] = []
 # =============================================================================
-# 7. CONFIGURACIÓN IOT Y JORNADA (JSON STORAGE)
+# 7. CONFIGURACIÓN IOT Y JORNADA (TABLA JORNADA_CONFIG)
 # =============================================================================
 
 class TramoHorario(BaseModel):
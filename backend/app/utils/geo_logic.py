@@ -1,6 +1,24 @@
+import os
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, List
 
+from ..logic.cache_geo import cache_geo
+from ..logic.indice_geo import plegar
+
+# Consultas a Zippopotam / Nominatim solo si se activan: por defecto manda el índice local (logic/indice_geo.py)
+EXTERNO_ACTIVO = os.getenv("SIRA_GEO_EXTERNO", "0") == "1"
+ZIPPOPOTAM_URL = os.getenv("SIRA_GEO_ZIPPOPOTAM_URL", "http://api.zippopotam.us")
+NOMINATIM_URL = os.getenv("SIRA_GEO_NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+TIMEOUT_S = 5
+
+# Sesión HTTP compartida: reutiliza las conexiones (keep-alive) en lugar de abrir una por consulta
+sesion_http = requests.Session()
+# Nominatim requiere un User-Agent descriptivo
+sesion_http.headers["User-Agent"] = "SIRA-Project/1.0 (TFG-Development)"
+sesion_http.mount("http://", HTTPAdapter(pool_maxsize=10))
+sesion_http.mount("https://", HTTPAdapter(pool_maxsize=10))
+
 # --- Mapeo de Provincias de España (Integridad Gating SIRA) ---
 MAPA_PROVINCIAS = {
     "01": "Álava", "02": "Albacete", "03": "Alicante", "04": "Almería", "05": "Ávila",
@@ -27,57 +45,64 @@ def obtener_provincia_por_cp(cp: str, backup_state: Optional[str] = None) -> str
 def consultar_zippopotam(cp: str) -> Optional[Dict]:
     """
     Consulta la API externa de Zippopotam para obtener datos geográficos de un CP.
+    Cacheada (logic/cache_geo.py); un fallo de red devuelve None sin cachearse.
     """
     try:
-        url = f"http://api.zippopotam.us/es/{cp}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if "places" in data and len(data["places"]) > 0:
-                place = data["places"][0]
-                return {
-                    "codigo_postal": cp,
-                    "municipio": place["place name"],
-                    "provincia": obtener_provincia_por_cp(cp, place["state"]),
-                    "origen": "externo"
-                }
+        return cache_geo.obtener(f"cp:{cp}", lambda: _pedir_zippopotam(cp))
     except Exception:
-        pass
+        return None
+
+def _pedir_zippopotam(cp: str) -> Optional[Dict]:
+    response = sesion_http.get(f"{ZIPPOPOTAM_URL}/es/{cp}", timeout=TIMEOUT_S)
+    if response.status_code == 404:
+        return None # CP inexistente: respuesta negativa (cacheable)
+    response.raise_for_status()
+    data = response.json()
+    if "places" in data and len(data["places"]) > 0:
+        place = data["places"][0]
+        return {
+            "codigo_postal": cp,
+            "municipio": place["place name"],
+            "provincia": obtener_provincia_por_cp(cp, place["state"]),
+            "origen": "externo"
+        }
     return None
 
 def consultar_municipio_externo(nombre: str) -> List[Dict]:
     """
     Consulta la API de Nominatim (OpenStreetMap) para buscar códigos postales 
     por nombre de municipio en España.
+    Cacheada por nombre sin tildes (logic/cache_geo.py); un fallo de red devuelve [] sin cachearse.
     """
-    resultados = []
+    nombre_clean = plegar(nombre)
     try:
-        # Nominatim requiere un User-Agent descriptivo
-        headers = {'User-Agent': 'SIRA-Project/1.0 (TFG-Development)'}
-        url = f"https://nominatim.openstreetmap.org/search?q={nombre}&countrycodes=es&format=json&addressdetails=1&limit=50"
-        
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            cps_vistos = set()
-            nombre_clean = nombre.lower()
-            
-            for place in data:
-                addr = place.get("address", {})
-                cp = addr.get("postcode")
-                municipio_real = addr.get("city") or addr.get("town") or addr.get("village") or addr.get("municipality") or ""
-                
-                # Filtro estricto: El municipio DEBE contener la palabra buscada
-                if cp and len(cp) == 5 and cp not in cps_vistos and nombre_clean in municipio_real.lower():
-                    cps_vistos.add(cp)
-                    provincia_real = addr.get("province") or addr.get("state") or ""
-                    
-                    resultados.append({
-                        "codigo_postal": cp,
-                        "municipio": municipio_real,
-                        "provincia": obtener_provincia_por_cp(cp, provincia_real),
-                        "origen": "externo_osm"
-                    })
+        return cache_geo.obtener(f"municipio:{nombre_clean}", lambda: _pedir_nominatim(nombre_clean))
     except Exception:
-        pass
+        return []
+
+def _pedir_nominatim(nombre_clean: str) -> List[Dict]:
+    response = sesion_http.get(
+        f"{NOMINATIM_URL}/search",
+        params={"q": nombre_clean, "countrycodes": "es", "format": "json", "addressdetails": 1, "limit": 50},
+        timeout=TIMEOUT_S
+    )
+    response.raise_for_status()
+    resultados = []
+    cps_vistos = set()
+    for place in response.json():
+        addr = place.get("address", {})
+        cp = addr.get("postcode")
+        municipio_real = addr.get("city") or addr.get("town") or addr.get("village") or addr.get("municipality") or ""
+
+        # Filtro estricto: El municipio DEBE contener la palabra buscada
+        if cp and len(cp) == 5 and cp not in cps_vistos and nombre_clean in plegar(municipio_real):
+            cps_vistos.add(cp)
+            provincia_real = addr.get("province") or addr.get("state") or ""
+
+            resultados.append({
+                "codigo_postal": cp,
+                "municipio": municipio_real,
+                "provincia": obtener_provincia_por_cp(cp, provincia_real),
+                "origen": "externo_osm"
+            })
     return resultados
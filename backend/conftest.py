@@ -0,0 +1,11 @@
+"""
+Configuración común de pytest para las pruebas del backend.
+
+app/database.py exige DATABASE_URL al importarse. Si no se indica ninguna, se usa una SQLite en
+memoria: las pruebas autocontenidas no abren conexiones a ella y las que necesitan PostgreSQL
+(test_estado_queries.py, test_busqueda_indices.py) se saltan solas.
+Para ejecutarlas: DATABASE_URL=postgresql://... python -m pytest
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -14,6 +14,15 @@ Versión: 4.0 (Añadido ph_ideal a PARAMETROS_OPTIMOS para Robust MVP)
 -- ACTIVACIÓN DE EXTENSIONES (PostgreSQL)
 CREATE EXTENSION IF NOT EXISTS unaccent;
 
+-- Envoltorio IMMUTABLE de unaccent(): lo usan TODOS los buscadores y el orden de localidades
+-- (app/crud/busqueda.py). Va aquí, sin depender de pg_trgm: si 40-indices-busqueda.sql no se
+-- aplica solo se pierden los índices (velocidad), no las búsquedas.
+CREATE OR REPLACE FUNCTION sira_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$;
+
 -- 1. TABLAS DE CATÁLOGO (Sin dependencias)
 create table if not exists CLIENTE (
     cliente_id serial primary key,
@@ -216,3 +225,93 @@ ALTER TABLE CLIENTE ADD COLUMN IF NOT EXISTS ultima_actividad TIMESTAMP WITH TIM
 
 -- Índice para optimizar el ordenamiento jerárquico por actividad
 CREATE INDEX IF NOT EXISTS idx_cliente_actividad ON CLIENTE(ultima_actividad DESC);
+
+-- =============================================================================
+-- V8.0 - LECTURA ACTUAL POR SENSOR (OCTUBRE 2026)
+-- =============================================================================
+-- Una fila por sensor con su último valor. La API la actualiza (UPSERT) en la misma
+-- transacción que cada MEDICION, así el estado actual no recorre el histórico.
+-- medicion_id sin FK: no impide purgar o reorganizar el histórico de MEDICION.
+create table if not exists SENSOR_ULTIMA_LECTURA (
+    sensor_id int primary key references SENSOR(sensor_id) on delete cascade,
+    medicion_id int not null,
+    fecha_hora timestamptz not null,
+    valor decimal(10,2) not null
+);
+
+-- Carga inicial para bases de datos que ya tienen histórico (idempotente)
+INSERT INTO SENSOR_ULTIMA_LECTURA (sensor_id, medicion_id, fecha_hora, valor)
+SELECT DISTINCT ON (sensor_id) sensor_id, medicion_id, fecha_hora, valor
+FROM MEDICION
+ORDER BY sensor_id, fecha_hora DESC, medicion_id DESC
+ON CONFLICT (sensor_id) DO NOTHING;
+
+-- =============================================================================
+-- V8.1 - AGREGADOS DE MEDICIONES PARA GRÁFICAS (OCTUBRE 2026)
+-- =============================================================================
+-- Resúmenes por sensor en cubetas de 1 min (60 s), 15 min (900 s) y 1 h (3600 s).
+-- La API los mantiene de forma incremental (UPSERT) en la misma transacción que cada
+-- MEDICION, así las gráficas de días/semanas no tienen que leer miles de filas crudas.
+-- Se conservan aunque se aplique la retención de particiones de MEDICION.
+create table if not exists MEDICION_AGREGADA (
+    sensor_id int not null references SENSOR(sensor_id) on delete cascade,
+    resolucion_s int not null,
+    bucket timestamptz not null,
+    minimo decimal(10,2) not null,
+    maximo decimal(10,2) not null,
+    suma decimal(16,2) not null,
+    cuenta int not null,
+    primary key (sensor_id, resolucion_s, bucket)
+);
+
+-- Carga inicial para bases de datos que ya tienen histórico (idempotente)
+INSERT INTO MEDICION_AGREGADA (sensor_id, resolucion_s, bucket, minimo, maximo, suma, cuenta)
+SELECT m.sensor_id, r.resolucion_s,
+       to_timestamp(floor(extract(epoch FROM m.fecha_hora) / r.resolucion_s) * r.resolucion_s),
+       min(m.valor), max(m.valor), sum(m.valor), count(*)
+FROM MEDICION m
+CROSS JOIN (VALUES (60), (900), (3600)) AS r(resolucion_s)
+GROUP BY 1, 2, 3
+ON CONFLICT (sensor_id, resolucion_s, bucket) DO NOTHING;
+
+-- =============================================================================
+-- V8.2 - JORNADA LABORAL EN BBDD (OCTUBRE 2026)
+-- =============================================================================
+-- Sustituye a los ficheros app/config_clientes/jornada_*.json (uno por cliente y por nave).
+-- Una fila por ámbito: jornada global del cliente (cliente_id) o de un invernadero (invernadero_id).
+-- 'tramos' guarda las claves del formulario: {"default": [...], "0": null | [...], ..., "6": ...}.
+-- Las restricciones UNIQUE crean los índices por cliente y por invernadero.
+-- Importación de los ficheros existentes: python scripts/importar_jornadas.py
+create table if not exists JORNADA_CONFIG (
+    jornada_id serial primary key,
+    cliente_id int unique references CLIENTE(cliente_id) on delete cascade,
+    invernadero_id int unique references INVERNADERO(invernadero_id) on delete cascade,
+    es_laborable boolean not null default true,
+    heredar_de_global boolean not null default false,
+    tramos jsonb not null default '{}'::jsonb,
+    fecha_actualizacion timestamptz default CURRENT_TIMESTAMP,
+    constraint ck_jornada_ambito check ((cliente_id is null) <> (invernadero_id is null))
+);
+
+-- =============================================================================
+-- V8.3 - CACHÉ DE CONSULTAS GEOGRÁFICAS EXTERNAS (OCTUBRE 2026)
+-- =============================================================================
+-- Solo se usa con SIRA_GEO_EXTERNO=1 (ver app/logic/cache_geo.py).
+-- Una fila por consulta ('cp:04700', 'municipio:el ejido'); respuesta NULL o '[]' = no encontrado.
+create table if not exists GEO_CACHE (
+    clave varchar(150) primary key,
+    respuesta jsonb,
+    caduca timestamptz not null
+);
+
+-- =============================================================================
+-- V8.4 - ORDEN DEL LISTADO DE CLIENTES (OCTUBRE 2026)
+-- =============================================================================
+-- GET /clientes/ ordena por (en línea, rol, id). "En línea" depende de la hora de la consulta y no
+-- se puede indexar: el listado se sirve en dos tramos (en línea / resto) y cada uno se recorre
+-- por (rango_prioridad, cliente_id). El rango del rol se materializa como columna generada para
+-- que la comparación de filas del cursor use este índice en lugar de ordenar la tabla entera.
+-- La API lo aplica también al arrancar (main.py) en BBDD existentes: el modelo Cliente la mapea.
+ALTER TABLE CLIENTE ADD COLUMN IF NOT EXISTS rango_prioridad int
+    GENERATED ALWAYS AS (CASE rol WHEN 'root' THEN 0 WHEN 'admin' THEN 1 ELSE 2 END) STORED;
+CREATE INDEX IF NOT EXISTS idx_cliente_orden ON CLIENTE (rango_prioridad, cliente_id);
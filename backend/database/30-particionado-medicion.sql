@@ -0,0 +1,185 @@
+/*
+=============================================================================
+
+            PARTICIONADO MENSUAL DE MEDICION - PROYECTO SIRA
+
+=============================================================================
+
+Versión: 9.2 (Octubre 2026)
+
+MEDICION crece millones de filas al mes (un dato por sensor cada 10 s).
+Este script la convierte en una tabla particionada por rango de 'fecha_hora'
+(una partición por mes) para que:
+  - Las consultas de ventana reciente solo toquen las particiones "calientes".
+  - La retención se haga soltando particiones enteras (sin DELETE masivos).
+
+Es IDEMPOTENTE:
+  - BBDD nueva (docker-entrypoint-initdb.d): se ejecuta tras 10-schema y 20-data.
+  - BBDD existente: docker exec -i sira_db psql -U <usuario> -d sira_db < backend/database/30-particionado-medicion.sql
+    (migra los datos de la tabla antigua dentro de una única transacción).
+*/
+
+-- =============================================================================
+-- 1. FUNCIÓN: Crear particiones mensuales (mes actual + N meses futuros)
+-- =============================================================================
+-- 'desde' permite crear también los meses pasados (migración de histórico).
+-- Los límites se fijan en UTC para que no dependan de la zona horaria de la sesión.
+-- Si medicion_default ya tiene filas de ese mes (la API estuvo más tiempo en marcha que los
+-- meses pre-creados), PARTITION OF fallaría: la partición se crea suelta, se le mueven esas
+-- filas y después se engancha. El cerrojo consultivo evita que dos procesos (workers de la
+-- API, script de mantenimiento) creen la misma partición a la vez.
+CREATE OR REPLACE FUNCTION sira_crear_particiones_medicion(meses_adelante int DEFAULT 3, desde date DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql AS $$
+DECLARE
+    mes date := date_trunc('month', coalesce(desde, current_date))::date;
+    fin date := (date_trunc('month', current_date) + make_interval(months => meses_adelante + 1))::date;
+    nombre text;
+    inicio_mes timestamptz;
+    fin_mes timestamptz;
+    movidas bigint;
+    creadas int := 0;
+BEGIN
+    -- Solo tiene sentido si MEDICION ya es una tabla particionada
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'medicion'
+    ) THEN
+        RETURN 0;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('sira_particiones_medicion'));
+
+    WHILE mes < fin LOOP
+        nombre := format('medicion_%s', to_char(mes, 'YYYY_MM'));
+        inicio_mes := mes::timestamp AT TIME ZONE 'UTC';
+        fin_mes := (mes + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+        IF to_regclass(nombre) IS NULL THEN
+            IF to_regclass('medicion_default') IS NOT NULL AND EXISTS (
+                SELECT 1 FROM medicion_default WHERE fecha_hora >= inicio_mes AND fecha_hora < fin_mes
+            ) THEN
+                -- Sin escrituras nuevas en la DEFAULT hasta enganchar (ATTACH la revisa entera)
+                LOCK TABLE medicion_default IN SHARE ROW EXCLUSIVE MODE;
+                EXECUTE format('CREATE TABLE %I (LIKE medicion INCLUDING DEFAULTS)', nombre);
+                EXECUTE format(
+                    'WITH movidas AS (DELETE FROM medicion_default WHERE fecha_hora >= $1 AND fecha_hora < $2 RETURNING *)
+                     INSERT INTO %I SELECT * FROM movidas', nombre
+                ) USING inicio_mes, fin_mes;
+                GET DIAGNOSTICS movidas = ROW_COUNT;
+                EXECUTE format(
+                    'ALTER TABLE medicion ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    nombre, inicio_mes, fin_mes
+                );
+                RAISE NOTICE '%: % filas movidas desde medicion_default', nombre, movidas;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF medicion FOR VALUES FROM (%L) TO (%L)',
+                    nombre, inicio_mes, fin_mes
+                );
+            END IF;
+            creadas := creadas + 1;
+        END IF;
+        mes := (mes + interval '1 month')::date;
+    END LOOP;
+
+    RETURN creadas;
+END $$;
+
+-- =============================================================================
+-- 2. FUNCIÓN: Política de retención
+-- =============================================================================
+-- Conserva el mes actual y los 'meses_retencion' meses anteriores completos.
+-- modo 'detach': la partición se desengancha y queda como tabla suelta (archivo/backup).
+-- modo 'drop':   la partición se elimina definitivamente.
+-- La partición DEFAULT (fechas fuera de rango) nunca se toca.
+CREATE OR REPLACE FUNCTION sira_retencion_medicion(meses_retencion int, modo text DEFAULT 'detach')
+RETURNS SETOF text
+LANGUAGE plpgsql AS $$
+DECLARE
+    limite date := (date_trunc('month', current_date) - make_interval(months => meses_retencion))::date;
+    particion record;
+BEGIN
+    IF modo NOT IN ('detach', 'drop') THEN
+        RAISE EXCEPTION 'Modo de retención inválido: % (usar detach o drop)', modo;
+    END IF;
+    IF meses_retencion < 1 THEN
+        RAISE EXCEPTION 'La retención debe ser de al menos 1 mes';
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('sira_particiones_medicion'));
+
+    FOR particion IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'medicion' AND c.relname ~ '^medicion_\d{4}_\d{2}$'
+        ORDER BY c.relname
+    LOOP
+        -- El mes de la partición se deduce de su nombre (medicion_YYYY_MM)
+        IF (to_date(right(particion.relname, 7), 'YYYY_MM') + interval '1 month')::date <= limite THEN
+            EXECUTE format('ALTER TABLE medicion DETACH PARTITION %I', particion.relname);
+            IF modo = 'drop' THEN
+                EXECUTE format('DROP TABLE %I', particion.relname);
+            END IF;
+            RETURN NEXT particion.relname;
+        END IF;
+    END LOOP;
+END $$;
+
+-- =============================================================================
+-- 3. MIGRACIÓN: Tabla clásica -> Tabla particionada
+-- =============================================================================
+-- La clave primaria pasa a ser (medicion_id, fecha_hora): PostgreSQL exige que la
+-- columna de particionado forme parte de la PK. medicion_id sigue siendo único
+-- porque lo sigue generando la misma secuencia.
+DO $$
+DECLARE
+    secuencia text;
+    fecha_minima date;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'medicion' AND relkind = 'r') THEN
+        LOCK TABLE medicion IN ACCESS EXCLUSIVE MODE;
+        secuencia := pg_get_serial_sequence('medicion', 'medicion_id');
+
+        -- 3.1 Apartar la tabla antigua (y liberar los nombres de índices/restricciones)
+        ALTER TABLE medicion RENAME TO medicion_legacy;
+        ALTER INDEX IF EXISTS medicion_pkey RENAME TO medicion_legacy_pkey;
+        ALTER INDEX IF EXISTS idx_medicion_sensor RENAME TO idx_medicion_legacy_sensor;
+        ALTER INDEX IF EXISTS idx_medicion_fecha RENAME TO idx_medicion_legacy_fecha;
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', secuencia);
+
+        -- 3.2 Nueva tabla particionada (mismas columnas y valores por defecto)
+        EXECUTE format($ddl$
+            CREATE TABLE medicion (
+                medicion_id int not null default nextval(%L::regclass),
+                sensor_id int not null,
+                fecha_hora timestamptz not null default CURRENT_TIMESTAMP,
+                valor decimal(10,2) not null,
+                primary key (medicion_id, fecha_hora),
+                foreign key (sensor_id) references SENSOR(sensor_id)
+            ) PARTITION BY RANGE (fecha_hora)
+        $ddl$, secuencia);
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY medicion.medicion_id', secuencia);
+
+        -- Red de seguridad: lecturas con fechas fuera de cualquier partición mensual
+        CREATE TABLE medicion_default PARTITION OF medicion DEFAULT;
+
+        -- 3.3 Particiones para todo el histórico + meses futuros, y copia de datos
+        SELECT min(fecha_hora AT TIME ZONE 'UTC')::date INTO fecha_minima FROM medicion_legacy;
+        PERFORM sira_crear_particiones_medicion(3, fecha_minima);
+
+        INSERT INTO medicion (medicion_id, sensor_id, fecha_hora, valor)
+        SELECT medicion_id, sensor_id, fecha_hora, valor FROM medicion_legacy;
+
+        DROP TABLE medicion_legacy;
+    END IF;
+END $$;
+
+-- =============================================================================
+-- 4. ÍNDICES (se propagan automáticamente a todas las particiones)
+-- =============================================================================
+-- Compuesto: resuelve "últimas N lecturas del sensor X" con un único recorrido de índice
+CREATE INDEX IF NOT EXISTS idx_medicion_sensor_fecha ON MEDICION(sensor_id, fecha_hora DESC);
+CREATE INDEX IF NOT EXISTS idx_medicion_fecha ON MEDICION(fecha_hora DESC);
+
+-- Particiones del mes en curso y los 3 siguientes
+SELECT sira_crear_particiones_medicion(3);
@@ -0,0 +1,63 @@
+/*
+=============================================================================
+
+            ÍNDICES DE BÚSQUEDA DE TEXTO (pg_trgm + unaccent) - PROYECTO SIRA
+
+=============================================================================
+
+Versión: 9.1 (Octubre 2026)
+
+Los buscadores de clientes, cultivos y localidades filtran con "contiene, sin tildes y sin
+mayúsculas" (ILIKE '%texto%'). Un B-Tree no sirve para un comodín inicial, así que cada
+pulsación del buscador recorría la tabla entera. Este script crea:
+  - sira_unaccent(text): envoltorio IMMUTABLE de unaccent() (unaccent es solo STABLE y
+    PostgreSQL no permite usarla en un índice de expresión).
+  - Índices GIN de trigramas (pg_trgm) sobre sira_unaccent(columna), que resuelven ILIKE
+    '%texto%' sin recorrer la tabla.
+  - Un índice B-Tree con el orden del listado de localidades (paginación por cursor).
+Las funciones de búsqueda de app/crud usan EXACTAMENTE estas expresiones (app/crud/busqueda.py).
+
+Es IDEMPOTENTE:
+  - BBDD nueva (docker-entrypoint-initdb.d): se ejecuta tras 10-schema, 20-data y 30-particionado.
+  - BBDD existente: la API lo aplica al arrancar, o a mano:
+    docker exec -i sira_db psql -U <usuario> -d sira_db < backend/database/40-indices-busqueda.sql
+*/
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- =============================================================================
+-- 1. FUNCIÓN: unaccent inmutable
+-- =============================================================================
+-- Diccionario y función cualificados por esquema: el resultado no depende del search_path.
+-- También la crean 10-schema.sql y la API al arrancar (main.py) sin pg_trgm; aquí se repite
+-- para que el script se pueda aplicar por sí solo.
+CREATE OR REPLACE FUNCTION sira_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$;
+
+-- =============================================================================
+-- 2. ÍNDICES GIN DE TRIGRAMAS
+-- =============================================================================
+-- CLIENTE (crud_clientes.get_clientes): todas las ramas del OR indexadas -> BitmapOr
+CREATE INDEX IF NOT EXISTS idx_cliente_empresa_trgm ON CLIENTE USING gin (sira_unaccent(nombre_empresa) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cliente_contacto_trgm ON CLIENTE USING gin (sira_unaccent(persona_contacto) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cliente_email_trgm ON CLIENTE USING gin (sira_unaccent(email_admin) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cliente_cif_trgm ON CLIENTE USING gin ((cif::text) gin_trgm_ops);
+
+-- CULTIVO (crud_cultivos.get_cultivos)
+CREATE INDEX IF NOT EXISTS idx_cultivo_nombre_trgm ON CULTIVO USING gin (sira_unaccent(nombre_cultivo) gin_trgm_ops);
+
+-- LOCALIDAD (crud_infraestructura.get_localidades)
+CREATE INDEX IF NOT EXISTS idx_localidad_municipio_trgm ON LOCALIDAD USING gin (sira_unaccent(municipio) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_localidad_provincia_trgm ON LOCALIDAD USING gin (sira_unaccent(provincia) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_localidad_cp_trgm ON LOCALIDAD USING gin ((codigo_postal::text) gin_trgm_ops);
+
+-- =============================================================================
+-- 3. ÍNDICES DE ORDEN (paginación por cursor, app/crud/paginacion.py)
+-- =============================================================================
+-- GET /localidades/ ordena por (sira_unaccent(municipio), codigo_postal): el cursor continúa
+-- con un recorrido de este índice en lugar de ordenar la tabla entera en cada página
+CREATE INDEX IF NOT EXISTS idx_localidad_orden ON LOCALIDAD (sira_unaccent(municipio), codigo_postal);
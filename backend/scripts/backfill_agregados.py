@@ -0,0 +1,37 @@
+"""
+Recalcula la tabla MEDICION_AGREGADA (cubetas de 1m / 15m / 1h) a partir del histórico de MEDICION.
+
+Uso (dentro del contenedor de la API):
+    docker exec -it sira_api python scripts/backfill_agregados.py
+
+Es idempotente: cada cubeta se sobrescribe con el valor recalculado desde las mediciones crudas.
+Las cubetas de meses ya retirados por la retención de MEDICION no se tocan.
+"""
+import sys
+import os
+
+# Permite ejecutar el script desde la carpeta 'backend' o desde 'scripts'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, engine
+from app import models
+from app.crud import crud_operaciones
+
+def backfill():
+    print("🚀 Iniciando recálculo de MEDICION_AGREGADA...")
+    # Crea la tabla si la BBDD es anterior a la V8.1
+    models.MedicionAgregada.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        escritas = crud_operaciones.backfill_agregados(db)
+        print(f"\n✅ Recálculo completado.")
+        print(f"📊 Resumen: {escritas} cubetas escritas.")
+    except Exception as e:
+        print(f"❌ Error crítico: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,37 @@
+"""
+Reconstruye la tabla SENSOR_ULTIMA_LECTURA a partir del histórico de MEDICION.
+
+Uso (dentro del contenedor de la API):
+    docker exec -it sira_api python scripts/backfill_ultima_lectura.py
+
+Es idempotente: solo sobrescribe una fila si el histórico tiene una lectura
+igual o más reciente que la ya guardada.
+"""
+import sys
+import os
+
+# Permite ejecutar el script desde la carpeta 'backend' o desde 'scripts'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, engine
+from app import models
+from app.crud import crud_operaciones
+
+def backfill():
+    print("🚀 Iniciando reconstrucción de SENSOR_ULTIMA_LECTURA...")
+    # Crea la tabla si la BBDD es anterior a la V8.0
+    models.SensorUltimaLectura.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        actualizados = crud_operaciones.backfill_ultimas_lecturas(db)
+        print(f"\n✅ Reconstrucción completada.")
+        print(f"📊 Resumen: {actualizados} sensores actualizados.")
+    except Exception as e:
+        print(f"❌ Error crítico: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill()
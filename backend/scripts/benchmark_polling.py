@@ -0,0 +1,85 @@
+"""
+Benchmark de polling concurrente: peticiones/segundo y latencias de las rutas calientes.
+
+Simula N dashboards refrescando a la vez el estado de un invernadero (GET /api/v1/iot/estado/{id})
+y una ruta protegida (GET /api/v1/clientes/{id}, pasa por auth.get_current_user).
+Para comparar el motor síncrono con el asíncrono, levantar dos APIs (SIRA_DB_ASYNC=0 y =1)
+y pasar ambas URLs; se imprime una fila por URL.
+
+Uso:
+    python scripts/benchmark_polling.py --urls http://localhost:8085 http://localhost:8086 \\
+        --usuario admin --password admin1234 --invernadero 1 --cliente 2 --concurrencia 50 --segundos 20
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def login(base_url: str, usuario: str, password: str) -> str:
+    resp = requests.post(f"{base_url}/api/auth/token", data={"username": usuario, "password": password}, timeout=10)
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+def sondear(rutas: list, cabeceras: dict, fin: float, latencias: list, errores: list, lock: threading.Lock):
+    """Un 'dashboard': recorre las rutas en bucle hasta 'fin' con su propia conexión keep-alive."""
+    sesion = requests.Session()
+    sesion.headers.update(cabeceras)
+    propias, fallos, i = [], 0, 0
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            ok = sesion.get(rutas[i % len(rutas)], timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        propias.append(time.perf_counter() - inicio)
+        fallos += not ok
+        i += 1
+    with lock:
+        latencias.extend(propias)
+        errores.append(fallos)
+
+
+def medir(base_url: str, args) -> dict:
+    token = login(base_url, args.usuario, args.password)
+    rutas = [f"{base_url}/api/v1/iot/estado/{args.invernadero}", f"{base_url}/api/v1/clientes/{args.cliente}"]
+    latencias, errores, lock = [], [], threading.Lock()
+
+    inicio = time.perf_counter()
+    fin = inicio + args.segundos
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        for _ in range(args.concurrencia):
+            pool.submit(sondear, rutas, {"Authorization": f"Bearer {token}"}, fin, latencias, errores, lock)
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "url": base_url,
+        "peticiones": len(latencias),
+        "errores": sum(errores),
+        "rps": len(latencias) / duracion,
+        "p50_ms": statistics.median(latencias) * 1000 if latencias else 0,
+        "p95_ms": latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de polling concurrente contra la API SIRA")
+    parser.add_argument("--urls", nargs="+", default=["http://localhost:8085"])
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--password", default="admin1234")
+    parser.add_argument("--invernadero", type=int, default=1)
+    parser.add_argument("--cliente", type=int, default=2)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--segundos", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"📊 {args.concurrencia} clientes concurrentes durante {args.segundos:.0f}s por URL\n")
+    print(f"{'URL':<32}{'peticiones':>11}{'errores':>9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for url in args.urls:
+        r = medir(url, args)
+        print(f"{r['url']:<32}{r['peticiones']:>11}{r['errores']:>9}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}")
@@ -0,0 +1,71 @@
+"""
+Genera el fichero del índice geográfico (app/logic/indice_geo.py) a partir del volcado de
+códigos postales de GeoNames para España (https://download.geonames.org/export/zip/ES.zip,
+licencia CC BY 4.0).
+
+Uso:
+    python scripts/importar_codigos_postales.py ES.zip [--salida app/logic/codigos_postales.csv]
+
+Acepta el .zip tal cual o el ES.txt ya descomprimido. La provincia se normaliza con
+geo_logic.obtener_provincia_por_cp (mismos nombres que el resto de SIRA). Las filas de la
+semilla que ya estén en el fichero de salida y no vengan en el volcado se conservan.
+Tras generarlo basta con reiniciar la API (o apuntar SIRA_GEO_DATASET al nuevo fichero).
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import zipfile
+
+# Permite ejecutar el script desde la carpeta 'backend' o desde 'scripts'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.logic.indice_geo import DATASET
+from app.utils.geo_logic import obtener_provincia_por_cp
+
+
+def leer_geonames(ruta: str):
+    """Filas (cp, municipio, provincia) del formato tabulado de GeoNames."""
+    if ruta.endswith(".zip"):
+        with zipfile.ZipFile(ruta) as z:
+            texto = io.TextIOWrapper(z.open("ES.txt"), encoding="utf-8").read()
+    else:
+        with open(ruta, encoding="utf-8") as f:
+            texto = f.read()
+    for linea in texto.splitlines():
+        campos = linea.split("\t")
+        # pais, cp, lugar, comunidad, cod_comunidad, provincia, cod_provincia, ...
+        if len(campos) < 6 or campos[0] != "ES" or len(campos[1]) != 5:
+            continue
+        yield campos[1], campos[2].strip(), obtener_provincia_por_cp(campos[1], campos[5].strip())
+
+
+def importar(origen: str, salida: str):
+    filas = set()
+    if os.path.exists(salida):
+        with open(salida, newline="", encoding="utf-8") as f:
+            filas.update((r["codigo_postal"], r["municipio"], r["provincia"]) for r in csv.DictReader(f))
+    previas = len(filas)
+    cps_previos = {f[0] for f in filas}
+
+    nuevas = set(leer_geonames(origen))
+    # El volcado manda: se descartan las filas previas de los CPs que trae
+    cps_nuevos = {f[0] for f in nuevas}
+    filas = {f for f in filas if f[0] not in cps_nuevos} | nuevas
+
+    with open(salida, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["codigo_postal", "municipio", "provincia"])
+        escritor.writerows(sorted(filas))
+
+    print(f"✅ {len(filas)} filas en {salida} ({len({f[0] for f in filas})} CPs). "
+          f"Antes: {previas} filas / {len(cps_previos)} CPs.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa el volcado de CPs de GeoNames al índice geográfico local")
+    parser.add_argument("origen", help="ES.zip o ES.txt de GeoNames")
+    parser.add_argument("--salida", default=DATASET)
+    args = parser.parse_args()
+    importar(args.origen, args.salida)
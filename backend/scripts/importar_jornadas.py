@@ -0,0 +1,79 @@
+"""
+Importa las jornadas laborales antiguas (app/config_clientes/jornada_*.json) a la tabla JORNADA_CONFIG.
+
+Uso (dentro del contenedor de la API):
+    docker exec -it sira_api python scripts/importar_jornadas.py [--dir RUTA]
+
+Es idempotente: cada fichero sustituye la fila de su ámbito (cliente o invernadero).
+Los ficheros no se borran; una vez comprobada la importación se puede eliminar la carpeta.
+Se omiten los ficheros corruptos y los de clientes / invernaderos que ya no existen.
+"""
+import sys
+import os
+import re
+import json
+import argparse
+
+# Permite ejecutar el script desde la carpeta 'backend' o desde 'scripts'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, engine
+from app import models, schemas
+from app.crud import crud_jornadas
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "config_clientes")
+PATRON = re.compile(r"^jornada_(cliente|inv)_(\d+)\.json$")
+
+def importar(config_dir: str):
+    print(f"🚀 Importando jornadas desde {config_dir}...")
+    if not os.path.isdir(config_dir):
+        print("ℹ️ No existe la carpeta: no hay nada que importar.")
+        return
+
+    # Crea la tabla si la BBDD es anterior a la V8.2
+    models.JornadaConfig.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        clientes = {c for (c,) in db.query(models.Cliente.cliente_id)}
+        invernaderos = {i for (i,) in db.query(models.Invernadero.invernadero_id)}
+
+        importados = 0
+        omitidos = 0
+        for nombre in sorted(os.listdir(config_dir)):
+            coincidencia = PATRON.match(nombre)
+            if not coincidencia:
+                continue
+            ambito, ambito_id = coincidencia.group(1), int(coincidencia.group(2))
+
+            if ambito_id not in (clientes if ambito == "cliente" else invernaderos):
+                print(f"⏭️ {nombre}: el {'cliente' if ambito == 'cliente' else 'invernadero'} ya no existe.")
+                omitidos += 1
+                continue
+            try:
+                with open(os.path.join(config_dir, nombre), "r", encoding="utf-8") as f:
+                    config = schemas.ConfigJornada(**json.load(f))
+            except Exception as e:
+                print(f"⚠️ {nombre}: fichero inválido ({e}).")
+                omitidos += 1
+                continue
+
+            if ambito == "cliente":
+                crud_jornadas.upsert_jornada(db, config, cliente_id=ambito_id)
+            else:
+                crud_jornadas.upsert_jornada(db, config, invernadero_id=ambito_id)
+            importados += 1
+
+        db.commit()
+        print(f"\n✅ Importación completada.")
+        print(f"📊 Resumen: {importados} importados, {omitidos} omitidos.")
+    except Exception as e:
+        print(f"❌ Error crítico: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa los ficheros de jornada a JORNADA_CONFIG")
+    parser.add_argument("--dir", default=CONFIG_DIR, help="Carpeta con los ficheros jornada_*.json")
+    importar(parser.parse_args().dir)
@@ -0,0 +1,57 @@
+"""
+Mantenimiento del histórico particionado de MEDICION.
+
+1. Crea las particiones mensuales que falten (mes actual + MEDICION_PARTICIONES_FUTURAS).
+2. Aplica la retención: suelta las particiones más antiguas que MEDICION_RETENCION_MESES
+   ('detach' las deja como tablas sueltas para archivarlas, 'drop' las elimina).
+
+La API ya lo hace sola al arrancar y cada MEDICION_MANTENIMIENTO_HORAS horas
+(app/logic/mantenimiento_medicion.py). El script sirve para lanzarlo a mano o desde cron si
+ese mantenimiento está limitado al arranque (MEDICION_MANTENIMIENTO_HORAS=0).
+
+Uso (dentro del contenedor de la API):
+    docker exec -it sira_api python scripts/mantenimiento_medicion.py
+    docker exec -it sira_api python scripts/mantenimiento_medicion.py --retencion 12 --modo drop
+
+Requiere haber aplicado database/30-particionado-medicion.sql.
+"""
+import sys
+import os
+import argparse
+
+# Permite ejecutar el script desde la carpeta 'backend' o desde 'scripts'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.crud import crud_operaciones
+from app.logic.mantenimiento_medicion import ejecutar_mantenimiento
+
+def mantenimiento(meses_adelante: int, meses_retencion: int, modo: str):
+    print("🚀 Iniciando mantenimiento de particiones de MEDICION...")
+    db = SessionLocal()
+    try:
+        creadas, sueltas = ejecutar_mantenimiento(db, meses_adelante, meses_retencion, modo)
+        print(f"📅 Particiones futuras: {creadas} nuevas.")
+
+        if meses_retencion > 0:
+            for nombre in sueltas:
+                print(f"🗄️ {nombre}: {'desenganchada (archivo)' if modo == 'detach' else 'eliminada'}")
+            print(f"📊 Retención ({meses_retencion} meses, modo {modo}): {len(sueltas)} particiones.")
+        else:
+            print("ℹ️ Retención desactivada (MEDICION_RETENCION_MESES=0).")
+        print("\n✅ Mantenimiento completado.")
+    except Exception as e:
+        print(f"❌ Error crítico: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de MEDICION")
+    parser.add_argument("--adelante", type=int, default=crud_operaciones.MEDICION_PARTICIONES_FUTURAS,
+                        help="Meses futuros a pre-crear")
+    parser.add_argument("--retencion", type=int, default=crud_operaciones.MEDICION_RETENCION_MESES,
+                        help="Meses de histórico a conservar (0 = todo)")
+    parser.add_argument("--modo", choices=["detach", "drop"], default=crud_operaciones.MEDICION_RETENCION_MODO)
+    args = parser.parse_args()
+    mantenimiento(args.adelante, args.retencion, args.modo)
@@ -0,0 +1,24 @@
+"""
+Worker del cerebro de control: ejecuta el planificador de flota como proceso independiente de la API.
+
+Uso (dentro del contenedor de la API):
+    docker exec -it sira_api python scripts/worker_control.py
+
+Configuración por entorno: SIRA_CONTROL_INTERVALO_S, SIRA_CONTROL_CONCURRENCIA, SIRA_CONTROL_JITTER_S.
+No activar a la vez SIRA_CONTROL_AUTOMATICO=1 en la API (se controlaría dos veces cada invernadero).
+"""
+import sys
+import os
+import asyncio
+
+# Permite ejecutar el script desde la carpeta 'backend' o desde 'scripts'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.logic.planificador_control import planificador, metricas
+
+if __name__ == "__main__":
+    print("🚀 Iniciando worker de control SIRA...")
+    try:
+        asyncio.run(planificador.bucle())
+    except KeyboardInterrupt:
+        print(f"\n🛑 Worker detenido. 📊 Resumen: {metricas.resumen()}")
@@ -0,0 +1,87 @@
+"""
+Comprueba con EXPLAIN que los buscadores de clientes, cultivos y localidades (ILIKE '%texto%'
+sin tildes) usan los índices GIN de trigramas de database/40-indices-busqueda.sql en lugar de
+recorrer la tabla.
+
+Se captura la SQL real que lanza cada función de app/crud y se explica con los recorridos
+secuenciales y de índice simple desactivados: con tablas pequeñas el planificador prefiere el
+recorrido secuencial, pero si la expresión del filtro no coincide con la del índice el plan no
+puede usarlo y el test falla.
+
+Requiere una BBDD PostgreSQL accesible en DATABASE_URL.
+Ejecutar con: DATABASE_URL=postgresql://... python -m pytest test_busqueda_indices.py
+"""
+import os
+import pytest
+
+if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+    pytest.skip("Necesita DATABASE_URL apuntando a PostgreSQL", allow_module_level=True)
+
+from sqlalchemy import event
+
+from app.database import SessionLocal, engine
+from app.crud import crud_clientes, crud_cultivos, crud_infraestructura
+from app.main import SQL_SIRA_UNACCENT, aplicar_indices_busqueda
+
+
+@pytest.fixture(scope="module", autouse=True)
+def migracion():
+    # La misma función que usa la API al arrancar (dos veces: el script es idempotente)
+    aplicar_indices_busqueda(engine)
+    aplicar_indices_busqueda(engine)
+
+
+def plan_de(buscar) -> str:
+    """Ejecuta buscar(db), captura su SELECT y devuelve el EXPLAIN de esa misma sentencia."""
+    sentencias = []
+    capturar = lambda conn, cursor, sql, parametros, *args: sentencias.append((sql, parametros))
+    with SessionLocal() as db:
+        event.listen(engine, "before_cursor_execute", capturar)
+        try:
+            buscar(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", capturar)
+        sql, parametros = sentencias[-1]
+        conexion = db.connection()
+        conexion.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        conexion.exec_driver_sql("SET LOCAL enable_indexscan = off")
+        filas = conexion.exec_driver_sql("EXPLAIN " + sql, parametros).all()
+        db.rollback()
+    return "\n".join(f[0] for f in filas)
+
+
+def test_sira_unaccent_no_depende_de_pg_trgm():
+    # El paso de arranque de main.py la crea por sí solo (sin el script de índices)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SQL_SIRA_UNACCENT, execution_options={"no_parameters": True})
+        assert conn.exec_driver_sql("SELECT sira_unaccent('Huércal-Overa')").scalar() == "Huercal-Overa"
+
+
+def test_migracion_crea_funcion_e_indices():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT sira_unaccent('Almería Ñandú')").scalar() == "Almeria Nandu"
+        indices = set(conn.exec_driver_sql("SELECT indexname FROM pg_indexes WHERE schemaname = 'public'").scalars())
+    esperados = {
+        "idx_cliente_empresa_trgm", "idx_cliente_contacto_trgm", "idx_cliente_email_trgm", "idx_cliente_cif_trgm",
+        "idx_cultivo_nombre_trgm", "idx_localidad_municipio_trgm", "idx_localidad_provincia_trgm",
+        "idx_localidad_cp_trgm", "idx_localidad_orden",
+    }
+    assert esperados <= indices, esperados - indices
+
+
+def test_clientes_usa_los_indices_de_trigramas():
+    plan = plan_de(lambda db: crud_clientes.get_clientes(db, q="Agrícola"))
+    for indice in ("idx_cliente_empresa_trgm", "idx_cliente_contacto_trgm", "idx_cliente_email_trgm", "idx_cliente_cif_trgm"):
+        assert indice in plan, plan
+
+
+def test_cultivos_usa_el_indice_de_trigramas():
+    plan = plan_de(lambda db: crud_cultivos.get_cultivos(db, q="tomáte"))
+    assert "idx_cultivo_nombre_trgm" in plan, plan
+
+
+def test_localidades_usa_los_indices_de_trigramas():
+    plan = plan_de(lambda db: crud_infraestructura.get_localidades(db, q="ejido"))
+    for indice in ("idx_localidad_municipio_trgm", "idx_localidad_provincia_trgm", "idx_localidad_cp_trgm"):
+        assert indice in plan, plan
+    assert "Seq Scan on localidad" not in plan, plan
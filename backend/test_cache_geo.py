@@ -0,0 +1,131 @@
+"""
+Caché de las consultas geográficas externas (logic/cache_geo.py + utils/geo_logic.py) contra un
+servidor HTTP local que hace de Zippopotam / Nominatim: TTL, caché negativa, coalescencia de
+peticiones simultáneas, persistencia en GEO_CACHE y errores de red sin cachear.
+Ejecutar con: python -m pytest test_cache_geo.py
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.logic import cache_geo as modulo_cache
+from app.logic.cache_geo import CacheGeo
+from app.utils import geo_logic
+
+ZIPPOPOTAM = {"places": [{"place name": "El Ejido", "state": "Andalucia"}]}
+NOMINATIM = [{"address": {"postcode": "30880", "town": "Águilas", "province": "Murcia"}}]
+
+
+class Stub(BaseHTTPRequestHandler):
+    peticiones = []
+    retardo_s = 0
+
+    def do_GET(self):
+        Stub.peticiones.append(self.path)
+        time.sleep(Stub.retardo_s)
+        if self.path == "/es/04700":
+            self.responder(200, ZIPPOPOTAM)
+        elif self.path.startswith("/search"):
+            self.responder(200, NOMINATIM)
+        else:
+            self.responder(404, {})
+
+    def responder(self, codigo: int, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Stub.peticiones, Stub.retardo_s = [], 0
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fabrica_sesion():
+    motor = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.GeoCache.__table__.create(motor)
+    return sessionmaker(bind=motor)
+
+
+@pytest.fixture
+def cache(servidor, fabrica_sesion, monkeypatch):
+    cache = CacheGeo(fabrica_sesion)
+    monkeypatch.setattr(geo_logic, "cache_geo", cache)
+    monkeypatch.setattr(geo_logic, "ZIPPOPOTAM_URL", servidor)
+    monkeypatch.setattr(geo_logic, "NOMINATIM_URL", servidor)
+    return cache
+
+
+def test_respuestas_y_no_encontrados_se_cachean(cache):
+    assert geo_logic.consultar_zippopotam("04700")["municipio"] == "El Ejido"
+    assert geo_logic.consultar_zippopotam("04700")["provincia"] == "Almería"
+    assert geo_logic.consultar_zippopotam("99999") is None
+    assert geo_logic.consultar_zippopotam("99999") is None # Caché negativa
+    assert [r["codigo_postal"] for r in geo_logic.consultar_municipio_externo("Águilas")] == ["30880"]
+    assert geo_logic.consultar_municipio_externo("aguilas")[0]["municipio"] == "Águilas" # Misma clave sin tildes
+
+    assert Stub.peticiones.count("/es/04700") == 1
+    assert Stub.peticiones.count("/es/99999") == 1
+    assert sum(p.startswith("/search") for p in Stub.peticiones) == 1
+    assert cache.negativas == 1
+
+
+def test_la_tabla_sobrevive_al_reinicio(cache, fabrica_sesion, monkeypatch):
+    geo_logic.consultar_zippopotam("04700")
+    geo_logic.consultar_zippopotam("99999")
+
+    reiniciada = CacheGeo(fabrica_sesion) # Proceso nuevo: memoria vacía, misma tabla
+    monkeypatch.setattr(geo_logic, "cache_geo", reiniciada)
+    assert geo_logic.consultar_zippopotam("04700")["municipio"] == "El Ejido"
+    assert geo_logic.consultar_zippopotam("99999") is None
+    assert len(Stub.peticiones) == 2
+    assert reiniciada.aciertos_bbdd == 2
+
+
+def test_caducidad(cache, monkeypatch):
+    monkeypatch.setattr(modulo_cache, "TTL_NEGATIVO_S", -1) # Negativas ya caducadas al guardarse
+    geo_logic.consultar_zippopotam("99999")
+    geo_logic.consultar_zippopotam("99999")
+    assert Stub.peticiones.count("/es/99999") == 2
+
+
+def test_peticiones_simultaneas_comparten_una_consulta(cache):
+    Stub.retardo_s = 0.2
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(geo_logic.consultar_zippopotam("04700"))) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(resultados) == 8 and all(r["municipio"] == "El Ejido" for r in resultados)
+    assert Stub.peticiones == ["/es/04700"]
+    assert cache.coalescidas == 7
+
+
+def test_error_de_red_no_se_cachea(fabrica_sesion, monkeypatch):
+    cache = CacheGeo(fabrica_sesion)
+    monkeypatch.setattr(geo_logic, "cache_geo", cache)
+    monkeypatch.setattr(geo_logic, "ZIPPOPOTAM_URL", "http://127.0.0.1:9") # Puerto cerrado
+    assert geo_logic.consultar_zippopotam("04700") is None
+    assert cache.errores == 1 and cache.negativas == 0
+    assert cache.resumen()["entradas"] == 0
@@ -0,0 +1,57 @@
+"""
+Caché de jerarquías (logic/cache_jerarquia.py): aciertos/fallos, invalidación por cliente,
+expulsión LRU, caducidad y descarte de árboles construidos antes de una invalidación.
+No necesita BBDD.
+Ejecutar con: python -m pytest test_cache_jerarquia.py
+"""
+from app.logic import cache_jerarquia as modulo
+from app.logic.cache_jerarquia import CacheJerarquia
+
+
+def guardar(cache, cliente_id, ver_ocultos=False, contenido=b"{}"):
+    cache.guardar(cliente_id, ver_ocultos, contenido, cache.generacion(cliente_id))
+
+
+def test_aciertos_fallos_e_invalidacion_por_cliente():
+    cache = CacheJerarquia()
+    assert cache.obtener(1, False) is None
+    guardar(cache, 1, False, b"uno")
+    guardar(cache, 1, True, b"uno-ocultos")
+    guardar(cache, 2, False, b"dos")
+
+    assert cache.obtener(1, False) == b"uno"
+    assert cache.obtener(1, True) == b"uno-ocultos"
+
+    cache.invalidar(1, None)
+    assert cache.obtener(1, False) is None and cache.obtener(1, True) is None
+    assert cache.obtener(2, False) == b"dos"
+
+    resumen = cache.resumen()
+    assert (resumen["aciertos"], resumen["fallos"], resumen["invalidaciones"]) == (3, 3, 2)
+
+
+def test_expulsion_lru():
+    cache = CacheJerarquia(maximo=2)
+    guardar(cache, 1)
+    guardar(cache, 2)
+    cache.obtener(1, False) # El 1 pasa a ser el más reciente
+    guardar(cache, 3)
+
+    assert cache.obtener(2, False) is None
+    assert cache.obtener(1, False) is not None and cache.obtener(3, False) is not None
+    assert cache.resumen()["expulsiones"] == 1
+
+
+def test_no_guarda_un_arbol_anterior_a_una_invalidacion():
+    cache = CacheJerarquia()
+    generacion = cache.generacion(1) # Empieza a construirse el árbol...
+    cache.invalidar(1)               # ...y mientras tanto se escribe una parcela
+    cache.guardar(1, False, b"viejo", generacion)
+    assert cache.obtener(1, False) is None
+
+
+def test_caducidad(monkeypatch):
+    monkeypatch.setattr(modulo, "CACHE_TTL_S", -1)
+    cache = CacheJerarquia()
+    guardar(cache, 1)
+    assert cache.obtener(1, False) is None
@@ -0,0 +1,87 @@
+"""
+Comprueba que la evaluación vectorizada (control_vectorial.evaluar_lote) decide exactamente
+lo mismo que las reglas escalares del cerebro (control_brain.decidir_estados).
+No necesita BBDD: las reglas son funciones puras.
+Ejecutar con: python -m pytest test_control_vectorial.py
+"""
+import random
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.logic import control_brain, control_vectorial
+
+# Valores en y alrededor de cada umbral, para cubrir los bordes de las histéresis
+UMBRALES = [0, 10, 12, 30, 35, 45, 65, 80, 90, 200, 250]
+ESTADOS_ACTUALES = [None, "APAGADO", "ENCENDIDO", "CERRADO", "ABIERTO 100%", "ENTREABIERTO 20%", "ENCENDIDO 100%"]
+
+
+def valor_aleatorio(rng):
+    if rng.random() < 0.5:
+        return float(rng.choice(UMBRALES) + rng.choice([-0.01, 0, 0.01]))
+    return round(rng.uniform(-5, 1200), 2)
+
+
+def generar_flota(n, semilla=1234):
+    rng = random.Random(semilla)
+    flota = []
+    siguiente_id = 1
+    for _ in range(n):
+        lecturas = {c: valor_aleatorio(rng) for c in control_vectorial.VALORES_POR_DEFECTO if rng.random() < 0.7}
+        roles = {}
+        for rol in control_vectorial.ROLES:
+            if rng.random() < 0.8:
+                roles[rol] = {"id": siguiente_id, "estado": rng.choice(ESTADOS_ACTUALES), "cortesia": rng.random() < 0.3}
+                siguiente_id += 1
+            else:
+                roles[rol] = None
+        # Caso raro: un mismo actuador cubre dos roles (nombre de tipo ambiguo)
+        if roles["ventana"] and rng.random() < 0.05:
+            roles["extractor"] = roles["ventana"]
+        jornada = (rng.random() < 0.5, rng.random() < 0.8)
+        flota.append((lecturas, roles, jornada))
+    return flota
+
+
+def cambios_escalares(flota):
+    cambios = set()
+    for fila, (lecturas, roles, jornada) in enumerate(flota):
+        if not lecturas:
+            continue # El ciclo escalar no controla invernaderos sin lecturas
+        objetos = {rol: SimpleNamespace(actuador_id=r["id"]) if r else None for rol, r in roles.items()}
+        cortesia = {r["id"]: r["cortesia"] for r in roles.values() if r}
+        estado = {r["id"]: r["estado"] for r in roles.values() if r}
+        decisiones = control_brain.decidir_estados(objetos, lecturas, jornada, lambda a: cortesia[a])
+        for actuador_id, nuevo in decisiones.items():
+            if nuevo and estado[actuador_id] != nuevo:
+                cambios.add((fila, actuador_id, nuevo))
+    return cambios
+
+
+def cambios_vectoriales(flota):
+    n = len(flota)
+    lecturas = {c: np.array([f[0].get(c, np.nan) for f in flota], dtype=float) for c in control_vectorial.VALORES_POR_DEFECTO}
+    actuadores = {}
+    for rol in control_vectorial.ROLES:
+        actuadores[rol] = {
+            "id": np.array([f[1][rol]["id"] if f[1][rol] else -1 for f in flota], dtype=np.int64),
+            "estado": np.array([f[1][rol]["estado"] if f[1][rol] else None for f in flota], dtype=object),
+            "cortesia": np.array([bool(f[1][rol] and f[1][rol]["cortesia"]) for f in flota], dtype=bool)
+        }
+    en_jornada = np.array([f[2][0] for f in flota], dtype=bool)
+    configurada = np.array([f[2][1] for f in flota], dtype=bool)
+    return control_vectorial.evaluar_lote(lecturas, en_jornada, configurada, actuadores)
+
+
+def test_vectorial_igual_que_escalar():
+    flota = generar_flota(5000)
+    vectorial = cambios_vectoriales(flota)
+
+    assert len(vectorial) == len(set(vectorial)) # Nunca dos cambios para el mismo actuador
+    assert set(vectorial) == cambios_escalares(flota)
+
+
+def test_sin_jornada_configurada_apaga_luces_aunque_haya_cortesia():
+    flota = [({"luz": 50.0}, {"ventana": None, "riego": None, "calefaccion": None, "extractor": None,
+                              "led": {"id": 7, "estado": "ENCENDIDO", "cortesia": True}}, (True, False))]
+    assert cambios_vectoriales(flota) == [(0, 7, "APAGADO")]
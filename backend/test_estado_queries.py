@@ -0,0 +1,126 @@
+"""
+Comprueba que GET /api/v1/iot/estado/{id} lanza un número FIJO de consultas SQL,
+independientemente de cuántos sensores y actuadores tenga el invernadero.
+
+Requiere una BBDD PostgreSQL accesible en DATABASE_URL (DISTINCT ON es específico de PostgreSQL).
+Ejecutar con: DATABASE_URL=postgresql://... python -m pytest test_estado_queries.py
+"""
+import os
+import pytest
+
+if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+    pytest.skip("Necesita DATABASE_URL apuntando a PostgreSQL", allow_module_level=True)
+
+from decimal import Decimal
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.database import SessionLocal, async_engine, engine
+from app import models, schemas
+from app.crud import crud_operaciones
+
+CP_PRUEBA = "99901"
+CIF_PRUEBA = "TQC000001"
+
+
+@pytest.fixture(scope="module")
+def datos():
+    """Crea un cliente con dos invernaderos: uno pequeño (2+2) y otro grande (12+12)."""
+    db = SessionLocal()
+    cliente = models.Cliente(nombre_empresa="QC Consultas", cif=CIF_PRUEBA, email_admin="qc@sira.es",
+                             telefono="600000000", persona_contacto="QC", hash_contrasena="x")
+    localidad = db.get(models.Localidad, CP_PRUEBA) or models.Localidad(codigo_postal=CP_PRUEBA, municipio="QC", provincia="QC")
+    db.add_all([cliente, localidad])
+    db.flush()
+    parcela = models.Parcela(cliente_id=cliente.cliente_id, codigo_postal=CP_PRUEBA, direccion="QC", ref_catastral="QC000000000001")
+    db.add(parcela)
+    db.flush()
+    tipo_s = models.TipoSensor(nombre_tipo="QC Temperatura", unidad_medida="ºC")
+    tipo_a = models.TipoActuador(nombre_tipo="QC Motor Ventana")
+    db.add_all([tipo_s, tipo_a])
+    db.flush()
+
+    invernaderos = {}
+    lote = []
+    for n in (2, 12):
+        inv = models.Invernadero(nombre=f"QC {n}", parcela_id=parcela.parcela_id, largo_m=10, ancho_m=10)
+        db.add(inv)
+        db.flush()
+        for _ in range(n):
+            sensor = models.Sensor(invernadero_id=inv.invernadero_id, tipo_sensor_id=tipo_s.tipo_sensor_id)
+            actuador = models.Actuador(invernadero_id=inv.invernadero_id, tipo_actuador_id=tipo_a.tipo_actuador_id, estado_actuador="APAGADO")
+            db.add_all([sensor, actuador])
+            db.flush()
+            db.add(models.AccionActuador(actuador_id=actuador.actuador_id, accion_detalle="MANUAL: ON"))
+            for valor, hora in (("21.5", "2026-01-01T10:00:00Z"), ("22.5", "2026-01-01T10:00:10Z")):
+                lote.append((len(lote), schemas.MedicionCreate(sensor_id=sensor.sensor_id, valor=Decimal(valor), fecha_hora=hora)))
+        invernaderos[n] = inv.invernadero_id
+    db.commit()
+    # Las mediciones entran por la ruta de ingesta real (mantiene SENSOR_ULTIMA_LECTURA)
+    assert crud_operaciones.create_mediciones_lote(db, lote) == []
+
+    yield invernaderos
+
+    # Limpieza en orden inverso de dependencias
+    inv_ids = list(invernaderos.values())
+    sensor_ids = [s for (s,) in db.query(models.Sensor.sensor_id).filter(models.Sensor.invernadero_id.in_(inv_ids))]
+    act_ids = [a for (a,) in db.query(models.Actuador.actuador_id).filter(models.Actuador.invernadero_id.in_(inv_ids))]
+    db.query(models.SensorUltimaLectura).filter(models.SensorUltimaLectura.sensor_id.in_(sensor_ids)).delete(synchronize_session=False)
+    db.query(models.Medicion).filter(models.Medicion.sensor_id.in_(sensor_ids)).delete(synchronize_session=False)
+    db.query(models.AccionActuador).filter(models.AccionActuador.actuador_id.in_(act_ids)).delete(synchronize_session=False)
+    db.query(models.Sensor).filter(models.Sensor.sensor_id.in_(sensor_ids)).delete(synchronize_session=False)
+    db.query(models.Actuador).filter(models.Actuador.actuador_id.in_(act_ids)).delete(synchronize_session=False)
+    db.query(models.Invernadero).filter(models.Invernadero.invernadero_id.in_(inv_ids)).delete(synchronize_session=False)
+    db.delete(parcela)
+    db.delete(tipo_s)
+    db.delete(tipo_a)
+    db.delete(cliente)
+    db.commit()
+    db.close()
+
+
+def contar_consultas(cliente: TestClient, url: str):
+    """
+    Devuelve (respuesta, nº de sentencias SQL ejecutadas durante la petición).
+    Con SIRA_DB_ASYNC=1 la ruta usa el motor asíncrono: se escuchan los dos.
+    """
+    sentencias = []
+    motores = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    for motor in motores:
+        event.listen(motor, "before_cursor_execute", registrar)
+    try:
+        respuesta = cliente.get(url)
+    finally:
+        for motor in motores:
+            event.remove(motor, "before_cursor_execute", registrar)
+    return respuesta, len(sentencias)
+
+
+def test_numero_de_consultas_constante(datos):
+    cliente = TestClient(app)
+    # Calienta las cachés en memoria del proceso (catálogo de tipos, jornadas) antes de medir
+    cliente.get(f"/api/v1/iot/estado/{datos[2]}")
+
+    resp_pequeno, consultas_pequeno = contar_consultas(cliente, f"/api/v1/iot/estado/{datos[2]}")
+    resp_grande, consultas_grande = contar_consultas(cliente, f"/api/v1/iot/estado/{datos[12]}")
+
+    assert resp_pequeno.status_code == 200
+    assert resp_grande.status_code == 200
+    assert len(resp_grande.json()["sensores"]) == 12
+    assert len(resp_grande.json()["actuadores"]) == 12
+    assert consultas_pequeno > 0 # Si no se cuenta nada, la igualdad no demuestra nada
+    assert consultas_pequeno == consultas_grande
+
+
+def test_valores_y_cortesia(datos):
+    cliente = TestClient(app)
+    cuerpo = cliente.get(f"/api/v1/iot/estado/{datos[2]}").json()
+
+    # La última lectura de cada sensor es la más reciente (22.5) y los actuadores están en cortesía manual
+    assert all(float(s["valor"]) == 22.5 for s in cuerpo["sensores"])
+    assert all(a["modo_manual"] for a in cuerpo["actuadores"])
@@ -0,0 +1,57 @@
+"""
+Bus de eventos del estado en vivo (logic/eventos.py): cálculo de deltas y fan-out por
+invernadero (un recálculo por aviso, sin importar cuántos espectadores). No necesita BBDD.
+Ejecutar con: python -m pytest test_eventos.py
+"""
+import asyncio
+import threading
+
+from app.logic import eventos
+from app.logic.eventos import BusEstado, calcular_delta
+
+ESTADO = {
+    "sensores": [{"sensor_id": 1, "valor": 20.0}, {"sensor_id": 2, "valor": 50.0}],
+    "actuadores": [{"actuador_id": 7, "estado": "OFF", "modo_manual": False}],
+    "jornada_activa": True,
+}
+
+
+def test_delta_solo_con_lo_que_cambia():
+    nuevo = {**ESTADO, "sensores": [{"sensor_id": 1, "valor": 21.5}, {"sensor_id": 2, "valor": 50.0}]}
+    assert calcular_delta(ESTADO, nuevo) == {"sensores": [{"sensor_id": 1, "valor": 21.5}]}
+    assert calcular_delta(ESTADO, dict(ESTADO)) == {}
+
+    sin_actuador = {**ESTADO, "actuadores": [], "jornada_activa": False}
+    assert calcular_delta(ESTADO, sin_actuador) == {"actuadores_eliminados": [7], "jornada_activa": False}
+
+
+def test_un_recalculo_para_todos_los_espectadores(monkeypatch):
+    monkeypatch.setattr(eventos, "AGRUPAR_S", 0.01)
+    calculos = []
+
+    def calcular(invernadero_id):
+        calculos.append(invernadero_id)
+        valor = 20.0 + len(calculos)
+        return {**ESTADO, "sensores": [{"sensor_id": 1, "valor": valor}, {"sensor_id": 2, "valor": 50.0}]}
+
+    async def escenario():
+        bus = BusEstado()
+        colas = [await bus.suscribir(3, calcular) for _ in range(5)]
+        assert [c.get_nowait()[0] for c in colas] == ["snapshot"] * 5
+        assert calculos == [3] # El snapshot inicial se calcula una sola vez
+
+        # Aviso desde otro hilo (como la ingesta en el threadpool); un sensor ajeno no despierta nada
+        hilo = threading.Thread(target=lambda: (bus.notificar_sensores([1, 1]), bus.notificar_sensores([99])))
+        hilo.start()
+        hilo.join()
+        eventos_recibidos = [await asyncio.wait_for(c.get(), timeout=1) for c in colas]
+
+        assert calculos == [3, 3]
+        assert all(e == ("delta", {"sensores": [{"sensor_id": 1, "valor": 22.0}]}) for e in eventos_recibidos)
+
+        for cola in colas:
+            bus.desuscribir(3, cola)
+        assert bus.espectadores == 0
+        bus.notificar_sensores([1]) # Sin espectadores ya no se avisa a nadie
+
+    asyncio.run(escenario())
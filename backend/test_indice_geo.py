@@ -0,0 +1,53 @@
+"""
+Índice geográfico local (logic/indice_geo.py): búsqueda por CP y por prefijo de municipio
+sin tildes, sin red ni BBDD.
+Ejecutar con: python -m pytest test_indice_geo.py
+"""
+from app.logic.indice_geo import IndiceGeografico, indice_geo, plegar
+
+
+def crear_indice(tmp_path):
+    ruta = tmp_path / "cps.csv"
+    ruta.write_text(
+        "codigo_postal,municipio,provincia\n"
+        "04700,El Ejido,Almería\n"
+        "04600,Huércal-Overa,Almería\n"
+        "30880,Águilas,Murcia\n"
+        "04001,Almería,Almería\n"
+        "04002,Almería,Almería\n",
+        encoding="utf-8"
+    )
+    return IndiceGeografico(str(ruta))
+
+
+def test_plegar():
+    assert plegar("Huércal-Overa") == "huercal overa"
+    assert plegar("  ÁGUILAS ") == "aguilas"
+
+
+def test_buscar_por_cp(tmp_path):
+    indice = crear_indice(tmp_path)
+    assert indice.buscar_cp("04700") == {"codigo_postal": "04700", "municipio": "El Ejido", "provincia": "Almería", "origen": "indice"}
+    assert indice.buscar_cp("99999") is None
+    assert indice.total == 5
+
+
+def test_buscar_municipio_por_prefijo_sin_tildes(tmp_path):
+    indice = crear_indice(tmp_path)
+    assert [r["codigo_postal"] for r in indice.buscar_municipio("agui")] == ["30880"]
+    assert [r["codigo_postal"] for r in indice.buscar_municipio("ejido")] == ["04700"] # Palabra intermedia
+    assert [r["codigo_postal"] for r in indice.buscar_municipio("Huercal Overa")] == ["04600"]
+    assert [r["codigo_postal"] for r in indice.buscar_municipio("almer")] == ["04001", "04002"]
+    assert len(indice.buscar_municipio("almer", limite=1)) == 1
+    assert indice.buscar_municipio("zzz") == []
+
+
+def test_fichero_inexistente_no_rompe(tmp_path):
+    indice = IndiceGeografico(str(tmp_path / "no_existe.csv"))
+    assert indice.buscar_cp("04700") is None
+    assert indice.buscar_municipio("ejido") == []
+
+
+def test_dataset_empaquetado():
+    assert indice_geo.buscar_cp("04700")["municipio"] == "El Ejido"
+    assert indice_geo.buscar_cp("28001")["provincia"] == "Madrid"
@@ -0,0 +1,92 @@
+"""
+Comprueba que crud_infraestructura.get_jerarquia_datos monta el árbol del dashboard con un
+número FIJO de consultas (una), independientemente de cuántas parcelas e invernaderos tenga
+el cliente, y que respeta el orden y el filtro de archivados.
+Usa una BBDD SQLite en memoria propia (la consulta es SQL estándar).
+Ejecutar con: python -m pytest test_jerarquia_queries.py
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.crud import crud_infraestructura
+
+
+@pytest.fixture
+def db():
+    motor = create_engine("sqlite://")
+    models.Base.metadata.create_all(motor)
+    sesion = sessionmaker(bind=motor)()
+    yield sesion
+    sesion.close()
+    motor.dispose()
+
+
+def crear_cliente(db, n_parcelas: int, naves_por_parcela: int) -> int:
+    """Cliente con parcelas repartidas en 3 localidades; la última nave de cada parcela archivada."""
+    cliente = models.Cliente(nombre_empresa="QC", cif=f"TQJ{n_parcelas:06d}", email_admin="qc@sira.es",
+                             telefono="600000000", persona_contacto="QC", hash_contrasena="x")
+    cultivo = models.Cultivo(nombre_cultivo=f"QC Tomate {n_parcelas}")
+    localidades = [models.Localidad(codigo_postal=f"9{n_parcelas % 100:02d}{i:02d}", municipio=f"M{i}", provincia="QC")
+                   for i in range(3)]
+    db.add_all([cliente, cultivo, *localidades])
+    db.flush()
+    for p in range(n_parcelas):
+        # Localidades en orden inverso al de las parcelas: el árbol debe seguir el de la primera parcela
+        parcela = models.Parcela(cliente_id=cliente.cliente_id, codigo_postal=localidades[-1 - p % 3].codigo_postal,
+                                 direccion=f"D{p}", ref_catastral=f"{n_parcelas:04d}{p:010d}")
+        db.add(parcela)
+        db.flush()
+        db.add_all([
+            models.Invernadero(parcela_id=parcela.parcela_id, nombre=f"N{p}-{n}", largo_m=10, ancho_m=5,
+                               cultivo_id=cultivo.cultivo_id if n % 2 == 0 else None,
+                               activa=n < naves_por_parcela - 1)
+            for n in range(naves_por_parcela)
+        ])
+    db.commit()
+    return cliente.cliente_id
+
+
+def contar_consultas(db, funcion):
+    consultas = []
+    motor = db.get_bind()
+    registrar = lambda *args: consultas.append(1)
+    event.listen(motor, "before_cursor_execute", registrar)
+    try:
+        resultado = funcion()
+    finally:
+        event.remove(motor, "before_cursor_execute", registrar)
+    return resultado, len(consultas)
+
+
+def test_numero_de_consultas_fijo(db):
+    pequeno = crear_cliente(db, n_parcelas=3, naves_por_parcela=2)
+    grande = crear_cliente(db, n_parcelas=60, naves_por_parcela=4)
+    db.expire_all()
+
+    _, consultas_pequeno = contar_consultas(db, lambda: crud_infraestructura.get_jerarquia_datos(db, pequeno))
+    arbol, consultas_grande = contar_consultas(db, lambda: crud_infraestructura.get_jerarquia_datos(db, grande))
+
+    assert consultas_pequeno == consultas_grande == 1
+    assert sum(loc["num_parcelas"] for loc in arbol) == 60
+    assert sum(loc["num_invernaderos_total"] for loc in arbol) == 60 * 3
+
+
+def test_orden_y_archivados(db):
+    cliente_id = crear_cliente(db, n_parcelas=4, naves_por_parcela=3)
+
+    arbol = crud_infraestructura.get_jerarquia_datos(db, cliente_id)
+    primeras = [loc["parcelas"][0]["parcela_id"] for loc in arbol]
+    assert primeras == sorted(primeras) # Localidades en el orden de su primera parcela
+    for loc in arbol:
+        ids = [p["parcela_id"] for p in loc["parcelas"]]
+        assert ids == sorted(ids)
+        for parcela in loc["parcelas"]:
+            naves = parcela["invernaderos"]
+            assert [n["invernadero_id"] for n in naves] == sorted(n["invernadero_id"] for n in naves)
+            assert parcela["num_invernaderos"] == len(naves) == 2 and all(n["activa"] for n in naves)
+            assert [n["cultivo"] for n in naves] == ["QC Tomate 4", None]
+
+    completo = crud_infraestructura.get_jerarquia_datos(db, cliente_id, activa_only=False)
+    assert sum(loc["num_invernaderos_total"] for loc in completo) == 4 * 3
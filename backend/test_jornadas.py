@@ -0,0 +1,72 @@
+"""
+Resolutor de jornada laboral (logic/jornadas.py): reglas por día de la semana,
+herencia de la jornada del cliente y caché/invalidación. No necesita BBDD
+(las filas de JORNADA_CONFIG se inyectan con un cargador en memoria).
+Ejecutar con: python -m pytest test_jornadas.py
+"""
+from datetime import datetime, time
+
+from app.logic.jornadas import ResolutorJornadas
+
+# 2026-10-19 es lunes (clave "1") y 2026-10-18 domingo (clave "0")
+LUNES = datetime(2026, 10, 19, 12, 0)
+DOMINGO = datetime(2026, 10, 18, 12, 0)
+
+
+def resolutor_con(filas: dict):
+    """filas: {("cliente" | "inv", id): config}. Devuelve (resolutor, nº de cargas)."""
+    cargas = []
+
+    def cargador():
+        cargas.append(1)
+        return [(ambito_id if ambito == "cliente" else None, ambito_id if ambito == "inv" else None, config)
+                for (ambito, ambito_id), config in filas.items()]
+
+    return ResolutorJornadas(cargador), cargas
+
+
+def test_dias_de_la_semana_y_laborable():
+    resolutor, _ = resolutor_con({("cliente", 1): {
+        "es_laborable": True,
+        "default": [{"inicio": "08:00", "fin": "14:00"}],
+        "0": [],                                      # Domingo libre
+        "1": [{"inicio": "16:00", "fin": "20:00"}],   # Lunes de tarde
+        "2": None                                     # Martes -> default
+    }})
+
+    assert resolutor.en_jornada(1, momento=LUNES) == (False, True)
+    assert resolutor.en_jornada(1, momento=LUNES, hora_test=time(17, 30)) == (True, True)
+    assert resolutor.en_jornada(1, momento=DOMINGO) == (False, True)
+    assert resolutor.en_jornada(1, momento=datetime(2026, 10, 20, 14, 0)) == (True, True) # Fin inclusivo
+    assert resolutor.en_jornada(2, momento=LUNES) == (False, False) # Sin configuración
+
+
+def test_invernadero_propio_o_heredado():
+    resolutor, _ = resolutor_con({
+        ("cliente", 1): {"default": [{"inicio": "08:00", "fin": "14:00"}]},
+        ("inv", 10): {"heredar_de_global": False, "default": [{"inicio": "20:00", "fin": "23:00"}]},
+        ("inv", 11): {"heredar_de_global": True, "default": []},
+        ("inv", 12): {"es_laborable": False, "default": [{"inicio": "00:00", "fin": "23:59"}]}
+    })
+
+    assert resolutor.en_jornada(1, invernadero_id=10, momento=LUNES) == (False, True)
+    assert resolutor.en_jornada(1, invernadero_id=11, momento=LUNES) == (True, True)
+    assert resolutor.en_jornada(1, invernadero_id=12, momento=LUNES) == (False, True) # Almacén
+    assert resolutor.en_jornada(1, invernadero_id=13, momento=LUNES) == (True, True)  # Sin fila -> cliente
+
+
+def test_cache_e_invalidacion():
+    filas = {("cliente", 1): {"default": [{"inicio": "08:00", "fin": "14:00"}]}}
+    resolutor, cargas = resolutor_con(filas)
+    assert resolutor.en_jornada(1, momento=LUNES) == (True, True)
+    assert resolutor.en_jornada(1, momento=LUNES) == (True, True)
+    assert len(cargas) == 1 # Una sola carga para todas las consultas
+
+    # Cambio en BBDD: dentro de la ventana de revalidación se sigue usando la caché...
+    filas[("cliente", 1)] = {"default": []}
+    assert resolutor.en_jornada(1, momento=LUNES) == (True, True)
+
+    # ...hasta que el guardado invalida explícitamente
+    resolutor.invalidar()
+    assert resolutor.en_jornada(1, momento=LUNES) == (False, True)
+    assert len(cargas) == 2
@@ -0,0 +1,129 @@
+"""
+Paginación por cursor (crud/paginacion.py): recorrer un listado página a página con
+X-Next-Cursor devuelve exactamente las mismas filas, en el mismo orden, que el listado completo,
+también con órdenes mixtos (clientes: en línea DESC, rol ASC, id ASC) y claves repetidas, y que un
+cursor con valores de otro tipo responde 400.
+Usa una BBDD SQLite en memoria propia.
+Ejecutar con: python -m pytest test_paginacion.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.crud import crud_clientes, crud_cultivos, crud_operaciones
+from app.crud.paginacion import codificar_cursor, decodificar_cursor
+
+
+@pytest.fixture
+def db():
+    motor = create_engine("sqlite://")
+    models.Base.metadata.create_all(motor)
+    sesion = sessionmaker(bind=motor)()
+    yield sesion
+    sesion.close()
+    motor.dispose()
+
+
+def recorrer(listar, limite: int) -> list:
+    """Pide páginas de 'limite' siguiendo el cursor hasta el final."""
+    filas, cursor, paginas = [], None, 0
+    while True:
+        pagina, cursor = listar(limit=limite, cursor=cursor)
+        assert len(pagina) <= limite
+        filas.extend(pagina)
+        paginas += 1
+        if cursor is None:
+            return filas
+        assert paginas < 100
+
+
+def test_cursor_ida_y_vuelta():
+    ahora = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+    datos = decodificar_cursor(codificar_cursor([ahora, 7, "Tomate"], umbral=ahora))
+    assert datos == {"k": [ahora, 7, "Tomate"], "umbral": ahora}
+    for malo in ("no-es-un-cursor", codificar_cursor([1])[:-3] + "!!!", ""):
+        with pytest.raises(HTTPException) as error:
+            decodificar_cursor(malo)
+        assert error.value.status_code == 400
+
+
+def crear_clientes(db, total: int = 23):
+    """Un tercio en línea, con roles repetidos."""
+    ahora = datetime.now()
+    roles = ["cliente", "admin", "cliente", "root", "cliente", "admin", "cliente"]
+    for i in range(total):
+        en_linea = i % 3 == 0
+        db.add(models.Cliente(nombre_empresa=f"Empresa {i}", cif=f"TQP{i:06d}", email_admin=f"e{i}@sira.es",
+                              telefono="600000000", persona_contacto="QC", hash_contrasena="x", rol=roles[i % len(roles)],
+                              session_id="s" if en_linea else None,
+                              ultima_actividad=ahora if en_linea else ahora - timedelta(days=1)))
+    db.commit()
+
+
+def test_clientes_orden_mixto(db):
+    crear_clientes(db)
+    completo, ultimo = crud_clientes.get_clientes(db, limit=1000)
+    assert ultimo is None and len(completo) == 23
+    paginado = recorrer(lambda **kw: crud_clientes.get_clientes(db, **kw), limite=4)
+    assert [c.cliente_id for c in paginado] == [c.cliente_id for c in completo]
+    assert completo[0].rol == "root" or completo[0].session_id # En línea primero
+    # 8 en línea: con páginas de 8 la primera agota ese tramo y el cursor abre el resto
+    assert [c.cliente_id for c in recorrer(lambda **kw: crud_clientes.get_clientes(db, **kw), limite=8)] == \
+        [c.cliente_id for c in completo]
+    # OFFSET heredado, también cruzando de un tramo a otro
+    for saltar in (0, 5, 8, 12, 30):
+        pagina, _ = crud_clientes.get_clientes(db, skip=saltar, limit=6)
+        assert [c.cliente_id for c in pagina] == [c.cliente_id for c in completo[saltar:saltar + 6]]
+
+
+def test_cursor_con_valores_de_otro_tipo(db):
+    crear_clientes(db, total=5)
+    _, cursor = crud_clientes.get_clientes(db, limit=1)
+    datos = decodificar_cursor(cursor)
+    manipulados = [
+        codificar_cursor(["0", 1], umbral=datos["umbral"]),                    # Texto en una clave entera
+        codificar_cursor([0, True], umbral=datos["umbral"]),                   # Booleano no es un id
+        codificar_cursor([0, None], umbral=datos["umbral"]),
+        codificar_cursor(datos["k"], umbral="ayer"),                          # Umbral que no es fecha
+        codificar_cursor(datos["k"], umbral=datos["umbral"], tramo="todos"),
+    ]
+    for cursor in manipulados:
+        with pytest.raises(HTTPException) as error:
+            crud_clientes.get_clientes(db, limit=1, cursor=cursor)
+        assert error.value.status_code == 400
+    with pytest.raises(HTTPException):
+        crud_cultivos.get_cultivos(db, cursor=codificar_cursor([7]))
+
+
+def test_cultivos_con_filas_de_la_consulta(db):
+    db.add_all([models.Cultivo(nombre_cultivo=f"Cultivo {i:02d}") for i in range(11)])
+    db.add(models.Cultivo(nombre_cultivo="Archivado", activa=False))
+    db.commit()
+
+    paginado = recorrer(lambda **kw: crud_cultivos.get_cultivos(db, **kw), limite=3)
+    assert [c.nombre_cultivo for c, _ in paginado] == [f"Cultivo {i:02d}" for i in range(11)]
+    assert len(recorrer(lambda **kw: crud_cultivos.get_cultivos(db, ver_inactivos=True, **kw), limite=5)) == 12
+
+
+def test_mediciones_con_fechas_repetidas(db):
+    tipo = models.TipoSensor(nombre_tipo="QC Temperatura", unidad_medida="ºC")
+    db.add(tipo)
+    db.flush()
+    sensor = models.Sensor(invernadero_id=None, tipo_sensor_id=tipo.tipo_sensor_id)
+    db.add(sensor)
+    db.flush()
+    base = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    # Lotes de 3 mediciones con la misma fecha: medicion_id desempata
+    db.add_all([models.Medicion(sensor_id=sensor.sensor_id, valor=i, fecha_hora=base + timedelta(minutes=i // 3))
+                for i in range(20)])
+    db.commit()
+
+    esperado = [m.medicion_id for m in db.query(models.Medicion).order_by(models.Medicion.fecha_hora.desc(),
+                                                                          models.Medicion.medicion_id.desc())]
+    paginado = recorrer(lambda **kw: crud_operaciones.get_mediciones_sensor(db, sensor.sensor_id, **kw), limite=4)
+    assert [m.medicion_id for m in paginado] == esperado
+    assert [m.medicion_id for m in recorrer(lambda **kw: crud_operaciones.get_mediciones(db, **kw), limite=7)] == esperado
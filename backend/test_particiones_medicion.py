@@ -0,0 +1,74 @@
+"""
+Comprueba que crear una partición mensual de MEDICION mueve a ella las filas de ese mes que ya
+hubieran caído en medicion_default (antes, CREATE TABLE ... PARTITION OF fallaba y ese mes y
+todos los siguientes se quedaban en la DEFAULT), y que el mantenimiento es idempotente.
+
+Requiere una BBDD PostgreSQL accesible en DATABASE_URL con database/30-particionado-medicion.sql.
+Ejecutar con: DATABASE_URL=postgresql://... python -m pytest test_particiones_medicion.py
+"""
+import os
+import pytest
+
+if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+    pytest.skip("Necesita DATABASE_URL apuntando a PostgreSQL", allow_module_level=True)
+
+from datetime import date, datetime, timezone
+
+from app.database import SessionLocal, engine
+from app.logic.mantenimiento_medicion import ejecutar_mantenimiento
+
+MESES_ADELANTE = 14 # Más allá de lo que pre-crea el despliegue (3 meses)
+RUTA_PARTICIONADO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "30-particionado-medicion.sql")
+
+
+def mes_futuro(meses: int) -> date:
+    hoy = date.today()
+    indice = hoy.year * 12 + hoy.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+@pytest.fixture
+def fila_en_default():
+    # Versión actual de las funciones (el script es idempotente)
+    with open(RUTA_PARTICIONADO, encoding="utf-8") as f, engine.begin() as conn:
+        conn.exec_driver_sql(f.read(), execution_options={"no_parameters": True})
+
+    mes = mes_futuro(MESES_ADELANTE)
+    nombre = f"medicion_{mes:%Y_%m}"
+    with engine.begin() as conn:
+        sensor_id = conn.exec_driver_sql("SELECT min(sensor_id) FROM sensor").scalar()
+        if sensor_id is None:
+            pytest.skip("La BBDD no tiene sensores")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {nombre}")
+        medicion_id = conn.exec_driver_sql(
+            "INSERT INTO medicion (sensor_id, fecha_hora, valor) VALUES (%(s)s, %(f)s, 21.5) RETURNING medicion_id",
+            {"s": sensor_id, "f": datetime(mes.year, mes.month, 15, 12, tzinfo=timezone.utc)},
+        ).scalar()
+    yield nombre, medicion_id
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {nombre}")
+        conn.exec_driver_sql("DELETE FROM medicion_default WHERE medicion_id = %(m)s", {"m": medicion_id})
+
+
+def test_crear_particion_mueve_las_filas_de_la_default(fila_en_default):
+    nombre, medicion_id = fila_en_default
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            "SELECT tableoid::regclass::text FROM medicion WHERE medicion_id = %(m)s", {"m": medicion_id}
+        ).scalar() == "medicion_default"
+
+    with SessionLocal() as db:
+        creadas, sueltas = ejecutar_mantenimiento(db, MESES_ADELANTE, 0)
+        assert creadas >= 1 and sueltas == []
+        # Segunda pasada (otro worker, el siguiente intervalo): nada que hacer
+        assert ejecutar_mantenimiento(db, MESES_ADELANTE, 0) == (0, [])
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            "SELECT tableoid::regclass::text FROM medicion WHERE medicion_id = %(m)s", {"m": medicion_id}
+        ).scalar() == nombre
+        # Enganchada de verdad: hereda la PK e índices de MEDICION
+        indices = conn.exec_driver_sql(
+            "SELECT count(*) FROM pg_indexes WHERE tablename = %(t)s", {"t": nombre}
+        ).scalar()
+        assert indices >= 3
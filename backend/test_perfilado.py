@@ -0,0 +1,123 @@
+"""
+Métricas y perfilado por petición (logic/perfilado.py): plantilla de ruta, consultas y filas
+contadas también en rutas 'def' (threadpool), exposición Prometheus y perfiles de las peticiones
+que superan el umbral (con rotación), y los streams SSE fuera del perfilado y de los histogramas.
+App FastAPI mínima sobre SQLite en memoria.
+Ejecutar con: python -m pytest test_perfilado.py
+"""
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.logic import perfilado as modulo
+from app.logic.perfilado import MetricasPeticiones, MiddlewarePerfilado
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(modulo, "metricas", MetricasPeticiones())
+    motor = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    modulo.instrumentar_motor(motor)
+    modulo.instrumentar_motor(motor) # Idempotente: no duplica los eventos
+    with motor.begin() as conexion:
+        conexion.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)"))
+
+    app = FastAPI()
+    app.add_middleware(MiddlewarePerfilado)
+
+    @app.post("/items/{item_id}")
+    def escribir(item_id: int):
+        with motor.begin() as conexion:
+            conexion.execute(text("INSERT INTO t (id, v) VALUES (:id, 1), (:id2, 2)"), {"id": item_id, "id2": item_id + 1000})
+            conexion.execute(text("UPDATE t SET v = v + 1 WHERE id >= :id"), {"id": item_id})
+            return {"total": conexion.execute(text("SELECT count(*) FROM t")).scalar()}
+
+    @app.get("/fallo")
+    async def fallo():
+        with motor.connect() as conexion:
+            conexion.execute(text("SELECT * FROM no_existe"))
+
+    @app.get("/eventos")
+    def eventos():
+        def generar():
+            with motor.connect() as conexion:
+                yield f"data: {conexion.execute(text('SELECT count(*) FROM t')).scalar()}\n\n"
+        return StreamingResponse(generar(), media_type="text/event-stream")
+
+    @app.get(modulo.RUTA_METRICAS)
+    def exponer():
+        return PlainTextResponse(modulo.metricas.prometheus())
+
+    yield TestClient(app, raise_server_exceptions=False)
+    motor.dispose()
+
+
+def linea(texto: str, prefijo: str) -> float:
+    return float(next(l for l in texto.splitlines() if l.startswith(prefijo)).rsplit(" ", 1)[1])
+
+
+def test_metricas_por_plantilla_de_ruta(cliente):
+    assert cliente.post("/items/1").status_code == 200
+    assert cliente.post("/items/5").status_code == 200
+    assert cliente.get("/fallo").status_code == 500
+    assert cliente.get("/no-hay-ruta").status_code == 404
+
+    texto = cliente.get("/metrics").text
+    etiquetas = 'metodo="POST",ruta="/items/{item_id}"'
+    assert linea(texto, f'sira_http_peticiones_total{{{etiquetas},estado="200"}}') == 2
+    assert linea(texto, f"sira_http_duracion_segundos_count{{{etiquetas}}}") == 2
+    # 3 consultas por petición, en el threadpool; filas afectadas: 2 del INSERT + las del UPDATE
+    assert linea(texto, f"sira_bd_consultas_por_peticion_sum{{{etiquetas}}}") == 6
+    assert linea(texto, f'sira_bd_consultas_por_peticion_bucket{{{etiquetas},le="2"}}') == 0
+    assert linea(texto, f'sira_bd_consultas_por_peticion_bucket{{{etiquetas},le="5"}}') == 2
+    assert linea(texto, f"sira_bd_filas_total{{{etiquetas}}}") == 2 + 2 + 2 + 3
+    assert linea(texto, f"sira_bd_tiempo_segundos_total{{{etiquetas}}}") > 0
+
+    assert linea(texto, 'sira_http_peticiones_total{metodo="GET",ruta="/fallo",estado="500"}') == 1
+    assert linea(texto, 'sira_bd_consultas_por_peticion_sum{metodo="GET",ruta="/fallo"}') == 0
+    assert linea(texto, 'sira_http_peticiones_total{metodo="GET",ruta="sin_ruta",estado="404"}') == 1
+    assert 'ruta="/metrics"' not in texto
+
+
+def test_perfiles_de_peticiones_lentas_con_rotacion(cliente, monkeypatch, tmp_path):
+    monkeypatch.setattr(modulo, "PERFIL_DIR", str(tmp_path))
+    monkeypatch.setattr(modulo, "PERFIL_MAX_FICHEROS", 2)
+    monkeypatch.setattr(modulo, "PERFIL_UMBRAL_MS", 60_000)
+    cliente.post("/items/1")
+    assert not os.listdir(tmp_path) # Por debajo del umbral no se guarda nada
+
+    monkeypatch.setattr(modulo, "PERFIL_UMBRAL_MS", 0.001)
+    for i in range(3):
+        cliente.post(f"/items/{10 + i}")
+
+    ficheros = sorted(os.listdir(tmp_path))
+    sql = [f for f in ficheros if f.endswith(".sql.txt")]
+    perfiles = [f for f in ficheros if not f.endswith(".sql.txt")]
+    assert len(sql) == len(perfiles) == 2 and all("_POST_items_item_id_" in f for f in ficheros)
+    with open(tmp_path / sql[-1], encoding="utf-8") as f:
+        contenido = f.read()
+    assert "3 consultas" in contenido and "INSERT INTO t" in contenido
+    assert linea(cliente.get("/metrics").text, "sira_perfiles_guardados_total") == 3
+
+
+def test_streams_sse_ni_se_perfilan_ni_entran_en_los_histogramas(cliente, monkeypatch, tmp_path):
+    monkeypatch.setattr(modulo, "PERFIL_DIR", str(tmp_path))
+    monkeypatch.setattr(modulo, "PERFIL_UMBRAL_MS", 0.001)
+    respuesta = cliente.get("/eventos")
+    assert respuesta.status_code == 200 and respuesta.text.startswith("data: ")
+    assert not os.listdir(tmp_path)
+    assert not modulo._perfilando.locked() # Se soltó al ver la cabecera text/event-stream
+
+    cliente.post("/items/1") # La siguiente petición normal sí se perfila
+    assert len(os.listdir(tmp_path)) == 2
+
+    texto = cliente.get("/metrics").text
+    assert linea(texto, 'sira_http_peticiones_total{metodo="GET",ruta="/eventos",estado="200"}') == 1
+    assert 'sira_http_duracion_segundos_count{metodo="GET",ruta="/eventos"}' not in texto
+    assert 'sira_bd_consultas_por_peticion_count{metodo="GET",ruta="/eventos"}' not in texto
+    assert linea(texto, "sira_perfiles_guardados_total") == 1
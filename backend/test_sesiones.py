@@ -0,0 +1,57 @@
+"""
+Caché de sesiones (logic/sesiones.py): validación (cif, sid) con TTL, invalidación y
+fusión de la actividad pendiente con la de la BBDD. No necesita BBDD.
+Ejecutar con: python -m pytest test_sesiones.py
+"""
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.logic import sesiones as modulo
+from app.logic.sesiones import CacheSesiones
+
+
+class SesionFalsa:
+    """Sustituye a la Session: merge(load=False) solo devuelve el objeto."""
+    def merge(self, obj, load=True):
+        return obj
+
+
+def cliente_prueba():
+    return models.Cliente(cliente_id=7, cif="TQC000007", nombre_empresa="QC", email_admin="qc@sira.es",
+                          telefono="600000000", persona_contacto="QC", hash_contrasena="x", session_id="sid-1")
+
+
+def test_validacion_cacheada_y_sid_distinto():
+    cache = CacheSesiones()
+    cache.guardar("TQC000007", "sid-1", cliente_prueba())
+
+    user = cache.obtener(SesionFalsa(), "TQC000007", "sid-1")
+    assert user is not None and user.cliente_id == 7 and user.session_id == "sid-1"
+    # Un token con otro SID nunca sale de la caché (va a la BBDD y allí se rechaza)
+    assert cache.obtener(SesionFalsa(), "TQC000007", "sid-viejo") is None
+
+
+def test_invalidar_y_caducidad(monkeypatch):
+    cache = CacheSesiones()
+    cache.guardar("TQC000007", "sid-1", cliente_prueba())
+    cache.invalidar("TQC000007")
+    assert cache.obtener(SesionFalsa(), "TQC000007", "sid-1") is None
+
+    monkeypatch.setattr(modulo, "CACHE_TTL_S", -1)
+    cache.guardar("TQC000007", "sid-1", cliente_prueba())
+    assert cache.obtener(SesionFalsa(), "TQC000007", "sid-1") is None
+
+
+def test_ultima_actividad_usa_la_mas_reciente():
+    cache = CacheSesiones()
+    hace_40 = (datetime.now(timezone.utc) - timedelta(minutes=40)).replace(tzinfo=None)
+
+    # Sin actividad pendiente manda la BBDD (naive se interpreta como UTC)
+    assert cache.ultima_actividad(7, hace_40) == hace_40.replace(tzinfo=timezone.utc)
+    assert cache.ultima_actividad(7, None) is None
+
+    cache.marcar_actividad(7)
+    assert datetime.now(timezone.utc) - cache.ultima_actividad(7, hace_40) < timedelta(seconds=5)
+
+    cache.descartar_actividad(7)
+    assert cache.ultima_actividad(7, hace_40) == hace_40.replace(tzinfo=timezone.utc)
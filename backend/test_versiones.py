@@ -0,0 +1,48 @@
+"""
+Versiones para ETag (logic/versiones.py): qué escrituras cambian el ETag de un invernadero
+o de un cliente y cómo se interpreta If-None-Match. No necesita BBDD.
+Ejecutar con: python -m pytest test_versiones.py
+"""
+from app.logic.versiones import Versiones, no_modificado
+
+
+def test_escrituras_de_sus_dispositivos_cambian_el_etag():
+    v = Versiones()
+    v.registrar_dispositivos(1, sensor_ids=[10, 11], actuador_ids=[20])
+    inicial = v.etag_invernadero(1)
+
+    v.cambio_sensores([99]) # Sensor de otro invernadero (o nunca servido)
+    assert v.etag_invernadero(1) == inicial
+
+    v.cambio_sensores([11])
+    tras_medicion = v.etag_invernadero(1)
+    assert tras_medicion != inicial
+
+    v.cambio_actuadores([20])
+    assert v.etag_invernadero(1) != tras_medicion
+
+
+def test_variantes_clientes_y_cambio_global():
+    v = Versiones()
+    assert v.etag_invernadero(1, "08:00") != v.etag_invernadero(1, None)
+    assert v.etag_cliente(5, False) != v.etag_cliente(5, True)
+
+    antes_5, antes_6 = v.etag_cliente(5, False), v.etag_cliente(6, False)
+    v.cambio_cliente(5, None)
+    assert v.etag_cliente(5, False) != antes_5
+    assert v.etag_cliente(6, False) == antes_6
+
+    v.cambio_global()
+    assert v.etag_cliente(6, False) != antes_6
+
+
+def test_if_none_match():
+    etag = Versiones().etag_cliente(1)
+    assert etag.startswith('W/"') # Débil: cambios de fuera del proceso tardan hasta ETAG_VENTANA_S
+    assert no_modificado(etag, etag)
+    assert no_modificado(etag.removeprefix("W/"), etag)
+    assert no_modificado(f'"otro", {etag}', etag)
+    assert no_modificado("*", etag)
+    assert not no_modificado(None, etag)
+    # Un ETag de otro proceso (u otro arranque) nunca coincide
+    assert not no_modificado(Versiones().etag_cliente(1), etag)
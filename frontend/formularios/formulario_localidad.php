@@ -51,7 +51,7 @@ if ($_SERVER["REQUEST_METHOD"] == "POST") {
                 $municipio = $data['municipio'];
                 $provincia = $data['provincia'];
                 $cp_confirmado = $cp;
-                $geo_status_msg = ($data['origen'] === 'local') ? "✅ Localidad ya registrada." : "🌍 Datos de API externa.";
+                $geo_status_msg = ($data['origen'] === 'local') ? "✅ Localidad ya registrada." : (($data['origen'] === 'indice') ? "📚 Datos del callejero de SIRA." : "🌍 Datos de API externa.");
             } else {
                 $error_msg = "Código Postal no reconocido.";
                 $cp_confirmado = "";
@@ -1,9 +1,46 @@
-import psycopg2
-import time
-import random
+"""
+Simulador IoT / Generador de Carga de SIRA (asyncio).
+
+Simula miles de invernaderos enviando telemetría para dimensionar la ingesta de producción:
+  - Cada invernadero es una corrutina que lee TODOS sus sensores cada --intervalo segundos
+    (± --jitter) y deja las lecturas en un búfer común.
+  - Los escritores (--concurrencia) vacían el búfer en lotes de hasta --lote lecturas:
+      · destino 'api' (por defecto): POST /api/v1/iot/mediciones/batch (httpx), la ruta real
+        de los ESP32.
+      · destino 'bd': COPY (asyncpg) a una tabla temporal y, en la misma transacción, un único
+        INSERT en MEDICION que mantiene también SENSOR_ULTIMA_LECTURA y MEDICION_AGREGADA con
+        los mismos UPSERT que la API (crud_operaciones). Mide la capacidad de la BBDD sin la
+        API delante; los avisos en vivo (SSE) de la API no se enteran de estas lecturas.
+  - Cada sensor sigue un modelo de deriva propio (proceso de Ornstein-Uhlenbeck que vuelve
+    al valor del escenario; la lluvia es una cadena de Markov 0/1). Los escenarios salen de
+    backend/app/logic/presets_clima.json; 'mixto' reparte uno al azar por invernadero.
+  - Cada --informe segundos (y al terminar) muestra: lecturas/s conseguidas frente a las
+    esperadas, latencia por lote p50/p95/p99, retraso lectura->guardado, búfer pendiente y errores.
+
+Los invernaderos y sensores son los reales de la BBDD (sensores 'Activo'). Con --provisionar se
+crean los invernaderos sintéticos que falten hasta --invernaderos (cliente 'SIMCARGA1', inactivo),
+y --limpiar los borra junto con sus mediciones.
+
+Uso:
+    python scripts/simulador.py --clima ideal
+    python scripts/simulador.py --invernaderos 2000 --provisionar --api-url http://localhost:8000 --duracion 300
+    python scripts/simulador.py --invernaderos 2000 --provisionar --destino bd --duracion 300
+    python scripts/simulador.py --limpiar
+
+Dependencias: asyncpg (inventario y destino 'bd') y httpx (destino 'api').
+"""
 import argparse
+import asyncio
+import json
+import math
 import os
-from datetime import datetime
+import random
+import signal
+import statistics
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from decimal import Decimal
 
 # --- Configuración de Base de Datos ---
 # Prioridad: Variables de entorno (Docker) > .env > Valores por defecto
@@ -13,84 +50,441 @@ DB_NAME = os.getenv("DB_NAME", "sira_db")
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
-def get_connection():
-    try:
-        conn = psycopg2.connect(
-            user=DB_USER,
-            password=DB_PASS,
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME
+RUTA_PRESETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "backend", "app", "logic", "presets_clima.json")
+
+# Resoluciones de MEDICION_AGREGADA en segundos (las de crud_operaciones.RESOLUCIONES_AGREGADO)
+RESOLUCIONES_AGREGADO = (60, 900, 3600)
+
+# Invernaderos sintéticos (--provisionar / --limpiar)
+CIF_SIMULADOR = "SIMCARGA1"
+INVERNADEROS_POR_PARCELA = 100
+
+# --- Modelos de deriva por tipo de sensor ---
+# (sigma: ruido por raíz de segundo, theta: fuerza de vuelta al escenario por segundo, mínimo, máximo)
+DERIVA = {
+    "temperatura": (0.05, 0.002, -10.0, 55.0),
+    "humedad_aire": (0.15, 0.002, 0.0, 100.0),
+    "humedad_suelo": (0.03, 0.001, 0.0, 100.0),
+    "viento": (0.60, 0.010, 0.0, 150.0),
+    "luz": (8.00, 0.005, 0.0, 1400.0),
+}
+HUMEDAD_AIRE_BASE = 60.0 # Los escenarios no fijan la humedad relativa
+PROB_CAMBIO_LLUVIA = 0.002 # Por segundo: ~1 cambio cada 8 minutos
+
+
+def clave_sensor(nombre_tipo: str) -> str:
+    """Tipo de sensor -> clave del escenario (como control_brain.map_sensor_type, con humedad del aire)."""
+    nombre = nombre_tipo.lower()
+    if "temp" in nombre: return "temperatura"
+    if "luz" in nombre or "rad" in nombre or "sol" in nombre: return "luz"
+    if "suelo" in nombre: return "humedad_suelo"
+    if "hum" in nombre: return "humedad_aire"
+    if "vient" in nombre or "aire" in nombre: return "viento"
+    if "lluv" in nombre or "agua" in nombre: return "lluvia"
+    return "temperatura"
+
+
+def objetivo(escenario: dict, clave: str) -> float:
+    return escenario["sensores"].get(clave, HUMEDAD_AIRE_BASE if clave == "humedad_aire" else 0.0)
+
+
+class SensorSimulado:
+    __slots__ = ("sensor_id", "clave", "valor")
+
+    def __init__(self, sensor_id: int, clave: str, escenario: dict):
+        self.sensor_id = sensor_id
+        self.clave = clave
+        base = objetivo(escenario, clave)
+        self.valor = base if clave == "lluvia" else base * random.uniform(0.9, 1.1)
+
+    def avanzar(self, escenario: dict, dt: float, escala: float) -> float:
+        if self.clave == "lluvia":
+            if random.random() < PROB_CAMBIO_LLUVIA * dt * escala:
+                self.valor = 1.0 - self.valor
+            return self.valor
+        sigma, theta, minimo, maximo = DERIVA[self.clave]
+        deriva = theta * (objetivo(escenario, self.clave) - self.valor) * dt
+        ruido = sigma * escala * math.sqrt(dt) * random.gauss(0, 1)
+        self.valor = min(maximo, max(minimo, self.valor + deriva + ruido))
+        return self.valor
+
+
+class Metricas:
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.generadas = 0
+        self.escritas = 0
+        self.rechazadas = 0
+        self.perdidas = 0
+        self.lotes = 0
+        self.errores = Counter()
+        self.latencias_ms = []
+        self.retrasos_ms = []
+        self._ventana = (self.inicio, 0, 0, 0) # (instante, escritas, índice latencias, índice retrasos)
+
+    @staticmethod
+    def percentiles(valores: list) -> str:
+        if len(valores) < 2:
+            return "p50=- p95=- p99=-"
+        q = statistics.quantiles(valores, n=100)
+        return f"p50={q[49]:.0f} p95={q[94]:.0f} p99={q[98]:.0f}"
+
+    def informe(self, esperadas_s: float, pendientes: int) -> str:
+        ahora = time.monotonic()
+        instante, escritas, i_lat, i_ret = self._ventana
+        self._ventana = (ahora, self.escritas, len(self.latencias_ms), len(self.retrasos_ms))
+        ritmo = (self.escritas - escritas) / max(ahora - instante, 1e-9)
+        errores = sum(self.errores.values())
+        return (f"⏱️ {ahora - self.inicio:6.0f}s | {ritmo:8.0f} lect/s (esperadas {esperadas_s:.0f}) | "
+                f"lote ms {self.percentiles(self.latencias_ms[i_lat:])} | "
+                f"retraso ms {self.percentiles(self.retrasos_ms[i_ret:])} | pendientes {pendientes} | rechazadas {self.rechazadas} | errores {errores}")
+
+    def resumen(self, esperadas_s: float) -> str:
+        duracion = time.monotonic() - self.inicio
+        lineas = [
+            "\n📊 Resumen de la simulación",
+            f"   Duración:            {duracion:.1f} s",
+            f"   Lecturas generadas:  {self.generadas}",
+            f"   Lecturas guardadas:  {self.escritas} ({self.escritas / max(duracion, 1e-9):.0f} lect/s; esperadas {esperadas_s:.0f} lect/s)",
+            f"   Rechazadas (API):    {self.rechazadas}",
+            f"   Perdidas por error:  {self.perdidas}",
+            f"   Lotes enviados:      {self.lotes}",
+            f"   Latencia por lote:   {self.percentiles(self.latencias_ms)} ms",
+            f"   Retraso lect->BBDD:  {self.percentiles(self.retrasos_ms)} ms",
+        ]
+        if self.errores:
+            lineas.append("   Errores:             " + ", ".join(f"{k} x{v}" for k, v in self.errores.most_common()))
+        return "\n".join(lineas)
+
+
+# --- Destinos de escritura ---
+class DestinoBD:
+    """COPY a una tabla temporal + INSERT en MEDICION con sus tablas derivadas, una conexión por escritor."""
+
+    # Mismo resultado que crud_operaciones.upsert_ultimas_lecturas / upsert_agregados: la última
+    # lectura solo avanza si es igual o más reciente, y las cubetas combinan mín/máx y acumulan
+    # suma/cuenta. Las filas van ordenadas por sensor para que dos escritores no se bloqueen en cruz.
+    SQL_VOLCADO = f"""
+        WITH nuevas AS (
+            INSERT INTO medicion (sensor_id, fecha_hora, valor)
+            SELECT sensor_id, fecha_hora, valor FROM lote_simulador
+            RETURNING medicion_id, sensor_id, fecha_hora, valor
+        ), ultimas AS (
+            INSERT INTO sensor_ultima_lectura AS u (sensor_id, medicion_id, fecha_hora, valor)
+            SELECT DISTINCT ON (sensor_id) sensor_id, medicion_id, fecha_hora, valor
+            FROM nuevas
+            ORDER BY sensor_id, fecha_hora DESC, medicion_id DESC
+            ON CONFLICT (sensor_id) DO UPDATE
+            SET medicion_id = EXCLUDED.medicion_id, fecha_hora = EXCLUDED.fecha_hora, valor = EXCLUDED.valor
+            WHERE u.fecha_hora <= EXCLUDED.fecha_hora
         )
-        return conn
-    except Exception as e:
-        print(f"❌ Error conectando a la base de datos: {e}")
-        return None
-
-def simular_clima(clima):
-    """Devuelve valores (temp, humedad, viento, luz) según el escenario."""
-    if clima == "tormenta":
-        return (random.uniform(10, 15), random.uniform(85, 95), random.uniform(60, 100), random.uniform(5, 20))
-    elif clima == "calor_extremo":
-        return (random.uniform(38, 45), random.uniform(10, 25), random.uniform(0, 15), random.uniform(80, 100))
-    elif clima == "ideal":
-        return (random.uniform(22, 26), random.uniform(60, 70), random.uniform(5, 10), random.uniform(60, 80))
-    else: # random
-        return (random.uniform(5, 45), random.uniform(20, 90), random.uniform(0, 50), random.uniform(0, 100))
-
-def run_simulador():
-    parser = argparse.ArgumentParser(description="Simulador IoT SIRA - Modo Defensa")
-    parser.add_argument("--clima", choices=["tormenta", "calor_extremo", "ideal", "random"], default="ideal")
-    parser.add_argument("--intervalo", type=int, default=10, help="Segundos entre mediciones")
-    args = parser.parse_args()
+        INSERT INTO medicion_agregada AS a (sensor_id, resolucion_s, bucket, minimo, maximo, suma, cuenta)
+        SELECT n.sensor_id, r.resolucion_s,
+               to_timestamp(floor(extract(epoch FROM n.fecha_hora) / r.resolucion_s) * r.resolucion_s),
+               min(n.valor), max(n.valor), sum(n.valor), count(*)
+        FROM nuevas n
+        CROSS JOIN (VALUES {", ".join(f"({r})" for r in RESOLUCIONES_AGREGADO)}) AS r(resolucion_s)
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (sensor_id, resolucion_s, bucket) DO UPDATE
+        SET minimo = least(a.minimo, EXCLUDED.minimo), maximo = greatest(a.maximo, EXCLUDED.maximo),
+            suma = a.suma + EXCLUDED.suma, cuenta = a.cuenta + EXCLUDED.cuenta
+    """
 
-    print(f"🚀 Iniciando Simulador SIRA (Modo: {args.clima})...")
-    conn = get_connection()
-    if not conn: return
+    def __init__(self, concurrencia: int):
+        self.concurrencia = concurrencia
+        self.pool = None
 
-    cursor = conn.cursor()
+    async def abrir(self):
+        import asyncpg
+        self.pool = await asyncpg.create_pool(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST,
+                                              port=int(DB_PORT), min_size=self.concurrencia, max_size=self.concurrencia)
 
-    # Obtener lista de sensores activos
-    cursor.execute("SELECT sensor_id, tipo_sensor_id FROM SENSOR WHERE estado_sensor = 'Activo'")
-    sensores = cursor.fetchall()
+    async def escribir(self, lote: list) -> tuple:
+        registros = [(sensor_id, fecha, Decimal(f"{valor:.2f}")) for sensor_id, fecha, valor, _ in lote]
+        async with self.pool.acquire() as conexion, conexion.transaction():
+            await conexion.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS lote_simulador (sensor_id int, fecha_hora timestamptz, valor numeric(10,2)) "
+                "ON COMMIT DELETE ROWS"
+            )
+            await conexion.copy_records_to_table("lote_simulador", records=registros, columns=["sensor_id", "fecha_hora", "valor"])
+            await conexion.execute(self.SQL_VOLCADO)
+        return len(lote), 0
 
-    if not sensores:
-        print("⚠️ No se encontraron sensores activos en la base de datos.")
-        # Intentamos obtener cualquier sensor si no hay activos
-        cursor.execute("SELECT sensor_id, tipo_sensor_id FROM SENSOR LIMIT 10")
-        sensores = cursor.fetchall()
-        if not sensores:
-            print("❌ No hay sensores registrados. Abortando.")
-            return
+    async def cerrar(self):
+        if self.pool:
+            await self.pool.close()
+
+
+class DestinoAPI:
+    """POST /api/v1/iot/mediciones/batch con conexiones keep-alive (una por escritor)."""
+
+    def __init__(self, url: str, concurrencia: int):
+        self.url = url.rstrip("/")
+        self.concurrencia = concurrencia
+        self.cliente = None
+
+    async def abrir(self):
+        import httpx
+        self.cliente = httpx.AsyncClient(base_url=self.url, timeout=30,
+                                         limits=httpx.Limits(max_connections=self.concurrencia,
+                                                             max_keepalive_connections=self.concurrencia))
 
+    async def escribir(self, lote: list) -> tuple:
+        cuerpo = [{"sensor_id": sensor_id, "fecha_hora": fecha.isoformat(), "valor": f"{valor:.2f}"}
+                  for sensor_id, fecha, valor, _ in lote]
+        respuesta = await self.cliente.post("/api/v1/iot/mediciones/batch", json=cuerpo)
+        respuesta.raise_for_status()
+        datos = respuesta.json()
+        return datos["aceptadas"], datos["rechazadas"]
+
+    async def cerrar(self):
+        if self.cliente:
+            await self.cliente.aclose()
+
+
+# --- Simulación ---
+class Simulacion:
+
+    def __init__(self, args, inventario: dict, escenarios: dict, destino):
+        self.args = args
+        self.destino = destino
+        self.metricas = Metricas()
+        self.pendientes = deque() # (sensor_id, fecha_hora, valor, instante de generación)
+        self.hay_datos = asyncio.Event()
+        self.activo = True
+        nombres = list(escenarios)
+        self.invernaderos = []
+        for invernadero_id, sensores in inventario.items():
+            escenario = escenarios[random.choice(nombres) if args.clima == "mixto" else args.clima]
+            self.invernaderos.append((escenario, [SensorSimulado(s, clave, escenario) for s, clave in sensores]))
+        self.total_sensores = sum(len(s) for _, s in self.invernaderos)
+
+    @property
+    def esperadas_s(self) -> float:
+        return self.total_sensores / self.args.intervalo
+
+    async def invernadero(self, escenario: dict, sensores: list):
+        intervalo, jitter = self.args.intervalo, self.args.jitter
+        await asyncio.sleep(random.uniform(0, intervalo)) # Desfase inicial: no todos en el mismo instante
+        anterior = time.monotonic()
+        while self.activo:
+            ahora = time.monotonic()
+            dt, anterior = ahora - anterior, ahora
+            fecha = datetime.now(timezone.utc)
+            for sensor in sensores:
+                self.pendientes.append((sensor.sensor_id, fecha, sensor.avanzar(escenario, max(dt, intervalo), self.args.deriva), ahora))
+            self.metricas.generadas += len(sensores)
+            self.hay_datos.set()
+            await asyncio.sleep(intervalo * (1 + random.uniform(-jitter, jitter)))
+
+    async def escritor(self):
+        m = self.metricas
+        while self.activo or self.pendientes:
+            if not self.pendientes:
+                self.hay_datos.clear()
+                try:
+                    await asyncio.wait_for(self.hay_datos.wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if self.activo and len(self.pendientes) < self.args.lote:
+                await asyncio.sleep(self.args.agrupar_ms / 1000) # Deja que se llene el lote
+            lote = [self.pendientes.popleft() for _ in range(min(self.args.lote, len(self.pendientes)))]
+            if not lote:
+                continue
+            inicio = time.monotonic()
+            try:
+                aceptadas, rechazadas = await self.destino.escribir(lote)
+                m.escritas += aceptadas
+                m.rechazadas += rechazadas
+            except Exception as e:
+                respuesta = getattr(e, "response", None)
+                m.errores[f"HTTP {respuesta.status_code}" if respuesta is not None else e.__class__.__name__] += 1
+                m.perdidas += len(lote)
+            fin = time.monotonic()
+            m.lotes += 1
+            m.latencias_ms.append((fin - inicio) * 1000)
+            m.retrasos_ms.append((fin - lote[0][3]) * 1000) # La lectura más antigua del lote
+
+    async def informes(self):
+        while self.activo:
+            await asyncio.sleep(self.args.informe)
+            print(self.metricas.informe(self.esperadas_s, len(self.pendientes)))
+
+    async def ejecutar(self):
+        bucles = [asyncio.create_task(self.invernadero(e, s)) for e, s in self.invernaderos]
+        escritores = [asyncio.create_task(self.escritor()) for _ in range(self.args.concurrencia)]
+        informes = asyncio.create_task(self.informes())
+
+        parar = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT, parar.set)
+        except (NotImplementedError, RuntimeError):
+            pass # Windows: Ctrl+C llega como KeyboardInterrupt
+        try:
+            await asyncio.wait_for(parar.wait(), timeout=self.args.duracion or None)
+        except asyncio.TimeoutError:
+            pass
+        print("\n🛑 Deteniendo: se envían las lecturas pendientes...")
+
+        self.activo = False
+        for tarea in bucles + [informes]:
+            tarea.cancel()
+        await asyncio.gather(*escritores)
+        print(self.metricas.resumen(self.esperadas_s))
+
+
+# --- Inventario (BBDD) ---
+async def conectar():
+    import asyncpg
+    return await asyncpg.connect(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST, port=int(DB_PORT))
+
+
+async def cargar_inventario(conexion, limite: int) -> dict:
+    """{invernadero_id: [(sensor_id, clave), ...]} de los sensores activos asignados a un invernadero."""
+    filas = await conexion.fetch("""
+        SELECT s.sensor_id, s.invernadero_id, t.nombre_tipo
+        FROM sensor s JOIN tipo_sensor t ON t.tipo_sensor_id = s.tipo_sensor_id
+        WHERE s.invernadero_id IS NOT NULL AND coalesce(s.estado_sensor, 'Activo') = 'Activo'
+        ORDER BY s.invernadero_id, s.sensor_id
+    """)
+    inventario = {}
+    for fila in filas:
+        if fila["invernadero_id"] not in inventario and limite and len(inventario) >= limite:
+            break
+        inventario.setdefault(fila["invernadero_id"], []).append((fila["sensor_id"], clave_sensor(fila["nombre_tipo"])))
+    return inventario
+
+
+async def provisionar(conexion, faltan: int):
+    """Crea 'faltan' invernaderos sintéticos con un sensor por tipo (uno por clave del escenario)."""
+    tipos = {}
+    for fila in await conexion.fetch("SELECT tipo_sensor_id, nombre_tipo FROM tipo_sensor ORDER BY tipo_sensor_id"):
+        tipos.setdefault(clave_sensor(fila["nombre_tipo"]), fila["tipo_sensor_id"])
+    if not tipos:
+        raise SystemExit("❌ No hay tipos de sensor en TIPO_SENSOR: no se pueden provisionar invernaderos.")
+
+    async with conexion.transaction():
+        await conexion.execute("""
+            INSERT INTO localidad (codigo_postal, municipio, provincia) VALUES ('04700', 'El Ejido', 'Almería')
+            ON CONFLICT DO NOTHING
+        """)
+        # Cliente inactivo: no puede iniciar sesión ni aparece en los listados del panel
+        cliente_id = await conexion.fetchval("""
+            INSERT INTO cliente (nombre_empresa, cif, email_admin, telefono, persona_contacto, hash_contrasena, rol, activa)
+            VALUES ('Simulador de Carga', $1, 'simulador@sira.local', '000000000', 'Simulador', '!', 'cliente', FALSE)
+            ON CONFLICT (cif) DO UPDATE SET cif = EXCLUDED.cif
+            RETURNING cliente_id
+        """, CIF_SIMULADOR)
+        existentes = await conexion.fetchval("""
+            SELECT count(*) FROM invernadero i JOIN parcela p ON p.parcela_id = i.parcela_id WHERE p.cliente_id = $1
+        """, cliente_id)
+        total = existentes + faltan
+        await conexion.execute("""
+            INSERT INTO parcela (cliente_id, codigo_postal, ref_catastral, direccion)
+            SELECT $1, '04700', 'SIMCARGA' || lpad(n::text, 6, '0'), 'Parcela sintética ' || n
+            FROM generate_series(0, $2 - 1) AS n
+            ON CONFLICT (ref_catastral) DO NOTHING
+        """, cliente_id, math.ceil(total / INVERNADEROS_POR_PARCELA))
+        nuevos = await conexion.fetch("""
+            INSERT INTO invernadero (nombre, parcela_id, largo_m, ancho_m)
+            SELECT 'Sim ' || n, p.parcela_id, 50, 20
+            FROM generate_series($2::int, $3::int - 1) AS n
+            JOIN parcela p ON p.ref_catastral = 'SIMCARGA' || lpad((n / $4)::text, 6, '0') AND p.cliente_id = $1
+            RETURNING invernadero_id
+        """, cliente_id, existentes, total, INVERNADEROS_POR_PARCELA)
+        await conexion.execute("""
+            INSERT INTO sensor (invernadero_id, tipo_sensor_id, ubicacion_sensor, estado_sensor)
+            SELECT i, t, 'Simulador', 'Activo' FROM unnest($1::int[]) AS i CROSS JOIN unnest($2::int[]) AS t
+        """, [f["invernadero_id"] for f in nuevos], list(tipos.values()))
+    print(f"🏗️ Provisionados {len(nuevos)} invernaderos sintéticos ({len(tipos)} sensores cada uno).")
+
+
+async def limpiar(conexion):
+    """Borra los invernaderos sintéticos, sus sensores y sus mediciones."""
+    cliente_id = await conexion.fetchval("SELECT cliente_id FROM cliente WHERE cif = $1", CIF_SIMULADOR)
+    if cliente_id is None:
+        print("ℹ️ No hay datos del simulador que limpiar.")
+        return
+    async with conexion.transaction():
+        sensores = [f["sensor_id"] for f in await conexion.fetch("""
+            SELECT s.sensor_id FROM sensor s
+            JOIN invernadero i ON i.invernadero_id = s.invernadero_id
+            JOIN parcela p ON p.parcela_id = i.parcela_id
+            WHERE p.cliente_id = $1
+        """, cliente_id)]
+        # SENSOR_ULTIMA_LECTURA y MEDICION_AGREGADA se borran en cascada con el sensor
+        for tabla in ("medicion", "sensor"):
+            await conexion.execute(f"DELETE FROM {tabla} WHERE sensor_id = ANY($1::int[])", sensores)
+        for tabla in ("recomendacion_riego", "invernadero"):
+            await conexion.execute(f"""
+                DELETE FROM {tabla} WHERE invernadero_id IN (
+                    SELECT i.invernadero_id FROM invernadero i JOIN parcela p ON p.parcela_id = i.parcela_id
+                    WHERE p.cliente_id = $1)
+            """, cliente_id)
+        await conexion.execute("DELETE FROM parcela WHERE cliente_id = $1", cliente_id)
+        await conexion.execute("DELETE FROM cliente WHERE cliente_id = $1", cliente_id)
+    print(f"🧹 Eliminados los datos del simulador ({len(sensores)} sensores).")
+
+
+async def main(args):
+    with open(RUTA_PRESETS, encoding="utf-8") as f:
+        escenarios = json.load(f)
+    if args.clima not in escenarios and args.clima != "mixto":
+        raise SystemExit(f"❌ Escenario desconocido '{args.clima}'. Disponibles: {', '.join(escenarios)}, mixto")
+
+    conexion = await conectar()
     try:
-        while True:
-            t, h, v, l = simular_clima(args.clima)
-            timestamp = datetime.now()
-
-            for sensor_id, tipo_id in sensores:
-                # Mapeo según TIPO_SENSOR (1:Temp, 2:Hum, 3:Viento, 4:Luz - asumiendo IDs estándar)
-                valor = 0
-                if tipo_id == 1: valor = t
-                elif tipo_id == 2: valor = h
-                elif tipo_id == 3: valor = v
-                elif tipo_id == 4: valor = l
-                else: valor = random.uniform(0, 100)
-
-                cursor.execute(
-                    "INSERT INTO MEDICION (sensor_id, fecha_hora, valor) VALUES (%s, %s, %s)",
-                    (sensor_id, timestamp, valor)
-                )
-            
-            conn.commit()
-            print(f"✅ [{timestamp.strftime('%H:%M:%S')}] Telemetría enviada: T={t:.1f}ºC, H={h:.1f}%, V={v:.1f}km/h, L={l:.1f}%")
-            time.sleep(args.intervalo)
+        if args.limpiar:
+            await limpiar(conexion)
+            return
+        inventario = await cargar_inventario(conexion, args.invernaderos)
+        if args.provisionar and len(inventario) < args.invernaderos:
+            await provisionar(conexion, args.invernaderos - len(inventario))
+            inventario = await cargar_inventario(conexion, args.invernaderos)
+    finally:
+        await conexion.close()
+    if not inventario:
+        raise SystemExit("❌ No hay sensores activos asignados a invernaderos (prueba con --provisionar).")
 
-    except KeyboardInterrupt:
-        print("\n🛑 Simulador detenido por el usuario.")
+    destino = DestinoAPI(args.api_url, args.concurrencia) if args.destino == "api" else DestinoBD(args.concurrencia)
+    simulacion = Simulacion(args, inventario, escenarios, destino)
+    print(f"🚀 Simulador SIRA: {len(inventario)} invernaderos, {simulacion.total_sensores} sensores, "
+          f"cada {args.intervalo}s ±{args.jitter:.0%} -> {simulacion.esperadas_s:.0f} lect/s "
+          f"(escenario: {args.clima}, destino: {args.destino})")
+
+    await destino.abrir()
+    try:
+        await simulacion.ejecutar()
     finally:
-        cursor.close()
-        conn.close()
+        await destino.cerrar()
+
 
 if __name__ == "__main__":
-    run_simulador()
+    parser = argparse.ArgumentParser(description="Simulador IoT SIRA - Generador de carga")
+    parser.add_argument("--clima", default="ideal", help="Escenario de presets_clima.json o 'mixto' (uno al azar por invernadero)")
+    parser.add_argument("--intervalo", type=float, default=10, help="Segundos entre lecturas de cada invernadero")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variación aleatoria del intervalo (0.1 = ±10%%)")
+    parser.add_argument("--deriva", type=float, default=1.0, help="Multiplicador del ruido de los modelos de deriva")
+    parser.add_argument("--invernaderos", type=int, default=0, help="Invernaderos a simular (0 = todos los de la BBDD)")
+    parser.add_argument("--provisionar", action="store_true", help="Crear invernaderos sintéticos hasta llegar a --invernaderos")
+    parser.add_argument("--limpiar", action="store_true", help="Borrar los invernaderos sintéticos y sus mediciones, y salir")
+    parser.add_argument("--destino", choices=["api", "bd"], default="api",
+                        help="'api': POST a la API (ruta real de los ESP32). 'bd': COPY directo a PostgreSQL")
+    parser.add_argument("--api-url", default=os.getenv("SIRA_API_URL", "http://localhost:8000"))
+    parser.add_argument("--concurrencia", type=int, default=4, help="Escritores en paralelo (conexiones)")
+    parser.add_argument("--lote", type=int, default=1000, help="Máximo de lecturas por COPY / petición (la API admite 5000)")
+    parser.add_argument("--agrupar-ms", type=float, default=200, help="Espera para llenar un lote incompleto")
+    parser.add_argument("--duracion", type=float, default=0, help="Segundos de simulación (0 = hasta Ctrl+C)")
+    parser.add_argument("--informe", type=float, default=10, help="Segundos entre informes parciales")
+    args = parser.parse_args()
+    if args.intervalo <= 0 or not 0 <= args.jitter < 1:
+        parser.error("--intervalo debe ser > 0 y --jitter estar en [0, 1)")
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Simulador detenido por el usuario.")